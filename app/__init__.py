@@ -2,6 +2,7 @@ from flask import Flask
 from .config import Config
 from app.controllers.file_controller import file_bp
 from app.controllers.generator_controller import generator_bp
+from app.controllers.metrics_controller import metrics_bp
 import os
 from flask_cors import CORS
 
@@ -17,5 +18,6 @@ def create_app():
     app.config.from_object(Config)
     app.register_blueprint(file_bp, url_prefix="/api/upload")
     app.register_blueprint(generator_bp, url_prefix="/api/generator")
+    app.register_blueprint(metrics_bp, url_prefix="/api/metrics")
     
     return app
\ No newline at end of file
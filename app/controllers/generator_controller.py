@@ -1,50 +1,109 @@
-from flask import Blueprint, current_app, jsonify, request, send_from_directory
+import json
+from flask import Blueprint, Response, current_app, jsonify, request, send_from_directory
 from app.services.file_service import FileService
 from werkzeug.datastructures import FileStorage
 from app.config import Config
 
 from app.services.generator_service import GeneratorService
+from app.services.job_service import Job, JobService
+from app.services.result_writer import ResultWriteError
+from classes.latent_preview import preview_to_base64
 
 generator_bp = Blueprint('generator', __name__)
 file_service = FileService()
 generator_service = GeneratorService()
+job_service = JobService()
 
-@generator_bp.route('/image-to-image', methods=['POST'])
-def generate_image2image():
-    if 'file' not in request.files:
-        return jsonify({
-            'status': 'error',
-            'message': 'No file part'
-        }), 400
-    
+
+def _output_params(data: dict):
+    """Formato de salida (png, webp, jpeg), si se devuelven las imagenes en la respuesta y la semilla"""
+    seed = data.get('seed')
+    return {
+        'output_format': data.get('format'),
+        'return_images': bool(data.get('return_images', False)),
+        # Con seed el resultado es reproducible y puede servirse desde la cache
+        'seed': int(seed) if seed is not None else None,
+    }
+
+
+def _sampler_params(data: dict):
+    """Sampler pedido y pasos de inferencia; sin pasos se usan los recomendados del sampler"""
+    steps = data.get('num_inference_steps')
+    return {
+        'sampler': data.get('sampler'),
+        'num_inference_steps': int(steps) if steps is not None else None,
+    }
+
+
+def _size_params(data: dict):
+    """Resolucion de salida opcional (multiplos de 8); sin ella se usan 512x512"""
+    width, height = data.get('width'), data.get('height')
+    return {
+        'width': int(width) if width is not None else None,
+        'height': int(height) if height is not None else None,
+    }
+
+
+def _image_request_params():
+    """Lee el boceto subido y los parametros de img2img del form"""
     file : FileStorage = request.files['file']
 
     # En multipart/form-data, los datos JSON llegan como texto en request.form
     data_str = request.form.get('data')  # "data" es la key que envías en Postman
     data = {}
     if data_str:
-        import json
         data = json.loads(data_str)
 
-    filename: str = data.get('filename', file.filename)
-    prompt: str = data.get('prompt', "")
-    num_inference_steps: int = int(data.get('num_inference_steps', 50))
-    strength: float = float(data.get('strength', 0.8))
-    guidance_scale: float = float(data.get('guidance_scale', 7.5))
-    num_images_per_prompt: int = int(data.get('num_images_per_prompt', 1))
-    
     print(data)
-    # Guardar el archivo primero
-    saved_file_result = file_service.save_file(file)
+    # El boceto se decodifica desde memoria; guardarlo en disco es opcional y asincrono
+    upload = file_service.read_file(file)
+    if upload['status'] == 'error':
+        return upload
+    if data.get('persist_upload', Config.PERSIST_UPLOADS):
+        file_service.save_bytes_async(upload['data'], upload['extension'])
+
+    return {
+        'input_image': upload['data'],
+        'prompt': data.get('prompt', ""),
+        **_sampler_params(data),
+        'strength': float(data.get('strength', 0.8)),
+        'guidance_scale': float(data.get('guidance_scale', 7.5)),
+        'number_per_prompt': int(data.get('num_images_per_prompt', 1)),
+        **_size_params(data),
+        # Con match_input_size la salida tiene el tamaño del boceto
+        'match_input_size': bool(data.get('match_input_size', False)),
+        **_output_params(data),
+    }
+
+
+def _text_request_params(data: dict):
+    """Lee los parametros de text2img del JSON"""
+    print(data)
+    return {
+        'prompt': data.get('promp') if 'promp' in data else data.get('prompt', ""),
+        **_sampler_params(data),
+        'strength': float(data.get('strength', 0.8)),
+        'guidance_scale': float(data.get('guidance_scale', 7.5)),
+        'number_per_prompt': int(data.get('num_images_per_prompt', 1)),
+        **_size_params(data),
+        **_output_params(data),
+    }
+
+
+@generator_bp.route('/image-to-image', methods=['POST'])
+def generate_image2image():
+    if 'file' not in request.files:
+        return jsonify({
+            'status': 'error',
+            'message': 'No file part'
+        }), 400
+
+    params = _image_request_params()
+    if params.get('status') == 'error':
+        return jsonify(params), 400
+
     # Procesar con el generator_service
-    result = generator_service.image_to_image(
-        f"{Config.UPLOAD_FOLDER}/{saved_file_result['filename']}",
-        prompt,
-        num_inference_steps,
-        strength,
-        guidance_scale,
-        num_images_per_prompt
-    )
+    result = generator_service.image_to_image(**params)
 
     if result['status'] == 'error':
         return jsonify(result), 400
@@ -54,35 +113,252 @@ def generate_image2image():
 
 @generator_bp.route('/text-to-image', methods=['POST'])
 def generate_text2image():
-    
+
     data = request.get_json()
-    
-    if data is {}:
-    
+
+    if not data:
+
         return jsonify({
             'status': 'error',
             'message': 'No data part'
         }), 400
-    print(data)
-    prompt: str = data.get('promp') if 'promp' in data else data.get('prompt', "")
-    num_inference_steps: int = int(data.get('num_inference_steps', 50))
-    strength: float = float(data.get('strength', 0.8))
-    guidance_scale: float = float(data.get('guidance_scale', 7.5))
-    num_images_per_prompt: int = int(data.get('num_images_per_prompt', 1))
 
-    result = generator_service.text_to_image(prompt, num_inference_steps, strength, guidance_scale, num_images_per_prompt)
+    result = generator_service.text_to_image(**_text_request_params(data))
     if result['status'] == 'error':
         return jsonify(result), 400
     else:
         # return send_from_directory(current_app.config['RESULT_FOLDER'], result['filename'])
         return jsonify(result), 200
-    
+
+@generator_bp.route('/jobs/image-to-image', methods=['POST'])
+def submit_image2image_job():
+    if 'file' not in request.files:
+        return jsonify({
+            'status': 'error',
+            'message': 'No file part'
+        }), 400
+
+    params = _image_request_params()
+    if params.get('status') == 'error':
+        return jsonify(params), 400
+
+    job = job_service.submit('image-to-image', generator_service.image_to_image, **params)
+    return jsonify({'status': 'success', **job.to_dict()}), 202
+
+@generator_bp.route('/jobs/text-to-image', methods=['POST'])
+def submit_text2image_job():
+    data = request.get_json()
+
+    if not data:
+        return jsonify({
+            'status': 'error',
+            'message': 'No data part'
+        }), 400
+
+    job = job_service.submit('text-to-image', generator_service.text_to_image, **_text_request_params(data))
+    return jsonify({'status': 'success', **job.to_dict()}), 202
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _stream_job(job: Job):
+    """Eventos SSE: progreso por paso, previsualizaciones y resultado final"""
+    def events():
+        version, sent_step, sent_preview = -1, None, None
+        try:
+            yield _sse('job', job.to_dict())
+            while True:
+                previous_version = version
+                version = job.wait_for_update(version, timeout=15)
+                if version == previous_version:
+                    # Comentario SSE para mantener viva la conexion
+                    yield ": keep-alive\n\n"
+                    continue
+                if job.step != sent_step:
+                    sent_step = job.step
+                    yield _sse('progress', {'step': job.step, 'total_steps': job.total_steps})
+                if job.preview_step is not None and job.preview_step != sent_preview:
+                    sent_preview = job.preview_step
+                    previews = job.previews
+                    yield _sse('preview', {
+                        'step': sent_preview,
+                        'images': [preview_to_base64(image) for image in previews]
+                    })
+                if job.is_finished():
+                    yield _sse('done', job.to_dict())
+                    return
+        except GeneratorExit:
+            # El cliente cerro la conexion: no tiene sentido seguir generando
+            job_service.cancel(job.id)
+            raise
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@generator_bp.route('/image-to-image/stream', methods=['POST'])
+def stream_image2image():
+    if 'file' not in request.files:
+        return jsonify({
+            'status': 'error',
+            'message': 'No file part'
+        }), 400
+
+    params = _image_request_params()
+    if params.get('status') == 'error':
+        return jsonify(params), 400
+
+    job = job_service.submit('image-to-image', generator_service.image_to_image, previews=True, **params)
+    return _stream_job(job)
+
+@generator_bp.route('/text-to-image/stream', methods=['POST'])
+def stream_text2image():
+    data = request.get_json()
+
+    if not data:
+        return jsonify({
+            'status': 'error',
+            'message': 'No data part'
+        }), 400
+
+    job = job_service.submit('text-to-image', generator_service.text_to_image, previews=True, **_text_request_params(data))
+    return _stream_job(job)
+
+@generator_bp.route('/batch', methods=['POST'])
+def generate_batch():
+    """Generacion masiva con resultados en streaming (SSE) a medida que terminan.
+
+    img2img: multipart con varios `files` y el JSON en `data`; text2img: JSON con `prompts`.
+    """
+    if request.files:
+        data = json.loads(request.form.get('data') or '{}')
+        mode, items = 'image', []
+        for file in request.files.getlist('files'):
+            upload = file_service.read_file(file)
+            if upload['status'] == 'error':
+                return jsonify(upload), 400
+            if data.get('persist_upload', Config.PERSIST_UPLOADS):
+                file_service.save_bytes_async(upload['data'], upload['extension'])
+            items.append(upload['data'])
+    else:
+        data = request.get_json(silent=True) or {}
+        mode, items = 'text', list(data.get('prompts') or [])
+
+    if not items:
+        return jsonify({
+            'status': 'error',
+            'message': 'No hay bocetos (files) ni prompts que generar'
+        }), 400
+
+    try:
+        results = generator_service.generate_many(
+            mode, items,
+            prompt=data.get('prompt'),
+            strength=float(data.get('strength', 0.8)),
+            guidance_scale=float(data.get('guidance_scale', 7.5)),
+            number_per_prompt=int(data.get('num_images_per_prompt', 1)),
+            folder=current_app.config['RESULT_FOLDER'],
+            **_sampler_params(data),
+            **_size_params(data),
+            **_output_params(data)
+        )
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+
+    def events():
+        counts = {'success': 0, 'error': 0}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+            yield _sse('result', result)
+        yield _sse('done', {'total': len(items), **counts})
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@generator_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id: str):
+    job = job_service.get(job_id)
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': f'Trabajo "{job_id}" no encontrado'
+        }), 404
+    return jsonify({'status': 'success', **job.to_dict()}), 200
+
+@generator_bp.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id: str):
+    job = job_service.cancel(job_id)
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': f'Trabajo "{job_id}" no encontrado'
+        }), 404
+    return jsonify({'status': 'success', **job.to_dict()}), 200
+
+@generator_bp.route('/samplers', methods=['GET'])
+def get_samplers():
+    return jsonify({
+        'status': 'success',
+        'default': Config.DEFAULT_SAMPLER,
+        'samplers': generator_service.get_samplers()
+    }), 200
+
+@generator_bp.route('/estimate', methods=['POST'])
+def estimate_generation():
+    """Memoria y duracion estimadas de una peticion, sin generar nada"""
+    data = request.get_json(silent=True) or {}
+    try:
+        estimate = generator_service.estimate(
+            data.get('mode', 'text'),
+            number_per_prompt=int(data.get('num_images_per_prompt', 1)),
+            guidance_scale=float(data.get('guidance_scale', 7.5)),
+            strength=float(data.get('strength', 0.8)),
+            **_size_params(data),
+            **_sampler_params(data)
+        )
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    return jsonify({'status': 'success', 'estimate': estimate}), 200
+
+@generator_bp.route('/stats', methods=['GET'])
+def get_generator_stats():
+    return jsonify({
+        'status': 'success',
+        'mode_switch': generator_service.get_switch_stats(),
+        'prompt_cache': generator_service.get_prompt_cache_stats(),
+        'sketch_cache': generator_service.get_sketch_cache_stats(),
+        'result_cache': generator_service.get_result_cache_stats(),
+        'memory': generator_service.get_memory_metrics(),
+        'jobs': job_service.counts()
+    }), 200
+
 @generator_bp.route('/result/<filename>', methods=['GET'])
 def get_result_file(filename: str):
+    try:
+        ready = generator_service.wait_for_result(filename)
+    except ResultWriteError as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'No se pudo guardar la imagen "{filename}": {str(e)}'
+        }), 500
+    if not ready:
+        return jsonify({
+            'status': 'error',
+            'message': f'Imagen "{filename}" no encontrada'
+        }), 404
     try:
         return send_from_directory(current_app.config['RESULT_FOLDER'], filename)
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': f'Error al obtener la imagen "{filename}": {str(e)}'
-        }), 400
\ No newline at end of file
+        }), 400
@@ -0,0 +1,10 @@
+from flask import Blueprint, Response
+from app.services.metrics_service import MetricsService
+
+metrics_bp = Blueprint('metrics', __name__)
+metrics_service = MetricsService()
+
+@metrics_bp.route('', methods=['GET'])
+def get_metrics():
+    # Formato de texto de exposicion de Prometheus
+    return Response(metrics_service.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
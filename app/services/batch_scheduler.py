@@ -0,0 +1,193 @@
+import os
+import random
+import threading
+import time
+from app.config import Config
+
+
+class GenerationCancelled(Exception):
+    """La peticion se cancelo antes de terminar"""
+    pass
+
+
+class GenerationRequest:
+    """Peticion de generacion en cola; el llamador espera con wait()"""
+
+    def __init__(self, mode: str, prompt: str, params: dict, image=None, seed: int = None, on_progress=None, cancel_event=None, on_preview=None, on_done=None):
+        self.mode = mode
+        self.prompt = prompt
+        self.image = image
+        self.params = params
+        self.on_progress = on_progress
+        self.cancel_event = cancel_event
+        self.on_preview = on_preview
+        self.on_done = on_done
+        self.number_per_prompt = params.get('number_per_prompt', 1)
+        # Una semilla por imagen: el resultado no depende de con quien comparta lote
+        self.seed = random.randrange(2 ** 31) if seed is None else int(seed)
+        self.seeds = [self.seed + i for i in range(self.number_per_prompt)]
+
+        self.images = None
+        self.error = None
+        self.batch_size = 0
+        self.enqueued_at = time.perf_counter()
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+
+    @property
+    def key(self) -> tuple:
+        """Peticiones con la misma clave pueden ir en una sola llamada a la UNet"""
+        params = {k: v for k, v in self.params.items() if k != 'number_per_prompt'}
+        return (self.mode,) + tuple(sorted(params.items()))
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    def release_if_cancelled(self) -> bool:
+        """Dentro de un lote: si se cancelo termina ya; el lote sigue y sus imagenes se descartan"""
+        if self.cancelled and not self.finished:
+            self.finish(error=GenerationCancelled())
+        return self.cancelled
+
+    def report_progress(self, step: int, total_steps: int = None):
+        if self.on_progress is not None:
+            self.on_progress(step, total_steps)
+
+    def finish(self, images=None, error=None):
+        self.images = images
+        self.error = error
+        self.finished_at = time.perf_counter()
+        self._done.set()
+        # Aviso sin esperar en wait(): lo usan las generaciones masivas para recoger en orden de llegada
+        if self.on_done is not None:
+            self.on_done(self)
+
+    def wait(self, timeout=None) -> list:
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while not self._done.wait(0.1):
+            # Cancelada antes de entrar en un lote: el llamador queda libre ya
+            if self.cancelled and self.started_at is None:
+                raise GenerationCancelled()
+            if deadline is not None and time.perf_counter() > deadline:
+                raise TimeoutError("La generacion no termino a tiempo")
+        if self.error is not None:
+            raise self.error
+        return self.images
+
+    def timing(self) -> dict:
+        """Latencias de la peticion en milisegundos"""
+        started = self.started_at or self.enqueued_at
+        finished = self.finished_at or time.perf_counter()
+        return {
+            'queue_ms': round((started - self.enqueued_at) * 1000, 1),
+            'inference_ms': round((finished - started) * 1000, 1),
+            'total_ms': round((finished - self.enqueued_at) * 1000, 1),
+            'batch_size': self.batch_size,
+        }
+
+
+class BatchScheduler:
+    """Agrupa peticiones compatibles que llegan en una ventana corta en un solo lote.
+
+    `run_batch(mode, requests)` ejecuta el lote y devuelve, por cada peticion,
+    su lista de imagenes en el mismo orden. Con `fits(mode, params, num_images)`
+    el lote deja de crecer cuando el siguiente no cabria (p. ej. en memoria).
+    """
+
+    def __init__(self, run_batch, max_batch_size: int = None, max_wait_ms: float = None, fits=None):
+        self.run_batch = run_batch
+        self.fits = fits
+        self.max_batch_size = max_batch_size or Config.BATCH_MAX_SIZE
+        self.max_wait_ms = Config.BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms
+
+        self._pending: list[GenerationRequest] = []
+        self._cond = threading.Condition()
+        self._worker = None
+        self._worker_pid = None
+
+    def submit(self, mode: str, prompt: str, image=None, seed: int = None, on_progress=None, cancel_event=None, on_preview=None, on_done=None, **params) -> GenerationRequest:
+        request = GenerationRequest(mode, prompt, params, image=image, seed=seed, on_progress=on_progress,
+                                    cancel_event=cancel_event, on_preview=on_preview, on_done=on_done)
+        with self._cond:
+            self._ensure_worker()
+            self._pending.append(request)
+            self._cond.notify()
+        return request
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def _ensure_worker(self):
+        # El hilo se crea bajo demanda (y de nuevo tras un fork, donde no sobrevive)
+        if self._worker is None or self._worker_pid != os.getpid() or not self._worker.is_alive():
+            self._worker_pid = os.getpid()
+            self._worker = threading.Thread(target=self._loop, name="batch-scheduler", daemon=True)
+            self._worker.start()
+
+    def _take_batch(self) -> list[GenerationRequest]:
+        """Espera la ventana y saca de la cola las peticiones compatibles con la primera"""
+        with self._cond:
+            while True:
+                # Las peticiones canceladas en cola salen sin ocupar sitio en el lote
+                for request in [r for r in self._pending if r.cancelled]:
+                    self._pending.remove(request)
+                    request.finish(error=GenerationCancelled())
+                if self._pending:
+                    break
+                self._cond.wait()
+
+            first = self._pending[0]
+            deadline = first.enqueued_at + self.max_wait_ms / 1000
+            while True:
+                batch, full = self._compatible(first)
+                remaining = deadline - time.perf_counter()
+                if full or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            for request in batch:
+                self._pending.remove(request)
+            return batch
+
+    def _compatible(self, first: GenerationRequest) -> tuple[list[GenerationRequest], bool]:
+        """Peticiones compatibles con la primera que caben en un lote, y si el lote ya no admite mas"""
+        batch, images = [], 0
+        for request in self._pending:
+            if request.key != first.key:
+                continue
+            if batch and images + request.number_per_prompt > self.max_batch_size:
+                return batch, True
+            if batch and self.fits is not None and not self.fits(first.mode, first.params, images + request.number_per_prompt):
+                return batch, True
+            batch.append(request)
+            images += request.number_per_prompt
+        return batch, images >= self.max_batch_size
+
+    def _loop(self):
+        while True:
+            batch = self._take_batch()
+            started = time.perf_counter()
+            for request in batch:
+                request.started_at = started
+                request.batch_size = len(batch)
+            try:
+                results = self.run_batch(batch[0].mode, batch)
+                for request, images in zip(batch, results):
+                    if request.finished:
+                        # Ya liberada durante el lote (cancelada en un paso de denoising)
+                        continue
+                    if request.cancelled:
+                        request.finish(error=GenerationCancelled())
+                    else:
+                        request.finish(images=images)
+            except Exception as e:
+                for request in batch:
+                    if not request.finished:
+                        request.finish(error=e)
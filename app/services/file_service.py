@@ -1,12 +1,17 @@
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.datastructures import FileStorage
 from flask import current_app, send_from_directory
 import os
 from functions.validate_image import allowed_file
+from app.services.metrics_service import MetricsService
 
 
 class FileService:
-    
+    # Pool compartido para guardar subidas en segundo plano (se crea bajo demanda)
+    _executor = None
+    _executor_pid = None
+
     def save_file(self, file: FileStorage):
         if file.filename == '':
             return {
@@ -38,5 +43,47 @@ class FileService:
             'message': 'Invalid file type'
         }
     
+    def read_file(self, file: FileStorage):
+        """Lee la subida a memoria sin escribirla a disco"""
+        if file.filename == '':
+            return {
+                'status': 'error',
+                'message': 'No selected file'
+            }
+
+        if file and allowed_file(file.filename):
+            return {
+                'status': 'success',
+                'message': 'File read successfully',
+                'extension': file.filename.rsplit(".", 1)[1].lower(),
+                'data': file.read()
+            }
+
+        return {
+            'status': 'error',
+            'message': 'Invalid file type'
+        }
+
+    def save_bytes_async(self, data: bytes, extension: str) -> str:
+        """Guarda los bytes subidos en segundo plano y retorna el nombre de archivo"""
+        filename = f"{uuid.uuid4().hex}.{extension}"
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        os.makedirs(upload_folder, exist_ok=True)
+        self._get_executor().submit(self._write, os.path.join(upload_folder, filename), data)
+        return filename
+
+    @staticmethod
+    def _write(file_path: str, data: bytes):
+        with MetricsService().timer('upload_save'):
+            with open(file_path, 'wb') as f:
+                f.write(data)
+
+    @classmethod
+    def _get_executor(cls) -> ThreadPoolExecutor:
+        if cls._executor is None or cls._executor_pid != os.getpid():
+            cls._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload-writer")
+            cls._executor_pid = os.getpid()
+        return cls._executor
+
     def get_file(self, filename: str):
         return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
\ No newline at end of file
@@ -1,14 +1,26 @@
+import hashlib
 import os
-import gc
-import sys
-from tkinter import Image
-import psutil
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
 import torch
 from classes.sketch_2_anime import SketchToAnime
 from classes.text_2_anime import TextToAnime
+from classes.prompt_embedding_cache import PromptEmbeddingCache
+from classes.sketch_latent_cache import SketchLatentCache
+from classes.latent_preview import latents_to_preview
+from classes.model_registry import ModelRegistry
+from classes.sampler_registry import available_samplers, default_steps, normalize_sampler
+from classes.generation_cost import input_size, normalize_size, plan_memory
 from app.config import Config
-from flask import current_app
-from datetime import datetime
+from app.services.memory_manager import MemoryManager, module_bytes
+from app.services.batch_scheduler import BatchScheduler, GenerationCancelled, GenerationRequest
+from app.services.result_writer import ResultWriter
+from app.services.result_cache import ResultCache
+from app.services.metrics_service import MetricsService
+from flask import current_app, has_app_context
 
 class GeneratorService:
     _instance = None
@@ -17,230 +29,607 @@ class GeneratorService:
     _current_mode = None
 
     def __init__(self):
-        self._load_image_model()
+        # Los modelos se cargan en la primera peticion, no al importar el controlador
+        if not hasattr(self, '_switch_stats'):
+            self._switch_stats = {'count': 0, 'total_ms': 0.0, 'last_ms': 0.0, 'last': None}
+            # Segundos por token latente y paso de denoising (media movil), para estimar duraciones
+            self._seconds_per_token_step = None
+            self._scheduler = BatchScheduler(self._run_batch, fits=self._batch_fits)
+            self._prompt_cache = PromptEmbeddingCache()
+            self._sketch_cache = SketchLatentCache()
+            self._memory = MemoryManager()
+            self._writer = ResultWriter()
+            self._result_cache = ResultCache() if Config.RESULT_CACHE_ENABLED else None
+            self._decode_executor = None
+            self._decode_executor_pid = None
+            self._metrics = MetricsService()
+            self._register_memory_components()
+            self._register_metrics()
+
+            # Configurar PyTorch para usar menos RAM
+            torch.backends.cudnn.benchmark = False
+            torch.backends.cudnn.deterministic = True
+            if Config.DEVICE.type == "cpu":
+                from functions.cpu_inference import configure_cpu_threads
+                configure_cpu_threads()
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(GeneratorService, cls).__new__(cls)
         return cls._instance
 
-    def _get_memory_info(self):
-        """Obtiene información de memoria RAM y swap"""
-        memory = psutil.virtual_memory()
-        swap = psutil.swap_memory()
-        return {
-            'ram_used_gb': memory.used / (1024**3),
-            'ram_available_gb': memory.available / (1024**3),
-            'ram_total_gb': memory.total / (1024**3),
-            'swap_used_gb': swap.used / (1024**3)
-        }
+    def _register_memory_components(self):
+        """Registra en el MemoryManager lo que ocupa memoria y como liberarlo"""
+        registry = ModelRegistry()
+        # Pesos compartidos: solo se miden, liberarlos obligaria a recargar el modelo
+        for name in ('unet', 'vae', 'text_encoder'):
+            self._memory.register(f"model:{name}", lambda name=name: module_bytes(registry.get_loaded(name)))
+        for name in ('merged_unet', 'lora_unet'):
+            self._memory.register(f"model:{name}",
+                                  lambda name=name: module_bytes(registry.get_loaded(f"{name}:{Config.LORA_PATH}")))
+        # Pipeline del modo inactivo: se mide solo lo que no comparte con el activo
+        for mode in ('text', 'image'):
+            self._memory.register(f"pipeline:{mode}", lambda mode=mode: self._exclusive_bytes(mode),
+                                  evict_fn=lambda mode=mode: self._drop_pipeline(mode), priority=2)
+        # Caches: lo primero que se libera bajo presion
+        self._memory.register("cache:sketch_latents", lambda: self._sketch_cache.stats()['bytes'],
+                              evict_fn=self._sketch_cache.clear, priority=0)
+        self._memory.register("cache:prompt_embeds", lambda: self._prompt_cache.stats()['bytes'],
+                              evict_fn=self._prompt_cache.clear, priority=1)
 
-    def _check_memory_sufficient(self, required_gb=2):
-        """Verifica si hay suficiente memoria RAM disponible"""
-        memory_info = self._get_memory_info()
-        available_gb = memory_info['ram_available_gb']
-        
-        print(f"Memoria disponible: {available_gb:.1f}GB / Requerida: ~{required_gb}GB")
-        
-        if available_gb < required_gb:
-            print("Memoria RAM insuficiente, liberando...")
-            self._aggressive_memory_cleanup()
-            
-            # Verificar nuevamente
-            memory_info = self._get_memory_info()
-            available_gb = memory_info['ram_available_gb']
-            
-            if available_gb < required_gb:
-                raise MemoryError(f"Memoria RAM insuficiente. Disponible: {available_gb:.1f}GB, Requerido: ~{required_gb}GB")
-        
-        return True
+    def _register_metrics(self):
+        """Gauges de /api/metrics: cola, escrituras pendientes y memoria residente por componente"""
+        self._metrics.register_gauge('oni_queue_depth', 'Peticiones esperando lote en el BatchScheduler',
+                                     self._scheduler.queue_depth)
+        self._metrics.register_gauge('oni_pending_result_writes', 'Resultados pendientes de escribir a disco',
+                                     self._writer.pending_count)
+        self._metrics.register_gauge('oni_resident_memory_bytes', 'Memoria ocupada por modelos y caches',
+                                     lambda: [({'component': name}, size) for name, size in self._memory.component_sizes().items()])
+        self._metrics.register_gauge('oni_process_rss_bytes', 'Memoria residente del proceso',
+                                     lambda: int(self._memory.memory_info()['process_rss_gb'] * 1024 ** 3))
 
-    def _aggressive_memory_cleanup(self):
-        """Limpieza agresiva de memoria RAM y GPU"""
-        print("Realizando limpieza agresiva de memoria...")
-        
-        # Liberar modelos
-        if self._text_pipe is not None:
-            del self._text_pipe
-            self._text_pipe = None
-            
-        # if self._image_pipe is not None:
-        #     del self._image_pipe
-        #     self._image_pipe = None
-        
-        self._current_mode = None
-        
-        # Limpiar GPU
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-            torch.cuda.synchronize()
-        
-        # Forzar garbage collection
-        gc.collect()
-        
-        # Limpiar imports y módulos temporales
-        if 'functions.load_lora_model' in sys.modules:
-            del sys.modules['functions.load_lora_model']
-        
-        print("Limpieza de memoria completada")
+    def _observe_request(self, mode: str, timing: dict):
+        cache = 'hit' if timing.get('cache_hit') else 'miss'
+        self._metrics.observe('request', timing['total_ms'] / 1000, mode=mode, cache=cache)
+        if not timing.get('cache_hit'):
+            self._metrics.observe('queue', timing['queue_ms'] / 1000, mode=mode)
 
-    def _load_text_model(self):
-        """Carga el modelo de texto a imagen con verificación de memoria"""
-        self._check_memory_sufficient(required_gb=2)
-        
-        if self._text_pipe is None or self._current_mode != 'text':
-            # Liberar modelo anterior
-            if self._image_pipe is not None:
-                del self._image_pipe
-                self._image_pipe = None
-            
-            self._aggressive_memory_cleanup()
+    def get_memory_metrics(self) -> dict:
+        """Marcas de agua, memoria por componente y decisiones del MemoryManager"""
+        return self._memory.metrics()
+
+    def _switch_mode(self, mode: str):
+        """Activa el pipeline del modo pedido y registra cuanto cuesta el cambio"""
+        if self._current_mode == mode:
+            return
 
+        start = time.perf_counter()
+        if mode == 'text' and self._text_pipe is None:
             print("Cargando modelo text2img con LoRA...")
             from functions.load_lora_model import setup_text2img_with_lora
-            
-            # Configurar PyTorch para usar menos RAM
-            torch.backends.cudnn.benchmark = False
-            torch.backends.cudnn.deterministic = True
-            
-            self._text_pipe = setup_text2img_with_lora(
-                Config.MODEL_ID, 
-                r"D:\Ciencias\Drawnime\ai_models\sketch_to_anime_lora_final4"
-            )
-            self._current_mode = 'text'
-            
-            memory_info = self._get_memory_info()
-            print(f"Modelo text2img cargado. RAM usada: {memory_info['ram_used_gb']:.1f}GB")
-
-    def _load_image_model(self):
-        """Carga el modelo de imagen a imagen con verificación de memoria"""
-        self._check_memory_sufficient(required_gb=3)  # 3GB estimado para el modelo
-        
-        if self._image_pipe is None or self._current_mode != 'image':
-            # Liberar modelo anterior
-            if self._text_pipe is not None:
-                del self._text_pipe
-                self._text_pipe = None
-            
-            self._aggressive_memory_cleanup()
-            
+            with self._metrics.timer('model_load', mode=mode):
+                self._text_pipe = setup_text2img_with_lora(Config.MODEL_ID, Config.LORA_PATH)
+        elif mode == 'image' and self._image_pipe is None:
             print("Cargando modelo img2img con LoRA...")
             from functions.load_lora_model import setup_img2img_with_lora
-            
-            # Configurar PyTorch para usar menos RAM
-            torch.backends.cudnn.benchmark = False
-            torch.backends.cudnn.deterministic = True
-            
-            self._image_pipe = setup_img2img_with_lora(
-                Config.MODEL_ID, 
-                r"D:\Ciencias\Drawnime\ai_models\sketch_to_anime_lora_final4"
-            )
-            self._current_mode = 'image'
-            
-            memory_info = self._get_memory_info()
-            print(f"Modelo img2img cargado. RAM usada: {memory_info['ram_used_gb']:.1f}GB")
+            with self._metrics.timer('model_load', mode=mode):
+                self._image_pipe = setup_img2img_with_lora(Config.MODEL_ID, Config.LORA_PATH)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._metrics.observe_stage('mode_switch', elapsed_ms / 1000, mode=mode)
 
-    def text_to_image(self, prompt, num_inference_steps=30, strength=0.9, guidance_scale=7.5, number_per_prompt=1):
-        """Versión optimizada con menos pasos de inferencia"""
+        previous_mode = self._current_mode
+        self._current_mode = mode
+        self._switch_stats['count'] += 1
+        self._switch_stats['total_ms'] += elapsed_ms
+        self._switch_stats['last_ms'] = elapsed_ms
+        self._switch_stats['last'] = f"{previous_mode}->{mode}"
+
+        memory_info = self._memory.memory_info()
+        print(f"Cambio de modo {previous_mode} -> {mode} en {elapsed_ms:.1f}ms. RAM usada: {memory_info['ram_used_gb']:.1f}GB")
+
+    def preload(self):
+        """Construye los dos pipelines de antemano (en el maestro de gunicorn, antes del fork)"""
+        self._memory.check()
+        self._load_image_model()
+        self._load_text_model()
+
+    def _load_text_model(self):
+        """Carga el modelo de texto a imagen (la memoria ya se verifico al recibir la peticion)"""
+        self._switch_mode('text')
+
+    def _load_image_model(self):
+        """Carga el modelo de imagen a imagen (la memoria ya se verifico al recibir la peticion)"""
+        self._switch_mode('image')
+
+    def _pipe(self, mode: str):
+        return self._text_pipe if mode == 'text' else self._image_pipe
+
+    @staticmethod
+    def _pipeline_modules(pipe) -> list[torch.nn.Module]:
+        if pipe is None:
+            return []
+        return [module for module in pipe.components.values() if isinstance(module, torch.nn.Module)]
+
+    def _exclusive_bytes(self, mode: str) -> int:
+        """Bytes que liberaria soltar el pipeline de `mode`: 0 si es el activo o si todo lo comparte"""
+        if mode == self._current_mode:
+            return 0
+        other = self._pipe('image' if mode == 'text' else 'text')
+        shared = {id(module) for module in self._pipeline_modules(other)}
+        return sum(module_bytes(module) for module in self._pipeline_modules(self._pipe(mode)) if id(module) not in shared)
+
+    def _drop_pipeline(self, mode: str):
+        """Suelta el pipeline de `mode`; se reconstruye desde el registro al volver a pedirlo"""
+        if mode == 'text':
+            self._text_pipe = None
+        else:
+            self._image_pipe = None
+        if self._current_mode == mode:
+            self._current_mode = None
+
+    def get_switch_stats(self) -> dict:
+        """Numero de cambios de modo y su coste en milisegundos"""
+        stats = dict(self._switch_stats)
+        stats['avg_ms'] = stats['total_ms'] / stats['count'] if stats['count'] else 0.0
+        return stats
+
+    def get_prompt_cache_stats(self) -> dict:
+        """Aciertos/fallos de la cache de embeddings de prompts"""
+        return self._prompt_cache.stats()
+
+    def get_sketch_cache_stats(self) -> dict:
+        """Aciertos/fallos de la cache de latentes de bocetos"""
+        return self._sketch_cache.stats()
+
+    def get_samplers(self) -> list[dict]:
+        """Samplers que se pueden pedir en `data.sampler` y sus pasos recomendados"""
+        return available_samplers()
+
+    def get_result_cache_stats(self) -> dict:
+        """Aciertos/fallos de la cache en disco de resultados con seed"""
+        if self._result_cache is None:
+            return {'enabled': False}
+        return {'enabled': True, **self._result_cache.stats()}
+
+    def _result_cache_key(self, mode: str, prompt: str, params: dict, seed: int = None, input_image=None) -> str | None:
+        """Clave de la cache de resultados; solo las peticiones con seed son deterministas"""
+        if seed is None or self._result_cache is None:
+            return None
+        image_hash = None
+        if input_image is not None:
+            if not isinstance(input_image, bytes):
+                with open(input_image, 'rb') as f:
+                    input_image = f.read()
+            image_hash = hashlib.sha256(input_image).hexdigest()
+        return ResultCache.make_key(mode, prompt, params, seed, image_hash)
+
+    def _cached_result(self, mode: str, cache_key: str | None, seed: int, number_per_prompt: int, return_images: bool = False) -> dict | None:
+        """Respuesta servida desde la cache de resultados, o None si no esta"""
+        if cache_key is None:
+            return None
+        start = time.perf_counter()
+        cached = self._result_cache.get(cache_key)
+        if cached is None:
+            return None
+        output_format, images = cached
+        print("Resultado servido desde la cache")
+        timing = {
+            'queue_ms': 0.0,
+            'inference_ms': 0.0,
+            'total_ms': round((time.perf_counter() - start) * 1000, 1),
+            'batch_size': 0,
+            'cache_hit': True,
+        }
+        seeds = [seed + i for i in range(number_per_prompt)]
+        result = self._success_result(images, timing, seeds, output_format, return_images)
+        self._observe_request(mode, timing)
+        return result
+
+    def estimate(self, mode: str, width: int = None, height: int = None, number_per_prompt: int = 1,
+                 num_inference_steps: int = None, guidance_scale: float = 7.5, strength: float = 0.7,
+                 sampler: str = None) -> dict:
+        """Estimacion de memoria y duracion antes de generar; ValueError si no cabe en el presupuesto"""
+        width, height = normalize_size(width, height)
+        num_inference_steps = num_inference_steps or default_steps(normalize_sampler(sampler))
+        registry = ModelRegistry()
+        unet = next((registry.get_loaded(name) for name in (f"merged_unet:{Config.LORA_PATH}", f"lora_unet:{Config.LORA_PATH}")
+                     if registry.is_loaded(name)), None)
+        heads = unet.config.attention_head_dim if unet is not None else 8
+        return plan_memory(
+            width, height, Config.GENERATION_MEMORY_BUDGET_MB,
+            num_images=number_per_prompt,
+            num_inference_steps=num_inference_steps,
+            guidance_scale=guidance_scale,
+            strength=strength if mode == 'image' else 1.0,
+            dtype=Config.INFERENCE_DTYPE,
+            attention_heads=heads[0] if isinstance(heads, (list, tuple)) else heads,
+            seconds_per_token_step=self._seconds_per_token_step,
+        )
+
+    def _batch_fits(self, mode: str, params: dict, num_images: int) -> bool:
+        """Si un lote de `num_images` con estos parametros cabe en GENERATION_MEMORY_BUDGET_MB"""
+        params = {k: v for k, v in params.items() if k != 'number_per_prompt'}
         try:
-            # Verificar memoria antes de empezar
-            self._check_memory_sufficient(required_gb=1)
-            
+            self.estimate(mode, number_per_prompt=num_images, **params)
+        except ValueError:
+            return False
+        return True
+
+    def _apply_memory_plan(self, pipe, plan: dict):
+        """Activa VAE por teselas y atencion por cabezas solo si el lote lo necesita"""
+        if plan['vae_tiling']:
+            pipe.vae.enable_tiling()
+        else:
+            pipe.vae.disable_tiling()
+        if plan['attention_slicing']:
+            pipe.enable_attention_slicing("max")
+        else:
+            pipe.disable_attention_slicing()
+
+    def _run_batch(self, mode: str, requests: list[GenerationRequest]) -> list[list]:
+        """Ejecuta un lote del BatchScheduler en una sola llamada al pipeline"""
+        # Se expande una entrada por imagen para que prompts, imagenes y semillas queden alineados
+        prompts, sketches, seeds = [], [], []
+        for request in requests:
+            prompts += [request.prompt] * request.number_per_prompt
+            sketches += [request.image] * request.number_per_prompt
+            seeds += request.seeds
+        params = {k: v for k, v in requests[0].params.items() if k != 'number_per_prompt'}
+        print(f"Ejecutando lote {mode} de {len(requests)} peticiones ({len(prompts)} imagenes)")
+        plan = self.estimate(mode, number_per_prompt=len(prompts), **params)
+
+        # Tiempo por paso: intervalo entre callbacks (el primero incluye preparar latentes y se descarta)
+        step_clock = {'last': None, 'total': 0.0, 'count': 0}
+
+        def on_step_end(pipe, step, timestep, callback_kwargs):
+            now = time.perf_counter()
+            if step_clock['last'] is not None:
+                self._metrics.observe_stage('unet_step', now - step_clock['last'], mode=mode)
+                step_clock['total'] += now - step_clock['last']
+                step_clock['count'] += 1
+            step_clock['last'] = now
+            total_steps = getattr(pipe, 'num_timesteps', None)
+            last_step = total_steps is not None and step + 1 == total_steps
+            offset = 0
+            for request in requests:
+                # Cancelada en un lote compartido: su llamador queda libre ya aunque el resto siga
+                if request.release_if_cancelled():
+                    offset += request.number_per_prompt
+                    continue
+                request.report_progress(step + 1, total_steps)
+                # Previsualizacion barata (proyeccion lineal del latente) cada PREVIEW_INTERVAL pasos
+                if request.on_preview is not None and ((step + 1) % Config.PREVIEW_INTERVAL == 0 or last_step):
+                    latents = callback_kwargs['latents'][offset:offset + request.number_per_prompt]
+                    request.on_preview(step + 1, latents_to_preview(latents))
+                offset += request.number_per_prompt
+            # Si todas las peticiones del lote se cancelaron se aborta el bucle de denoising
+            if all(request.cancelled for request in requests):
+                raise GenerationCancelled()
+            return callback_kwargs
+
+        if mode == 'text':
             self._load_text_model()
+            self._apply_memory_plan(self._text_pipe, plan)
+            generator = TextToAnime(self._text_pipe)
+            results = generator.generate(
+                prompt=prompts, number_per_prompt=1, callback_on_step_end=on_step_end,
+                embedding_cache=self._prompt_cache, seed=seeds, **params)
+        else:
+            self._load_image_model()
+            self._apply_memory_plan(self._image_pipe, plan)
+            generator = SketchToAnime(self._image_pipe)
+            results = generator.generate(
+                sketches, prompt=prompts, number_per_prompt=1, callback_on_step_end=on_step_end,
+                embedding_cache=self._prompt_cache, latent_cache=self._sketch_cache, seed=seeds, **params)
+
+        # Tras el ultimo paso el pipeline solo decodifica con el VAE
+        if step_clock['last'] is not None:
+            self._metrics.observe_stage('vae_decode', time.perf_counter() - step_clock['last'], mode=mode)
+        for stage, seconds in generator.timings.items():
+            self._metrics.observe_stage(stage, seconds, mode=mode)
+        if step_clock['count']:
+            rate = step_clock['total'] / step_clock['count'] / (plan['latent_tokens'] * len(prompts))
+            previous = self._seconds_per_token_step
+            self._seconds_per_token_step = rate if previous is None else 0.8 * previous + 0.2 * rate
+
+        # Repartir las imagenes a cada peticion
+        split, offset = [], 0
+        for request in requests:
+            split.append(results[offset:offset + request.number_per_prompt])
+            offset += request.number_per_prompt
+        return split
+
+    def text_to_image(self, prompt, num_inference_steps=None, strength=0.9, guidance_scale=7.5, number_per_prompt=1, on_progress=None, cancel_event=None, on_preview=None, output_format=None, return_images=False, seed=None, sampler=None, width=None, height=None):
+        """Versión optimizada con menos pasos de inferencia"""
+        with self._metrics.in_flight('text'):
+            try:
+                output_format = ResultWriter.normalize_format(output_format)
+                sampler = normalize_sampler(sampler)
+                num_inference_steps = num_inference_steps or default_steps(sampler)
+                width, height = normalize_size(width, height)
+                # Estimacion previa: si no cabe en el presupuesto de memoria se rechaza ya
+                estimate = self.estimate('text', width, height, number_per_prompt, num_inference_steps, guidance_scale)
+                # Verificar memoria antes de empezar
+                self._memory.check()
             
-            prompt = prompt if prompt else "anime style, high quality, detailed, hair with vibrant colors, masterpiece"
-            text_to_anime = TextToAnime(self._text_pipe)
-            print("Generando imagen de anime desde texto...")
-            # Reducir pasos de inferencia para ahorrar memoria
-            results = text_to_anime.generate(
-                prompt=prompt, 
-                num_inference_steps=num_inference_steps,
-                strength=strength, 
-                guidance_scale=guidance_scale,
-                number_per_prompt=number_per_prompt
-            )
-            filenames = self.save_images(results, current_app.config['RESULT_FOLDER'])
-            del text_to_anime
-            self._aggressive_memory_cleanup()
-
-            return {
-                "status": "success",
-                "message": "imagen generada correctamente",
-                "filenames": filenames
-            }
+                prompt = prompt if prompt else "anime style, high quality, detailed, hair with vibrant colors, masterpiece"
+                cache_key = self._result_cache_key('text', prompt, {
+                    'sampler': sampler,
+                    'num_inference_steps': num_inference_steps,
+                    'guidance_scale': guidance_scale,
+                    'number_per_prompt': number_per_prompt,
+                    'width': width,
+                    'height': height,
+                    'output_format': output_format,
+                }, seed)
+                cached = self._cached_result('text', cache_key, seed, number_per_prompt, return_images)
+                if cached is not None:
+                    return cached
+
+                print("Generando imagen de anime desde texto...")
+                request = self._scheduler.submit(
+                    'text',
+                    prompt,
+                    seed=seed,
+                    on_progress=on_progress,
+                    cancel_event=cancel_event,
+                    on_preview=on_preview,
+                    sampler=sampler,
+                    num_inference_steps=num_inference_steps,
+                    guidance_scale=guidance_scale,
+                    number_per_prompt=number_per_prompt,
+                    width=width,
+                    height=height
+                )
+                results = request.wait()
+                timing = {**request.timing(), 'cache_hit': False}
+                result = self._success_result(results, timing, request.seeds, output_format, return_images, cache_key)
+                result["estimate"] = estimate
+                self._observe_request('text', timing)
+                return result
             
-        except MemoryError as e:
-            print(f"Error de memoria: {e}")
-            self._aggressive_memory_cleanup()
-            return {
-                "status": "error",
-                "message": "Memoria insuficiente. Intenta nuevamente o reduce la resolución."
-            }
-        except Exception as e:
-            print(f"Error en text_to_image: {e}")
-            self._aggressive_memory_cleanup()
-            return {
-                "status": "error",
-                "message": f"Error generando imagen: {str(e)}"
-            }
-
-    def image_to_image(self, input_image, prompt, num_inference_steps=30, strength=0.7, guidance_scale=7.5, number_per_prompt=1):
+            except GenerationCancelled:
+                print("Generacion cancelada")
+                return {
+                    "status": "cancelled",
+                    "message": "generacion cancelada"
+                }
+            except MemoryError as e:
+                print(f"Error de memoria: {e}")
+                self._memory.relieve_pressure()
+                return {
+                    "status": "error",
+                    "message": "Memoria insuficiente. Intenta nuevamente o reduce la resolución."
+                }
+            except Exception as e:
+                print(f"Error en text_to_image: {e}")
+                return {
+                    "status": "error",
+                    "message": f"Error generando imagen: {str(e)}"
+                }
+
+    def image_to_image(self, input_image, prompt, num_inference_steps=None, strength=0.7, guidance_scale=7.5, number_per_prompt=1, on_progress=None, cancel_event=None, on_preview=None, output_format=None, return_images=False, seed=None, sampler=None, width=None, height=None, match_input_size=False):
         """Versión optimizada para imagen a imagen"""
-        try:
-            # Verificar memoria antes de empezar
-            self._check_memory_sufficient(required_gb=1)
+        with self._metrics.in_flight('image'):
+            try:
+                output_format = ResultWriter.normalize_format(output_format)
+                sampler = normalize_sampler(sampler)
+                num_inference_steps = num_inference_steps or default_steps(sampler)
+                if match_input_size and width is None and height is None:
+                    # Salida del mismo tamaño que el boceto subido
+                    if isinstance(input_image, bytes):
+                        width, height = input_size(input_image)
+                    else:
+                        with open(input_image, 'rb') as f:
+                            width, height = input_size(f.read())
+                width, height = normalize_size(width, height)
+                # Estimacion previa: si no cabe en el presupuesto de memoria se rechaza ya
+                estimate = self.estimate('image', width, height, number_per_prompt, num_inference_steps, guidance_scale, strength)
+                # Verificar memoria antes de empezar
+                self._memory.check()
             
-            # self._load_image_model()
-
-            prompt = prompt if prompt else "anime style, high quality, detailed, hair with vibrant colors, masterpiece"
-
-            sketch_to_anime = SketchToAnime(self._image_pipe)
-            # Reducir parámetros para ahorrar memoria
-            results = sketch_to_anime.generate(
-                input_image, 
-                prompt=prompt, 
-                strength=strength,
-                guidance_scale=guidance_scale,
-                num_inference_steps=num_inference_steps,
-                number_per_prompt=number_per_prompt
-            )
-            filenames = self.save_images(results, current_app.config['RESULT_FOLDER'])
-            # Limpiar inmediatamente
-            del sketch_to_anime
-            self._aggressive_memory_cleanup()
-
-            return {
-                "status": "success",
-                "message": "imagen generada correctamente",
-                "filenames": filenames
-            }
+                prompt = prompt if prompt else "anime style, high quality, detailed, hair with vibrant colors, masterpiece"
+                cache_key = self._result_cache_key('image', prompt, {
+                    'sampler': sampler,
+                    'num_inference_steps': num_inference_steps,
+                    'strength': strength,
+                    'guidance_scale': guidance_scale,
+                    'number_per_prompt': number_per_prompt,
+                    'width': width,
+                    'height': height,
+                    'output_format': output_format,
+                }, seed, input_image)
+                cached = self._cached_result('image', cache_key, seed, number_per_prompt, return_images)
+                if cached is not None:
+                    return cached
+
+                request = self._scheduler.submit(
+                    'image',
+                    prompt,
+                    image=input_image,
+                    seed=seed,
+                    on_progress=on_progress,
+                    cancel_event=cancel_event,
+                    on_preview=on_preview,
+                    sampler=sampler,
+                    num_inference_steps=num_inference_steps,
+                    strength=strength,
+                    guidance_scale=guidance_scale,
+                    number_per_prompt=number_per_prompt,
+                    width=width,
+                    height=height
+                )
+                results = request.wait()
+                timing = {**request.timing(), 'cache_hit': False}
+                result = self._success_result(results, timing, request.seeds, output_format, return_images, cache_key)
+                result["estimate"] = estimate
+                self._observe_request('image', timing)
+                return result
             
-        except MemoryError as e:
-            print(f"Error de memoria: {e}")
-            self._aggressive_memory_cleanup()
-            return {
-                "status": "error",
-                "message": "Memoria insuficiente. Intenta nuevamente o reduce el tamaño de la imagen."
-            }
+            except GenerationCancelled:
+                print("Generacion cancelada")
+                return {
+                    "status": "cancelled",
+                    "message": "generacion cancelada"
+                }
+            except MemoryError as e:
+                print(f"Error de memoria: {e}")
+                self._memory.relieve_pressure()
+                return {
+                    "status": "error",
+                    "message": "Memoria insuficiente. Intenta nuevamente o reduce el tamaño de la imagen."
+                }
+            except Exception as e:
+                print(f"Error en image_to_image: {e}")
+                return {
+                    "status": "error",
+                    "message": f"Error generando imagen: {str(e)}"
+                }
+
+    def _get_decode_executor(self) -> ThreadPoolExecutor:
+        # Se crea bajo demanda; tras un fork los hilos del padre no existen
+        if self._decode_executor is None or self._decode_executor_pid != os.getpid():
+            self._decode_executor = ThreadPoolExecutor(max_workers=Config.BULK_DECODE_WORKERS, thread_name_prefix="bulk-decode")
+            self._decode_executor_pid = os.getpid()
+        return self._decode_executor
+
+    def _bulk_submit(self, mode: str, index: int, item, prompt: str, seed: int, done: queue.Queue, cancel_event, params: dict):
+        """Decodifica el boceto (en el pool de decodificacion) y encola la peticion en el BatchScheduler"""
+        try:
+            image = None
+            if mode == 'image':
+                with self._metrics.timer('sketch_prefetch', mode=mode):
+                    image = self._sketch_cache.prefetch(item, (params['width'], params['height']))
+            else:
+                prompt = item or prompt
+            self._scheduler.submit(mode, prompt, image=image, seed=seed, cancel_event=cancel_event,
+                                   on_done=lambda request: done.put((index, request)), **params)
         except Exception as e:
-            print(f"Error en image_to_image: {e}")
-            self._aggressive_memory_cleanup()
-            return {
-                "status": "error",
-                "message": f"Error generando imagen: {str(e)}"
-            }
-
-    def save_images(self, images: list[Image], folder: str) -> list[str]:
-        """Guarda una lista de imágenes en la carpeta especificada y retorna sus nombres de archivo"""
-        filenames = []
-        for idx, img in enumerate(images):
-            random_name = f"output_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{idx}.png"
-            url_image = os.path.join(folder, random_name)
-            img.save(url_image)
-            filenames.append(random_name)
-        return filenames
+            done.put((index, e))
+
+    def generate_many(self, mode: str, items: list, prompt: str = None, num_inference_steps=None, strength=0.7, guidance_scale=7.5,
+                      number_per_prompt=1, output_format=None, return_images=False, seed=None, sampler=None,
+                      width=None, height=None, folder: str = None):
+        """Generacion masiva: `items` son bocetos (modo 'image') o prompts (modo 'text').
+
+        Las etapas se solapan: el pool de decodificacion prepara los bocetos de los
+        siguientes lotes mientras la UNet procesa el actual, y el ResultWriter
+        codifica y guarda en sus hilos. Siempre hay como mucho BULK_MAX_IN_FLIGHT
+        peticiones en vuelo, asi que la memoria no crece con el tamaño del trabajo.
+        Devuelve un iterador con un resultado por elemento (con su `index`) en el
+        orden en que terminan. Con `seed`, el elemento i usa seed + i * number_per_prompt.
+        Los parametros invalidos lanzan ValueError antes de encolar nada.
+        """
+        output_format = ResultWriter.normalize_format(output_format)
+        sampler = normalize_sampler(sampler)
+        num_inference_steps = num_inference_steps or default_steps(sampler)
+        width, height = normalize_size(width, height)
+        # Falla antes de encolar nada si el lote no cabe en el presupuesto de memoria
+        self.estimate(mode, width, height, number_per_prompt, num_inference_steps, guidance_scale, strength)
+        self._memory.check()
+        if not return_images and folder is None:
+            folder = current_app.config['RESULT_FOLDER']
+        default_prompt = "anime style, high quality, detailed, hair with vibrant colors, masterpiece"
+        prompt = prompt or default_prompt
+
+        params = {
+            'sampler': sampler,
+            'num_inference_steps': num_inference_steps,
+            'guidance_scale': guidance_scale,
+            'number_per_prompt': number_per_prompt,
+            'width': width,
+            'height': height,
+        }
+        if mode == 'image':
+            params['strength'] = strength
+        # La validacion es inmediata; la generacion empieza al iterar
+        return self._bulk_results(mode, items, prompt, seed, params, output_format, return_images, folder)
+
+    def _bulk_results(self, mode: str, items: list, prompt: str, seed: int, params: dict, output_format: str, return_images: bool, folder: str):
+        number_per_prompt = params['number_per_prompt']
+        max_in_flight = Config.BULK_MAX_IN_FLIGHT or 2 * self._scheduler.max_batch_size
+        done = queue.Queue()
+        cancel_event = threading.Event()
+        pending = iter(enumerate(items))
+        in_flight = 0
+
+        with self._metrics.in_flight(mode):
+            try:
+                while True:
+                    while in_flight < max_in_flight:
+                        next_item = next(pending, None)
+                        if next_item is None:
+                            break
+                        index, item = next_item
+                        item_seed = None if seed is None else seed + index * number_per_prompt
+                        args = (mode, index, item, prompt, item_seed, done, cancel_event, params)
+                        if mode == 'image':
+                            self._get_decode_executor().submit(self._bulk_submit, *args)
+                        else:
+                            self._bulk_submit(*args)
+                        in_flight += 1
+                    if in_flight == 0:
+                        return
+
+                    index, outcome = done.get()
+                    in_flight -= 1
+                    if isinstance(outcome, Exception):
+                        yield {"index": index, "status": "error", "message": f"Error preparando la entrada: {outcome}"}
+                        continue
+                    if outcome.error is not None:
+                        yield {"index": index, "status": "error", "message": f"Error generando imagen: {outcome.error}"}
+                        continue
+                    timing = {**outcome.timing(), 'cache_hit': False}
+                    result = self._success_result(outcome.images, timing, outcome.seeds, output_format, return_images, folder=folder)
+                    self._observe_request(mode, timing)
+                    yield {"index": index, **result}
+            finally:
+                # El consumidor dejo de leer (cliente desconectado): lo que siga en cola se descarta
+                cancel_event.set()
+
+    def _success_result(self, images: list[Image.Image | bytes], timing: dict, seeds: list[int], output_format: str = None, return_images: bool = False, cache_key: str = None, folder: str = None) -> dict:
+        """Respuesta de exito: nombres de archivo o, con `return_images`, las imagenes codificadas.
+
+        Con `cache_key` las imagenes se codifican una sola vez y esos bytes van a la
+        cache de resultados y a la respuesta.
+        """
+        if cache_key is not None:
+            images = self._writer.encode_many(images, output_format)
+            self._result_cache.put(cache_key, output_format, images)
+        result = {
+            "status": "success",
+            "message": "imagen generada correctamente",
+            "seeds": seeds,
+            "timing": timing
+        }
+        if return_images:
+            # Se devuelven los bytes en la respuesta sin pasar por disco
+            result["filenames"] = []
+            result["images"] = self._writer.encode_base64(images, output_format)
+        else:
+            result["filenames"] = self.save_images(images, folder or current_app.config['RESULT_FOLDER'], output_format)
+        return result
+
+    def save_images(self, images: list[Image.Image | bytes], folder: str, output_format: str = None) -> list[str]:
+        """Encola el guardado de las imágenes en la carpeta especificada y retorna sus nombres de archivo"""
+        return self._writer.save(images, folder, output_format)
+
+    def wait_for_result(self, filename: str, folder: str = None, timeout: float = 30) -> bool:
+        """Espera a que se termine de escribir un resultado antes de servirlo.
+
+        Devuelve False si no existe tras `timeout`; lanza ResultWriteError si la escritura fallo.
+        """
+        if folder is None and has_app_context():
+            folder = current_app.config['RESULT_FOLDER']
+        return self._writer.wait_for(filename, folder, timeout)
 
     def unload_models(self):
-        """Libera todos los modelos de memoria"""
-        self._aggressive_memory_cleanup()
-        print("🧹 Todos los modelos descargados de la memoria")
\ No newline at end of file
+        """Suelta los dos pipelines y vacia las caches.
+
+        Los pesos siguen en ModelRegistry (son compartidos); el siguiente cambio
+        de modo reconstruye el pipeline sin volver a leerlos de disco.
+        """
+        self._memory.relieve_pressure(force=True)
+        self._drop_pipeline('text')
+        self._drop_pipeline('image')
+        print("🧹 Pipelines y caches liberados; los pesos compartidos siguen en ModelRegistry")
\ No newline at end of file
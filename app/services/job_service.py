@@ -0,0 +1,274 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from app.config import Config
+from app.services.metrics_service import MetricsService
+from app.services.shared_state import SharedState
+
+# Cada cuanto mira cada worker si otro le pidio cancelar uno de sus trabajos
+CANCEL_POLL_SECONDS = 0.5
+FINISHED_STATES = ('succeeded', 'failed', 'cancelled')
+
+
+class Job:
+    """Trabajo de generacion asincrono con su estado y progreso"""
+
+    def __init__(self, kind: str, on_change=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.state = 'queued'
+        self.step = 0
+        self.total_steps = None
+        self.result = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+        self.preview_step = None
+        self.previews = None
+        # Cada cambio incrementa `version` y despierta a quien espera (stream SSE)
+        self.version = 0
+        self._changed = threading.Condition()
+        self._on_change = on_change
+
+    def _notify(self):
+        with self._changed:
+            self.version += 1
+            self._changed.notify_all()
+        if self._on_change is not None:
+            self._on_change(self)
+
+    def wait_for_update(self, version: int, timeout: float = None) -> int:
+        """Espera a que el trabajo cambie respecto a `version` y devuelve la nueva version"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def update_progress(self, step: int, total_steps: int = None):
+        self.step = step
+        if total_steps is not None:
+            self.total_steps = total_steps
+        self._notify()
+
+    def update_preview(self, step: int, previews: list):
+        self.preview_step = step
+        self.previews = previews
+        self._notify()
+
+    def is_finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    def to_dict(self) -> dict:
+        data = {
+            'job_id': self.id,
+            'kind': self.kind,
+            'state': self.state,
+            'progress': {'step': self.step, 'total_steps': self.total_steps},
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+        if self.result is not None:
+            data['filenames'] = self.result.get('filenames', [])
+            if 'images' in self.result:
+                data['images'] = self.result['images']
+            data['message'] = self.result.get('message')
+            if 'seeds' in self.result:
+                data['seeds'] = self.result['seeds']
+            if 'timing' in self.result:
+                data['timing'] = self.result['timing']
+            if 'estimate' in self.result:
+                data['estimate'] = self.result['estimate']
+        return data
+
+
+class RemoteJob:
+    """Trabajo de otro worker, leido de SharedState (solo consulta)"""
+
+    def __init__(self, data: dict):
+        self.id = data['job_id']
+        self.state = data['state']
+        self.worker = data.get('worker')
+        self._data = data
+
+    def is_finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    def to_dict(self) -> dict:
+        return {key: value for key, value in self._data.items() if key != 'worker'}
+
+
+class JobService:
+    """Ejecuta las generaciones en un pool de hilos y permite consultarlas o cancelarlas.
+
+    Los trabajos se ejecutan en el worker que los recibio, pero su estado se
+    publica en SharedState: GET /jobs/<id> responde desde cualquier worker y
+    DELETE deja una marca que el worker dueño recoge en CANCEL_POLL_SECONDS.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(JobService, cls).__new__(cls)
+            cls._instance._jobs = {}
+            cls._instance._lock = threading.Lock()
+            cls._instance._executor = None
+            cls._instance._executor_pid = None
+            cls._instance._watcher_pid = None
+            cls._instance._shared = SharedState()
+            cls._instance._publish_lock = threading.Lock()
+            MetricsService().register_gauge('oni_jobs', 'Trabajos asincronos por estado',
+                                            lambda: [({'state': state}, count) for state, count in cls._instance.counts().items()])
+        return cls._instance
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Se crea bajo demanda; tras un fork los hilos del padre no existen
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=Config.JOB_WORKERS, thread_name_prefix="generator-job")
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def _ensure_watcher(self):
+        # Un hilo por proceso que recoge las cancelaciones pedidas a otros workers
+        if self._watcher_pid != os.getpid():
+            self._watcher_pid = os.getpid()
+            threading.Thread(target=self._watch_cancellations, name="job-cancel-watcher", daemon=True).start()
+
+    def _watch_cancellations(self):
+        while True:
+            time.sleep(CANCEL_POLL_SECONDS)
+            for job_id in self._shared.keys('cancel'):
+                if job_id in self._jobs:
+                    self._shared.remove('cancel', job_id)
+                    self.cancel(job_id)
+
+    def _publish(self, job: Job):
+        try:
+            # En orden: el ultimo estado escrito es siempre el ultimo estado del trabajo
+            with self._publish_lock:
+                self._shared.write('jobs', job.id, {**job.to_dict(), 'worker': os.getpid()})
+        except OSError as e:
+            print(f"Error publicando el trabajo {job.id}: {e}")
+
+    def submit(self, kind: str, fn, previews: bool = False, **kwargs) -> Job:
+        """Encola `fn(**kwargs, on_progress=..., cancel_event=...)` y devuelve el trabajo.
+
+        Con `previews` tambien se pasa `on_preview` para recibir previsualizaciones.
+        """
+        job = Job(kind, on_change=self._publish)
+        if previews:
+            kwargs['on_preview'] = job.update_preview
+        app = current_app._get_current_object()
+        with self._lock:
+            self._ensure_watcher()
+            self._prune()
+            self._jobs[job.id] = job
+            self._publish(job)
+            job.future = self._get_executor().submit(self._run, app, job, fn, kwargs)
+        return job
+
+    def _run(self, app, job: Job, fn, kwargs):
+        # Los cambios de estado van bajo el lock del trabajo para no pisarse con cancel()
+        with job._changed:
+            if job.cancel_event.is_set():
+                job.state = 'cancelled'
+                job.finished_at = time.time()
+                job._notify()
+                return
+            job.state = 'running'
+        job._notify()
+        state = 'failed'
+        try:
+            with app.app_context():
+                result = fn(**kwargs, on_progress=job.update_progress, cancel_event=job.cancel_event)
+                if result['status'] == 'success':
+                    result = self._check_writes(result)
+            job.result = result
+            if result['status'] == 'cancelled' or job.cancel_event.is_set():
+                state = 'cancelled'
+            elif result['status'] == 'success':
+                state = 'succeeded'
+        except Exception as e:
+            print(f"Error en el trabajo {job.id}: {e}")
+            job.result = {'status': 'error', 'message': str(e)}
+        finally:
+            with job._changed:
+                job.state = state
+                job.finished_at = time.time()
+            job._notify()
+
+    def _check_writes(self, result: dict) -> dict:
+        """El trabajo termina cuando sus imagenes estan en disco; si alguna no se pudo guardar, falla"""
+        from app.services.generator_service import GeneratorService
+        from app.services.result_writer import ResultWriteError
+        for filename in result.get('filenames', []):
+            try:
+                GeneratorService().wait_for_result(filename)
+            except ResultWriteError as e:
+                return {**result, 'status': 'error', 'message': f'No se pudo guardar {filename}: {e}'}
+        return result
+
+    def get(self, job_id: str) -> Job | RemoteJob | None:
+        """Trabajo de este worker o, si lo ejecuta otro, su ultimo estado publicado"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        data = self._shared.read('jobs', job_id)
+        return RemoteJob(data) if data is not None else None
+
+    def cancel(self, job_id: str) -> Job | RemoteJob | None:
+        """Cancela un trabajo; si aun esta en cola libera su hueco de inmediato.
+
+        Uno en curso queda 'cancelling' hasta que su hilo se libera, en el
+        siguiente paso de denoising aunque comparta lote con otros.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = self.get(job_id)
+            if job is not None and not job.is_finished():
+                # Lo ejecuta otro worker: se le deja la peticion
+                self._shared.write('cancel', job_id, {'requested_at': time.time()})
+                job = RemoteJob({**job.to_dict(), 'state': 'cancelling', 'worker': job.worker})
+            return job
+        with job._changed:
+            if job.is_finished():
+                return job
+            job.cancel_event.set()
+            if job.future is not None and job.future.cancel():
+                job.state = 'cancelled'
+                job.finished_at = time.time()
+            else:
+                job.state = 'cancelling'
+        job._notify()
+        return job
+
+    def counts(self) -> dict:
+        """Trabajos de este worker por estado"""
+        counts = {'queued': 0, 'running': 0, 'cancelling': 0, 'succeeded': 0, 'failed': 0, 'cancelled': 0}
+        for job in list(self._jobs.values()):
+            counts[job.state] += 1
+        return counts
+
+    @staticmethod
+    def fail_orphaned(pid: int):
+        """Marca como fallidos los trabajos sin terminar de un worker que ya no existe"""
+        shared = SharedState()
+        for job_id, data in shared.items('jobs'):
+            if data.get('worker') == pid and data['state'] not in FINISHED_STATES:
+                shared.write('jobs', job_id, {**data, 'state': 'failed', 'finished_at': time.time(),
+                                              'message': 'El worker que ejecutaba el trabajo termino'})
+                shared.remove('cancel', job_id)
+
+    def _prune(self):
+        """Olvida los trabajos terminados mas antiguos por encima de JOB_HISTORY"""
+        finished = [job for job in self._jobs.values() if job.is_finished()]
+        excess = len(finished) - Config.JOB_HISTORY
+        if excess > 0:
+            finished.sort(key=lambda job: job.finished_at)
+            for job in finished[:excess]:
+                del self._jobs[job.id]
+                self._shared.remove('jobs', job.id)
+                self._shared.remove('cancel', job.id)
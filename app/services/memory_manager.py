@@ -0,0 +1,142 @@
+import gc
+import threading
+import time
+from collections import deque
+import psutil
+import torch
+from app.config import Config
+
+GB = 1024 ** 3
+
+
+class MemoryManager:
+    """Presupuesto de memoria con marcas de agua baja y alta.
+
+    Los componentes se registran con una funcion que mide lo que ocupan y,
+    opcionalmente, otra que los libera. Solo cuando la RAM (o VRAM) disponible
+    cae por debajo de la marca baja se liberan componentes, de menor a mayor
+    prioridad, hasta recuperar la marca alta. Cada decision queda registrada.
+    """
+
+    def __init__(self, low_watermark_gb: float = None, high_watermark_gb: float = None, gpu_low_watermark_gb: float = None):
+        self.low_watermark = (low_watermark_gb or Config.MEMORY_LOW_WATERMARK_GB) * GB
+        self.high_watermark = (high_watermark_gb or Config.MEMORY_HIGH_WATERMARK_GB) * GB
+        self.gpu_low_watermark = (gpu_low_watermark_gb or Config.MEMORY_GPU_LOW_WATERMARK_GB) * GB
+
+        self._components = {}
+        self._lock = threading.RLock()
+        self._decisions = deque(maxlen=100)
+        self._counters = {'checks': 0, 'pressure_events': 0, 'evictions': 0, 'freed_bytes': 0, 'rejections': 0}
+
+    def register(self, name: str, size_fn, evict_fn=None, priority: int = 0):
+        """Registra un componente; los de menor prioridad se liberan primero.
+
+        Sin `evict_fn` el componente solo se mide (por ejemplo, los pesos compartidos).
+        """
+        with self._lock:
+            self._components[name] = {'size_fn': size_fn, 'evict_fn': evict_fn, 'priority': priority}
+
+    def memory_info(self) -> dict:
+        """Obtiene información de memoria RAM, swap y GPU"""
+        memory = psutil.virtual_memory()
+        swap = psutil.swap_memory()
+        info = {
+            'ram_used_gb': memory.used / GB,
+            'ram_available_gb': memory.available / GB,
+            'ram_total_gb': memory.total / GB,
+            'swap_used_gb': swap.used / GB,
+            'process_rss_gb': psutil.Process().memory_info().rss / GB,
+        }
+        if torch.cuda.is_available():
+            free, total = torch.cuda.mem_get_info()
+            info['gpu_available_gb'] = free / GB
+            info['gpu_total_gb'] = total / GB
+        return info
+
+    def component_sizes(self) -> dict:
+        sizes = {}
+        for name, component in list(self._components.items()):
+            try:
+                sizes[name] = int(component['size_fn']())
+            except Exception:
+                sizes[name] = 0
+        return sizes
+
+    def _under_pressure(self, threshold_ram: float, threshold_gpu: float) -> bool:
+        if psutil.virtual_memory().available < threshold_ram:
+            return True
+        if torch.cuda.is_available():
+            free, _ = torch.cuda.mem_get_info()
+            return free < threshold_gpu
+        return False
+
+    def check(self):
+        """Comprueba la memoria antes de generar; libera solo si hay presion real"""
+        self._counters['checks'] += 1
+        if not self._under_pressure(self.low_watermark, self.gpu_low_watermark):
+            return True
+
+        self.relieve_pressure()
+        if self._under_pressure(self.low_watermark, self.gpu_low_watermark):
+            self._counters['rejections'] += 1
+            available = psutil.virtual_memory().available / GB
+            self._record('reject', None, 0)
+            raise MemoryError(f"Memoria RAM insuficiente. Disponible: {available:.1f}GB, Minimo: {self.low_watermark / GB:.1f}GB")
+        return True
+
+    def relieve_pressure(self, force: bool = False):
+        """Libera componentes por prioridad hasta superar la marca alta (o todos con force)"""
+        with self._lock:
+            self._counters['pressure_events'] += 1
+            # Primero lo barato: cache del allocator de CUDA
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+            if not force and not self._under_pressure(self.high_watermark, self.gpu_low_watermark):
+                return
+
+            evictable = sorted(
+                ((name, c) for name, c in self._components.items() if c['evict_fn'] is not None),
+                key=lambda item: item[1]['priority']
+            )
+            for name, component in evictable:
+                if not force and not self._under_pressure(self.high_watermark, self.gpu_low_watermark):
+                    break
+                size = int(component['size_fn']())
+                if size == 0:
+                    continue
+                component['evict_fn']()
+                self._counters['evictions'] += 1
+                self._counters['freed_bytes'] += size
+                self._record('evict', name, size)
+
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def _record(self, action: str, component: str | None, size: int):
+        info = self.memory_info()
+        self._decisions.append({
+            'time': time.time(),
+            'action': action,
+            'component': component,
+            'bytes': size,
+            'ram_available_gb': round(info['ram_available_gb'], 2),
+        })
+        print(f"MemoryManager: {action} {component or ''} ({size / GB:.2f}GB), RAM disponible {info['ram_available_gb']:.1f}GB")
+
+    def metrics(self) -> dict:
+        return {
+            'watermarks_gb': {'low': self.low_watermark / GB, 'high': self.high_watermark / GB, 'gpu_low': self.gpu_low_watermark / GB},
+            'memory': self.memory_info(),
+            'components_bytes': self.component_sizes(),
+            'counters': dict(self._counters),
+            'decisions': list(self._decisions),
+        }
+
+
+def module_bytes(module) -> int:
+    """Bytes de parametros y buffers de un nn.Module"""
+    if module is None:
+        return 0
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
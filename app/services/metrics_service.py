@@ -0,0 +1,214 @@
+import bisect
+import contextlib
+import os
+import threading
+import time
+from app.config import Config
+from app.services.shared_state import SharedState
+
+# Limites de los buckets en segundos (el ultimo, +Inf, se añade al exportar)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = []
+    for key, value in sorted(labels.items()):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Histograma acumulativo con etiquetas, como los de Prometheus"""
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            idx = bisect.bisect_left(self.buckets, value)
+            if idx < len(self.buckets):
+                series['counts'][idx] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: dict(value, counts=list(value['counts'])) for key, value in self._series.items()}
+        for key, data in sorted(series.items()):
+            labels = dict(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, data['counts']):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {data['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(data['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {data['count']}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self) -> list:
+        """Series en forma serializable: [etiquetas, cuentas por bucket, suma, total]"""
+        with self._lock:
+            return [[list(key), list(data['counts']), data['sum'], data['count']] for key, data in self._series.items()]
+
+    def merge(self, series: list):
+        """Suma las series de un `snapshot` (de otro worker) a las propias"""
+        with self._lock:
+            for labels, counts, total, count in series:
+                key = tuple(tuple(item) for item in labels)
+                data = self._series.get(key)
+                if data is None:
+                    data = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+                data['counts'] = [a + b for a, b in zip(data['counts'], counts)]
+                data['sum'] += total
+                data['count'] += count
+
+
+class MetricsService:
+    """Metricas del servicio en formato de texto de Prometheus.
+
+    Los histogramas se alimentan con `observe`/`timer`; los gauges son funciones
+    que se evaluan en cada lectura de /api/metrics y devuelven un numero o una
+    lista de (etiquetas, valor).
+
+    Con varios workers cada uno publica su foto en SharedState cada
+    METRICS_SYNC_SECONDS; /api/metrics suma los histogramas de todos (tambien
+    de los workers ya terminados) y etiqueta los gauges con el pid del worker.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(MetricsService, cls).__new__(cls)
+            cls._instance._histograms = {
+                'stage': Histogram('oni_stage_duration_seconds', 'Duracion de cada etapa de la generacion'),
+                'request': Histogram('oni_request_duration_seconds', 'Duracion total de las peticiones de generacion'),
+                'queue': Histogram('oni_queue_wait_seconds', 'Tiempo en la cola del BatchScheduler'),
+            }
+            cls._instance._gauges = {}
+            cls._instance._in_flight = {}
+            cls._instance._lock = threading.Lock()
+            cls._instance._shared = SharedState()
+            cls._instance.register_gauge('oni_requests_in_flight', 'Peticiones de generacion en curso',
+                                         cls._instance._in_flight_values)
+        return cls._instance
+
+    def observe(self, histogram: str, seconds: float, **labels):
+        self._histograms[histogram].observe(seconds, **labels)
+
+    def observe_stage(self, stage: str, seconds: float, **labels):
+        self._histograms['stage'].observe(seconds, stage=stage, **labels)
+
+    @contextlib.contextmanager
+    def timer(self, stage: str, **labels):
+        """Mide el bloque como una etapa del histograma de etapas"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start, **labels)
+
+    @contextlib.contextmanager
+    def in_flight(self, mode: str):
+        """Cuenta la peticion como en curso mientras dura el bloque"""
+        with self._lock:
+            self._in_flight[mode] = self._in_flight.get(mode, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight[mode] -= 1
+
+    def _in_flight_values(self) -> list[tuple[dict, int]]:
+        with self._lock:
+            return [({'mode': mode}, count) for mode, count in self._in_flight.items()]
+
+    def register_gauge(self, name: str, help_text: str, fn):
+        self._gauges[name] = (help_text, fn)
+
+    def start_worker(self):
+        """Llamar en cada worker tras el fork (gunicorn post_fork).
+
+        Lo heredado del maestro ya lo publico el maestro (when_ready), asi que el
+        worker empieza de cero y publica su foto cada METRICS_SYNC_SECONDS.
+        """
+        for histogram in self._histograms.values():
+            histogram.clear()
+        threading.Thread(target=self._publish_loop, name="metrics-publisher", daemon=True).start()
+
+    def _publish_loop(self):
+        while True:
+            time.sleep(Config.METRICS_SYNC_SECONDS)
+            try:
+                self.publish()
+            except OSError as e:
+                print(f"Error publicando metricas: {e}")
+
+    def _gauge_values(self) -> dict:
+        gauges = {}
+        for name, (help_text, fn) in sorted(self._gauges.items()):
+            try:
+                values = fn()
+            except Exception as e:
+                print(f"Error leyendo la metrica {name}: {e}")
+                continue
+            if not isinstance(values, list):
+                values = [({}, values)]
+            gauges[name] = [help_text, [[labels, value] for labels, value in values]]
+        return gauges
+
+    def publish(self, include_gauges: bool = True):
+        """Publica la foto de este proceso para que cualquier worker la agregue"""
+        self._shared.write('metrics', str(os.getpid()), {
+            'histograms': {key: histogram.snapshot() for key, histogram in self._histograms.items()},
+            'gauges': self._gauge_values() if include_gauges else {},
+        })
+
+    @staticmethod
+    def retire_worker(pid: int):
+        """Un worker termino: sus histogramas siguen sumando, sus gauges ya no valen"""
+        shared = SharedState()
+        snapshot = shared.read('metrics', str(pid))
+        if snapshot is not None:
+            shared.write('metrics', f"exited-{pid}-{time.time_ns()}", {'histograms': snapshot['histograms'], 'gauges': {}})
+            shared.remove('metrics', str(pid))
+
+    def render(self) -> str:
+        self.publish()
+        snapshots = sorted(self._shared.items('metrics'))
+        lines = []
+        for key, histogram in self._histograms.items():
+            merged = Histogram(histogram.name, histogram.help, histogram.buckets)
+            for _, snapshot in snapshots:
+                merged.merge(snapshot['histograms'].get(key, []))
+            lines += merged.render()
+        gauges = {}
+        for worker, snapshot in snapshots:
+            for name, (help_text, values) in snapshot['gauges'].items():
+                entry = gauges.setdefault(name, [help_text, []])
+                entry[1] += [({**labels, 'worker': worker}, value) for labels, value in values]
+        for name, (help_text, values) in sorted(gauges.items()):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            lines += [f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in values]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from app.config import Config
+
+
+class ResultCache:
+    """Cache en disco de resultados deterministas (peticiones con seed), con expulsion LRU por tamaño.
+
+    Cada entrada son los bytes ya codificados de sus imagenes (`<clave>_<i>.<ext>`)
+    mas un `<clave>.json`; la fecha de modificacion del json marca el ultimo acceso,
+    asi que el orden LRU sobrevive a reinicios sin un indice aparte.
+    """
+
+    def __init__(self, folder: str = None, max_bytes: int = None):
+        self.folder = folder or Config.RESULT_CACHE_FOLDER
+        self.max_bytes = max_bytes or Config.RESULT_CACHE_MAX_MB * 1024 * 1024
+        self._lock = threading.Lock()
+        self._entries = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _adapter_identity(lora_path: str) -> list | None:
+        """Nombre, tamaño y mtime de los archivos del adaptador: reentrenar el LoRA cambia la clave"""
+        try:
+            names = sorted(name for name in os.listdir(lora_path) if name.startswith('adapter_'))
+            return [(name, stat.st_size, stat.st_mtime_ns)
+                    for name, stat in ((name, os.stat(os.path.join(lora_path, name))) for name in names)]
+        except OSError:
+            return None
+
+    @staticmethod
+    def make_key(mode: str, prompt: str, params: dict, seed: int, image_hash: str = None) -> str:
+        payload = {
+            'model': Config.MODEL_ID,
+            'lora': Config.LORA_PATH,
+            'adapter': ResultCache._adapter_identity(Config.LORA_PATH),
+            # Fusionar el LoRA o aplicarlo en runtime, y el dtype, cambian los pixeles
+            'fuse_lora': Config.FUSE_LORA,
+            'dtype': str(Config.INFERENCE_DTYPE),
+            'mode': mode,
+            'prompt': prompt,
+            'params': params,
+            'seed': seed,
+            'image': image_hash,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def _load_entries(self):
+        """Reconstruye el indice en memoria a partir de los archivos de la carpeta"""
+        if self._entries is not None:
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        self._entries = {}
+        for name in os.listdir(self.folder):
+            if not name.endswith('.json'):
+                continue
+            key = name[:-5]
+            try:
+                with open(os.path.join(self.folder, name)) as f:
+                    meta = json.load(f)
+                size = sum(os.path.getsize(os.path.join(self.folder, file)) for file in meta['files'])
+                self._entries[key] = {
+                    'files': meta['files'],
+                    'format': meta['format'],
+                    'bytes': size,
+                    'last_access': os.path.getmtime(os.path.join(self.folder, name)),
+                }
+            except (OSError, ValueError, KeyError):
+                continue
+
+    def get(self, key: str) -> tuple[str, list[bytes]] | None:
+        """(formato, bytes de cada imagen) si la clave esta en cache"""
+        with self._lock:
+            self._load_entries()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            try:
+                images = []
+                for file in entry['files']:
+                    with open(os.path.join(self.folder, file), 'rb') as f:
+                        images.append(f.read())
+                now = time.time()
+                os.utime(os.path.join(self.folder, f"{key}.json"), (now, now))
+            except OSError:
+                # Entrada borrada a mano o a medias: se descarta
+                self._remove(key)
+                self.misses += 1
+                return None
+            entry['last_access'] = now
+            self.hits += 1
+            return entry['format'], images
+
+    def put(self, key: str, output_format: str, images: list[bytes]):
+        with self._lock:
+            self._load_entries()
+            if key in self._entries:
+                return
+            files = []
+            for idx, data in enumerate(images):
+                file = f"{key}_{idx}.{output_format}"
+                tmp_path = os.path.join(self.folder, f"{file}.{uuid.uuid4().hex}.tmp")
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, os.path.join(self.folder, file))
+                files.append(file)
+            # El json se escribe al final: marca la entrada como completa
+            meta_path = os.path.join(self.folder, f"{key}.json")
+            with open(meta_path, 'w') as f:
+                json.dump({'files': files, 'format': output_format}, f)
+            self._entries[key] = {
+                'files': files,
+                'format': output_format,
+                'bytes': sum(len(data) for data in images),
+                'last_access': time.time(),
+            }
+            self._evict()
+
+    def _evict(self):
+        total = sum(entry['bytes'] for entry in self._entries.values())
+        for key in sorted(self._entries, key=lambda k: self._entries[k]['last_access']):
+            if total <= self.max_bytes:
+                break
+            total -= self._entries[key]['bytes']
+            self._remove(key)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        files = (entry['files'] if entry else []) + [f"{key}.json"]
+        for file in files:
+            try:
+                os.remove(os.path.join(self.folder, file))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._load_entries()
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': sum(entry['bytes'] for entry in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
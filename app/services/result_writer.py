@@ -0,0 +1,184 @@
+import base64
+import hashlib
+import io
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from PIL import Image
+from app.config import Config
+from app.services.metrics_service import MetricsService
+from app.services.shared_state import SharedState
+
+# Nombres de escrituras fallidas que se recuerdan para responder a /result
+MAX_FAILED_WRITES = 1024
+
+
+class ResultWriteError(Exception):
+    """La escritura en segundo plano de un resultado fallo"""
+    pass
+
+
+FORMATS = {
+    'png': ('PNG', 'png'),
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+    'jpg': ('JPEG', 'jpg'),
+}
+
+
+class ResultWriter:
+    """Codifica y guarda las imagenes generadas en un pool de hilos.
+
+    Los nombres son uuid o hash del contenido, asi que peticiones simultaneas no
+    se pisan. `save` devuelve los nombres al momento; quien pida el archivo antes
+    de que se escriba espera con `wait_for`.
+    """
+
+    def __init__(self, workers: int = None):
+        self.workers = workers or Config.RESULT_WRITER_WORKERS
+        self._executor = None
+        self._executor_pid = None
+        self._pending: dict[str, Future] = {}
+        self._failed: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        # Los fallos tambien se publican: /result puede llegar a otro worker
+        self._shared = SharedState()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Se crea bajo demanda; tras un fork los hilos del padre no existen
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="result-writer")
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    @staticmethod
+    def normalize_format(output_format: str = None) -> str:
+        output_format = (output_format or Config.RESULT_FORMAT).lower()
+        if output_format not in FORMATS:
+            raise ValueError(f"Formato no soportado: {output_format}. Usa png, webp o jpeg")
+        return output_format
+
+    @staticmethod
+    def encode(image: Image.Image, output_format: str = None) -> bytes:
+        """Codifica una imagen segun el formato y la calidad configurados"""
+        output_format = ResultWriter.normalize_format(output_format)
+        pil_format, _ = FORMATS[output_format]
+        buffer = io.BytesIO()
+        with MetricsService().timer('image_encode', format=output_format):
+            if pil_format == 'PNG':
+                image.save(buffer, format='PNG', compress_level=Config.RESULT_PNG_COMPRESS_LEVEL)
+            else:
+                image.save(buffer, format=pil_format, quality=Config.RESULT_QUALITY)
+        return buffer.getvalue()
+
+    def encode_many(self, images: list[Image.Image], output_format: str = None) -> list[bytes]:
+        """Codifica varias imagenes en paralelo"""
+        output_format = self.normalize_format(output_format)
+        return list(self._get_executor().map(lambda image: self.encode(image, output_format), images))
+
+    def _filename(self, image: Image.Image | bytes, output_format: str) -> str:
+        _, extension = FORMATS[output_format]
+        if Config.RESULT_NAMING == 'hash':
+            content = image if isinstance(image, bytes) else image.tobytes()
+            digest = hashlib.sha256(content).hexdigest()[:32]
+            return f"output_{digest}.{extension}"
+        return f"output_{uuid.uuid4().hex}.{extension}"
+
+    def _write(self, image: Image.Image | bytes, path: str, output_format: str):
+        data = image if isinstance(image, bytes) else self.encode(image, output_format)
+        # Se escribe a un temporal y se renombra: nunca se sirve un archivo a medias
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with MetricsService().timer('image_save'):
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+    def save(self, images: list[Image.Image | bytes], folder: str, output_format: str = None) -> list[str]:
+        """Encola la escritura de las imagenes (o de sus bytes ya codificados) y devuelve sus nombres de archivo"""
+        output_format = self.normalize_format(output_format)
+        os.makedirs(folder, exist_ok=True)
+        filenames = []
+        for image in images:
+            filename = self._filename(image, output_format)
+            future = self._get_executor().submit(self._write, image, os.path.join(folder, filename), output_format)
+            with self._lock:
+                self._pending[filename] = future
+            future.add_done_callback(lambda _, filename=filename: self._done(filename))
+            filenames.append(filename)
+        return filenames
+
+    def _done(self, filename: str):
+        with self._lock:
+            future = self._pending.pop(filename, None)
+            if future is not None and future.exception() is not None:
+                self._failed[filename] = str(future.exception())
+                while len(self._failed) > MAX_FAILED_WRITES:
+                    self._failed.popitem(last=False)
+        if future is not None and future.exception() is not None:
+            print(f"Error guardando {filename}: {future.exception()}")
+            try:
+                self._shared.write('failed_writes', filename, {'error': str(future.exception())})
+                self._shared.prune('failed_writes', MAX_FAILED_WRITES)
+            except OSError as e:
+                print(f"Error publicando el fallo de {filename}: {e}")
+
+    def encode_base64(self, images: list[Image.Image | bytes], output_format: str = None) -> list[dict]:
+        """Codifica las imagenes en paralelo para devolverlas en la respuesta, sin disco"""
+        output_format = self.normalize_format(output_format)
+        if all(isinstance(image, bytes) for image in images):
+            encoded = images
+        else:
+            encoded = self.encode_many(images, output_format)
+        return [
+            {'format': output_format, 'data': base64.b64encode(data).decode('ascii')}
+            for data in encoded
+        ]
+
+    def wait_for(self, filename: str, folder: str = None, timeout: float = 30) -> bool:
+        """Espera a que `filename` este escrito; False si no aparece antes de `timeout`.
+
+        Si la escritura fallo (en este o en otro worker) se lanza ResultWriteError.
+        Si no esta pendiente en este proceso (otro worker, o aun no encolada) y se
+        indica `folder`, se espera a que el archivo aparezca en disco.
+        """
+        with self._lock:
+            future = self._pending.get(filename)
+        error = self.failure(filename)
+        if error is not None:
+            raise ResultWriteError(error)
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except TimeoutError:
+                return False
+            except Exception as e:
+                raise ResultWriteError(str(e)) from e
+            return True
+        if folder is None:
+            return True
+        path = os.path.join(folder, filename)
+        deadline = time.monotonic() + timeout
+        while not os.path.exists(path):
+            error = self.failure(filename)
+            if error is not None:
+                raise ResultWriteError(error)
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.1)
+        return True
+
+    def failure(self, filename: str) -> str | None:
+        """Error de la escritura de `filename`, si fallo (en cualquier worker)"""
+        with self._lock:
+            error = self._failed.get(filename)
+        if error is None:
+            failed = self._shared.read('failed_writes', filename)
+            error = failed['error'] if failed is not None else None
+        return error
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
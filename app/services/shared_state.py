@@ -0,0 +1,85 @@
+import atexit
+import json
+import os
+import shutil
+import uuid
+from app.config import Config
+
+
+class SharedState:
+    """Registros JSON compartidos entre los workers de gunicorn.
+
+    Cada worker es un proceso con su propia memoria: lo que debe verse desde
+    cualquiera de ellos (trabajos, escrituras fallidas, metricas) se publica en
+    Config.SHARED_STATE_DIR como un archivo por clave, escrito con rename
+    atomico. El proceso que crea la carpeta la borra al salir.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SharedState, cls).__new__(cls)
+            cls._instance.root = Config.SHARED_STATE_DIR
+            # Los workers heredan el atexit del maestro: solo borra quien lo registro
+            atexit.register(cls._instance._cleanup, os.getpid())
+        return cls._instance
+
+    def _path(self, kind: str, key: str) -> str:
+        return os.path.join(self.root, kind, f"{key}.json")
+
+    def write(self, kind: str, key: str, data: dict):
+        path = self._path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def read(self, kind: str, key: str) -> dict | None:
+        try:
+            with open(self._path(kind, key), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def remove(self, kind: str, key: str):
+        try:
+            os.remove(self._path(kind, key))
+        except FileNotFoundError:
+            pass
+
+    def keys(self, kind: str) -> list[str]:
+        try:
+            names = os.listdir(os.path.join(self.root, kind))
+        except FileNotFoundError:
+            return []
+        return [name[:-len(".json")] for name in names if name.endswith(".json")]
+
+    def items(self, kind: str) -> list[tuple[str, dict]]:
+        items = []
+        for key in self.keys(kind):
+            data = self.read(kind, key)
+            if data is not None:
+                items.append((key, data))
+        return items
+
+    def prune(self, kind: str, keep: int):
+        """Borra los registros mas antiguos de `kind` por encima de `keep`"""
+        paths = [self._path(kind, key) for key in self.keys(kind)]
+        if len(paths) <= keep:
+            return
+        aged = []
+        for path in paths:
+            try:
+                aged.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                pass
+        for _, path in sorted(aged)[:len(aged) - keep]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _cleanup(self, owner_pid: int):
+        if os.getpid() == owner_pid:
+            shutil.rmtree(self.root, ignore_errors=True)
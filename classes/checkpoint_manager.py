@@ -0,0 +1,123 @@
+import os
+import random
+import re
+import shutil
+import numpy as np
+import torch
+from concurrent.futures import Future, ThreadPoolExecutor
+from peft import get_peft_model_state_dict, set_peft_model_state_dict
+from safetensors.torch import load_file, save_file
+
+ADAPTER_FILE = "adapter_model.safetensors"
+STATE_FILE = "training_state.pt"
+CHECKPOINT_PATTERN = re.compile(r"^step_(\d+)$")
+
+
+def _to_cpu(obj):
+    """Copia en CPU de tensores anidados en dicts/listas (el entrenamiento sigue modificando los originales)"""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {key: _to_cpu(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_cpu(value) for value in obj)
+    return obj
+
+
+class CheckpointManager:
+    """Checkpoints de entrenamiento con solo el adaptador LoRA, escritos en segundo plano.
+
+    `save` toma una copia en CPU del adaptador, del optimizador, del scaler, del
+    RNG y de la posicion en el dataset y la escribe en un hilo aparte, asi que el
+    bucle solo espera la copia. Cada checkpoint es `step_<N>/` con
+    `adapter_model.safetensors` + `adapter_config.json` (cargable como LoRA con
+    PeftModel.from_pretrained) y `training_state.pt`. Se escribe en una carpeta
+    temporal y se renombra: un checkpoint visible siempre esta completo.
+    """
+
+    def __init__(self, root: str, keep_last: int = 3):
+        self.root = root
+        self.keep_last = keep_last
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint-writer")
+        self._pending: Future = None
+        os.makedirs(root, exist_ok=True)
+
+    def save(self, unet, optimizer, scaler, training_state: dict) -> str:
+        """Encola el checkpoint del paso `training_state['global_step']` y devuelve su ruta"""
+        # Como mucho una escritura en curso: no se acumulan copias en memoria
+        self.wait()
+        snapshot = {
+            "adapter": _to_cpu(get_peft_model_state_dict(unet)),
+            "adapter_config": unet.peft_config["default"],
+            "state": {
+                **training_state,
+                "optimizer": _to_cpu(optimizer.state_dict()),
+                "scaler": scaler.state_dict(),
+                "rng": {
+                    "python": random.getstate(),
+                    "numpy": np.random.get_state(),
+                    "torch": torch.get_rng_state(),
+                    "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+                },
+            },
+        }
+        path = os.path.join(self.root, f"step_{training_state['global_step']}")
+        self._pending = self._executor.submit(self._write, snapshot, path)
+        return path
+
+    def _write(self, snapshot: dict, path: str):
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        save_file(snapshot["adapter"], os.path.join(tmp_path, ADAPTER_FILE), metadata={"format": "pt"})
+        snapshot["adapter_config"].save_pretrained(tmp_path)
+        torch.save(snapshot["state"], os.path.join(tmp_path, STATE_FILE))
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        self._prune()
+        print(f"Checkpoint guardado en {path}")
+
+    def _prune(self):
+        for path in self.checkpoints()[:-self.keep_last] if self.keep_last > 0 else []:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def wait(self):
+        """Espera a la escritura pendiente (y propaga su error, si lo hubo)"""
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            pending.result()
+
+    def checkpoints(self) -> list[str]:
+        """Checkpoints completos, del mas antiguo al mas reciente"""
+        steps = []
+        for name in os.listdir(self.root):
+            match = CHECKPOINT_PATTERN.match(name)
+            if match:
+                steps.append(int(match.group(1)))
+        return [os.path.join(self.root, f"step_{step}") for step in sorted(steps)]
+
+    def latest(self) -> str | None:
+        checkpoints = self.checkpoints()
+        return checkpoints[-1] if checkpoints else None
+
+    @staticmethod
+    def load(path: str, unet, optimizer, scaler) -> dict:
+        """Restaura adaptador, optimizador y scaler; devuelve el estado de entrenamiento.
+
+        El RNG queda en `state['rng']` para restaurarlo con `restore_rng` en el
+        mismo punto del bucle en que se guardo.
+        """
+        set_peft_model_state_dict(unet, load_file(os.path.join(path, ADAPTER_FILE), device=str(unet.device)))
+        # El estado del RNG de numpy no es un tensor: hace falta el unpickler completo (checkpoints propios)
+        state = torch.load(os.path.join(path, STATE_FILE), map_location="cpu", weights_only=False)
+        optimizer.load_state_dict(state.pop("optimizer"))
+        scaler.load_state_dict(state.pop("scaler"))
+        return state
+
+    @staticmethod
+    def restore_rng(rng: dict):
+        random.setstate(rng["python"])
+        np.random.set_state(rng["numpy"])
+        torch.set_rng_state(rng["torch"])
+        if rng["cuda"] is not None and torch.cuda.is_available():
+            torch.cuda.set_rng_state_all(rng["cuda"])
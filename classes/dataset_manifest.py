@@ -0,0 +1,94 @@
+import csv
+import hashlib
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+FIELDS = ("pair_id", "sketch", "anime", "split")
+
+
+def _list_dir(path: str) -> tuple[list[str], list[str]]:
+    """Archivos de imagen y subcarpetas de una carpeta (una sola llamada a scandir)"""
+    files, subdirs = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                files.append(entry.path)
+    return files, subdirs
+
+
+def scan_images(roots: list[str], num_threads: int = 16) -> list[dict[str, str]]:
+    """Recorre varias carpetas (y sus subcarpetas) en paralelo.
+
+    Cada carpeta es una tarea del pool, asi que las raices y las subcarpetas se
+    listan a la vez; en discos de red la latencia de cada listado se solapa.
+    Devuelve, por raiz, {id: ruta} donde el id es la ruta relativa sin extension.
+    """
+    found = [{} for _ in roots]
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        pending = {executor.submit(_list_dir, root): (i, root) for i, root in enumerate(roots)}
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                i, _ = pending.pop(future)
+                files, subdirs = future.result()
+                for path in files:
+                    pair_id = os.path.splitext(os.path.relpath(path, roots[i]))[0].replace(os.sep, "/")
+                    found[i][pair_id] = path
+                for subdir in subdirs:
+                    pending[executor.submit(_list_dir, subdir)] = (i, subdir)
+    return found
+
+
+def assign_split(pair_id: str, seed: int = 42, val_ratio: float = 0.2) -> str:
+    """Split determinista por hash de (seed, id): no depende del orden ni de los demas archivos"""
+    digest = hashlib.sha1(f"{seed}:{pair_id}".encode("utf-8")).digest()
+    return "val" if int.from_bytes(digest[:8], "big") / 2 ** 64 < val_ratio else "train"
+
+
+def build_manifest(sketch_dir: str, anime_dir: str, out_path: str, seed: int = 42, val_ratio: float = 0.2,
+                   num_threads: int = 16) -> dict:
+    """Empareja bocetos y caras por id y escribe el manifiesto CSV (pair_id, sketch, anime, split).
+
+    Los archivos nunca se mueven. Las parejas incompletas no entran en el
+    manifiesto y se cuentan en el resumen en lugar de desalinear el resto.
+    """
+    sketches, animes = scan_images([sketch_dir, anime_dir], num_threads)
+    pair_ids = sorted(sketches.keys() & animes.keys())
+    summary = {
+        "pairs": len(pair_ids),
+        "train": 0,
+        "val": 0,
+        "missing_anime": sorted(sketches.keys() - animes.keys()),
+        "missing_sketch": sorted(animes.keys() - sketches.keys()),
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for pair_id in pair_ids:
+            split = assign_split(pair_id, seed, val_ratio)
+            summary[split] += 1
+            writer.writerow((pair_id, sketches[pair_id], animes[pair_id], split))
+    # Se reemplaza de golpe: un manifiesto a medio escribir nunca queda a la vista
+    os.replace(tmp_path, out_path)
+    return summary
+
+
+def load_manifest(path: str, split: str = None) -> tuple[list[str], list[str]]:
+    """Rutas de bocetos y caras del manifiesto (solo las del `split` pedido si se indica)"""
+    sketches, animes = [], []
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        if tuple(header) != FIELDS:
+            raise ValueError(f"{path} no es un manifiesto de parejas: cabecera {header}")
+        for _, sketch, anime, row_split in reader:
+            if split is None or row_split == split:
+                sketches.append(sketch)
+                animes.append(anime)
+    return sketches, animes
@@ -0,0 +1,88 @@
+import io
+import torch
+from PIL import Image
+
+MB = 1024 * 1024
+# Canales de la etapa de mayor resolucion de la UNet y del decoder del VAE de SD 1.x
+UNET_BASE_CHANNELS = 320
+VAE_BASE_CHANNELS = 128
+# Tensores vivos a la vez por activacion (residuales, normalizaciones, skip connections)
+UNET_ACTIVATION_FACTOR = 12
+VAE_ACTIVATION_FACTOR = 3
+
+
+def normalize_size(width: int = None, height: int = None, default: int = 512) -> tuple[int, int]:
+    """Ancho y alto de salida; deben ser multiplos de 8 (un pixel latente = 8x8 pixeles)"""
+    width = int(width or default)
+    height = int(height or default)
+    if width <= 0 or height <= 0 or width % 8 or height % 8:
+        raise ValueError(f"La resolución debe ser positiva y múltiplo de 8, no {width}x{height}")
+    return width, height
+
+
+def input_size(data: bytes) -> tuple[int, int]:
+    """Tamaño de la imagen subida redondeado hacia abajo a multiplos de 8 (solo lee la cabecera)"""
+    width, height = Image.open(io.BytesIO(data)).size
+    return max(8, width - width % 8), max(8, height - height % 8)
+
+
+def estimate_cost(width: int, height: int, num_images: int = 1, num_inference_steps: int = 20,
+                  guidance_scale: float = 7.5, strength: float = 1.0, dtype: torch.dtype = torch.float16,
+                  attention_heads: int = 8, attention_slicing: bool = False, vae_tiling: bool = False,
+                  vae_tile_size: int = 512, seconds_per_token_step: float = None) -> dict:
+    """Estimacion rapida (sin ejecutar nada) del pico de memoria y de la duracion.
+
+    La memoria es una cota superior: la matriz de atencion de la primera etapa
+    (tokens x tokens por cabeza) mas las activaciones de la UNet, o el decoder
+    del VAE a resolucion completa, lo que sea mayor. Con `attention_slicing` la
+    atencion se calcula cabeza a cabeza y con `vae_tiling` el VAE trabaja por
+    teselas. La duracion solo se estima si se conoce el coste medio por token
+    latente y paso (lo mide GeneratorService en cada lote).
+    """
+    dtype_bytes = torch.tensor([], dtype=dtype).element_size()
+    # Con guidance > 1 la UNet procesa el lote dos veces (condicional y no condicional)
+    unet_batch = num_images * (2 if guidance_scale > 1 else 1)
+    tokens = (width // 8) * (height // 8)
+    steps = max(1, int(num_inference_steps * strength))
+
+    attention_slices = 1 if attention_slicing else unet_batch * attention_heads
+    attention_bytes = attention_slices * tokens * tokens * dtype_bytes
+    unet_bytes = unet_batch * UNET_BASE_CHANNELS * tokens * dtype_bytes * UNET_ACTIVATION_FACTOR + attention_bytes
+
+    vae_pixels = min(width, vae_tile_size) * min(height, vae_tile_size) if vae_tiling else width * height
+    vae_bytes = num_images * VAE_BASE_CHANNELS * vae_pixels * dtype_bytes * VAE_ACTIVATION_FACTOR
+
+    estimate = {
+        'width': width,
+        'height': height,
+        'num_images': num_images,
+        'steps': steps,
+        'latent_tokens': tokens,
+        'attention_slicing': attention_slicing,
+        'vae_tiling': vae_tiling,
+        'attention_mb': round(attention_bytes / MB, 1),
+        'unet_peak_mb': round(unet_bytes / MB, 1),
+        'vae_peak_mb': round(vae_bytes / MB, 1),
+        'peak_mb': round(max(unet_bytes, vae_bytes) / MB, 1),
+        'estimated_ms': None,
+    }
+    if seconds_per_token_step is not None:
+        estimate['estimated_ms'] = round(seconds_per_token_step * tokens * num_images * steps * 1000, 1)
+    return estimate
+
+
+def plan_memory(width: int, height: int, budget_mb: float, **kwargs) -> dict:
+    """Elige la configuracion mas rapida que cabe en el presupuesto.
+
+    Primero sin trocear nada; si no cabe, VAE por teselas; despues atencion por
+    cabezas. Si ni asi cabe se lanza ValueError con la estimacion.
+    """
+    for attention_slicing, vae_tiling in ((False, False), (False, True), (True, True)):
+        estimate = estimate_cost(width, height, attention_slicing=attention_slicing, vae_tiling=vae_tiling, **kwargs)
+        if estimate['peak_mb'] <= budget_mb:
+            estimate['budget_mb'] = budget_mb
+            return estimate
+    raise ValueError(
+        f"{width}x{height} necesita ~{estimate['peak_mb']:.0f}MB incluso con VAE por teselas y atención "
+        f"por cabezas; el presupuesto es {budget_mb:.0f}MB. Reduce la resolución o el número de imágenes."
+    )
@@ -1,9 +1,41 @@
 from diffusers import StableDiffusionImg2ImgPipeline, StableDiffusionPipeline
+import time
 import torch
+from .model_registry import ModelRegistry
 
 class Generator:
     def __init__(self, pipe: StableDiffusionPipeline | StableDiffusionImg2ImgPipeline):
         self.pipe = pipe
+        # Segundos de las etapas de la ultima generacion (text_encode, vae_encode...)
+        self.timings = {}
+
+    def _prompt_kwargs(self, prompt: str | list[str], embedding_cache=None) -> dict:
+        """Argumentos de prompt para el pipeline; con cache se pasan los embeddings ya calculados"""
+        if embedding_cache is None:
+            return {"prompt": prompt}
+        start = time.perf_counter()
+        kwargs = embedding_cache.encode(self.pipe, prompt)
+        self.timings["text_encode"] = time.perf_counter() - start
+        return kwargs
+
+    def _use_sampler(self, sampler: str = None):
+        """Cambia el scheduler del pipeline ya cargado sin reconstruirlo"""
+        if sampler is None or getattr(self.pipe, "sampler_name", None) == sampler:
+            return
+        self.pipe.scheduler = ModelRegistry().scheduler(sampler)
+        self.pipe.sampler_name = sampler
+
+    @staticmethod
+    def _generators(seed: int | list[int] | None) -> torch.Generator | list[torch.Generator] | None:
+        """Generadores de ruido a partir de una semilla o de una semilla por imagen.
+
+        Se crean en CPU: asi una semilla da el mismo ruido inicial en cualquier dispositivo.
+        """
+        if seed is None:
+            return None
+        if isinstance(seed, list):
+            return [torch.Generator("cpu").manual_seed(int(s)) for s in seed]
+        return torch.Generator("cpu").manual_seed(int(seed))
 
     def generate(self, prompt: str, num_inference_steps: int = 50, guidance_scale: float = 7.5, strength : float = 0.7) -> torch.Tensor:
         print(f"Generating image with prompt: {prompt}")
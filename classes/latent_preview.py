@@ -0,0 +1,28 @@
+import base64
+import io
+import torch
+from PIL import Image
+
+# Proyeccion lineal aproximada de los 4 canales latentes de SD 1.x a RGB.
+# Sirve para previsualizar el denoising sin pasar por el decoder del VAE.
+SD15_LATENT_RGB_FACTORS = [
+    [0.298, 0.207, 0.208],
+    [0.187, 0.286, 0.173],
+    [-0.158, 0.189, 0.264],
+    [-0.184, -0.271, -0.473],
+]
+
+
+def latents_to_preview(latents: torch.Tensor) -> list[Image.Image]:
+    """Previsualizaciones de baja resolucion (1/8 del tamaño final) de un lote de latentes"""
+    factors = torch.tensor(SD15_LATENT_RGB_FACTORS, dtype=torch.float32, device=latents.device)
+    rgb = torch.einsum("bchw,cr->bhwr", latents.float(), factors)
+    rgb = ((rgb + 1.0) / 2.0).clamp(0, 1).mul(255).to(torch.uint8).cpu().numpy()
+    return [Image.fromarray(image) for image in rgb]
+
+
+def preview_to_base64(image: Image.Image, quality: int = 70) -> str:
+    """JPEG en base64 para enviar la previsualizacion en un evento"""
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
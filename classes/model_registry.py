@@ -0,0 +1,168 @@
+import hashlib
+import os
+import shutil
+import threading
+import torch
+from app.config import Config
+
+
+class ModelRegistry:
+    """Carga perezosa y compartida de los componentes de Stable Diffusion.
+
+    Cada componente se carga la primera vez que se pide y se reutiliza despues;
+    los que tienen pesos se guardan por dtype, asi que pedir float32 no cambia
+    los float16 que ya usa otro consumidor. Los modulos congelados (VAE, text
+    encoder, tokenizer, schedulers) se comparten; a los que se les inyecta un
+    adaptador (`lora_unet`, la UNet de TrainerLora) se les da una UNet propia
+    con `new_unet`, porque PEFT modifica el modulo en el sitio.
+
+    Entrenar y servir en el mismo proceso duplicaria la UNet y competiria por la
+    misma GPU: el entrenamiento se lanza en su propio proceso (functions/train.py).
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ModelRegistry, cls).__new__(cls)
+            cls._instance._components = {}
+            cls._instance._lock = threading.RLock()
+            cls._instance._dtype = torch.float32
+            cls._instance._model_id = Config.MODEL_ID
+        return cls._instance
+
+    @property
+    def dtype(self) -> torch.dtype:
+        return self._dtype
+
+    def configure(self, dtype: torch.dtype = None, model_id: str = None):
+        """Fija el dtype por defecto y el modelo; el modelo no se puede cambiar con pesos ya cargados"""
+        with self._lock:
+            new_model_id = model_id or self._model_id
+            if self._components and new_model_id != self._model_id:
+                raise RuntimeError(
+                    f"El registro ya tiene pesos cargados de {self._model_id}; no se puede cambiar a {new_model_id}"
+                )
+            self._dtype = dtype or self._dtype
+            self._model_id = new_model_id
+
+    def _key(self, name: str, dtype: torch.dtype = None) -> str:
+        """Nombre de un componente con pesos en el dtype pedido (o el configurado)"""
+        return f"{name}@{dtype or self._dtype}"
+
+    def _get(self, name: str, loader):
+        component = self._components.get(name)
+        if component is not None:
+            return component
+        with self._lock:
+            if name not in self._components:
+                print(f"Cargando {name} de {self._model_id}...")
+                self._components[name] = loader()
+            return self._components[name]
+
+    def tokenizer(self):
+        from transformers import AutoTokenizer
+        return self._get("tokenizer", lambda: AutoTokenizer.from_pretrained(self._model_id, subfolder="tokenizer"))
+
+    def vae(self, dtype: torch.dtype = None):
+        from diffusers import AutoencoderKL
+        return self._get(self._key("vae", dtype), lambda: AutoencoderKL.from_pretrained(
+            self._model_id, subfolder="vae", torch_dtype=dtype or self._dtype))
+
+    def unet(self, dtype: torch.dtype = None):
+        """UNet base compartida; no inyectarle adaptadores (ver `new_unet`)"""
+        return self._get(self._key("unet", dtype), lambda: self.new_unet(dtype))
+
+    def new_unet(self, dtype: torch.dtype = None):
+        """UNet base recien cargada y sin cachear, para envolverla con un adaptador"""
+        from diffusers import UNet2DConditionModel
+        return UNet2DConditionModel.from_pretrained(self._model_id, subfolder="unet", torch_dtype=dtype or self._dtype)
+
+    def text_encoder(self, dtype: torch.dtype = None):
+        from transformers import CLIPTextModel
+        return self._get(self._key("text_encoder", dtype), lambda: CLIPTextModel.from_pretrained(
+            self._model_id, subfolder="text_encoder", torch_dtype=dtype or self._dtype))
+
+    def noise_scheduler(self):
+        """Scheduler DDPM usado para añadir ruido durante el entrenamiento"""
+        from diffusers import DDPMScheduler
+        return self._get("noise_scheduler", lambda: DDPMScheduler.from_pretrained(self._model_id, subfolder="scheduler"))
+
+    def scheduler(self, sampler: str = None):
+        """Devuelve un scheduler de inferencia nuevo (tienen estado por llamada).
+
+        `sampler` es un nombre de classes.sampler_registry; todos parten de la
+        config del scheduler del checkpoint.
+        """
+        from diffusers import PNDMScheduler
+        from classes.sampler_registry import make_scheduler
+        base = self._get("scheduler", lambda: PNDMScheduler.from_pretrained(self._model_id, subfolder="scheduler"))
+        return make_scheduler(sampler, base.config)
+
+    def lora_unet(self, lora_path: str, dtype: torch.dtype = None):
+        """UNet propia envuelta con el adaptador LoRA (la base compartida no se toca); una por ruta"""
+        from peft import PeftModel
+        return self._get(self._key(f"lora_unet:{lora_path}", dtype),
+                         lambda: PeftModel.from_pretrained(self.new_unet(dtype), lora_path))
+
+    def merged_unet(self, lora_path: str, cache_dir: str = None, dtype: torch.dtype = None):
+        """UNet con el adaptador LoRA fusionado en los pesos base (sin coste extra por paso).
+
+        La fusion se hace una vez sobre una copia float32 de la UNet base (la compartida
+        no se modifica) y se guarda en `cache_dir`; los siguientes arranques la leen de
+        disco. La carpeta depende del modelo, del dtype y del contenido del adaptador,
+        asi que reentrenar el LoRA invalida la cache.
+        """
+        cache_dir = cache_dir or Config.MERGED_UNET_DIR
+        dtype = dtype or self._dtype
+        return self._get(self._key(f"merged_unet:{lora_path}", dtype),
+                         lambda: self._load_merged_unet(lora_path, cache_dir, dtype))
+
+    def _adapter_digest(self, lora_path: str, dtype: torch.dtype) -> str:
+        digest = hashlib.sha256(f"{self._model_id}|{dtype}".encode("utf-8"))
+        for name in sorted(os.listdir(lora_path)):
+            if name.startswith("adapter_"):
+                with open(os.path.join(lora_path, name), "rb") as f:
+                    digest.update(name.encode("utf-8"))
+                    digest.update(f.read())
+        return digest.hexdigest()[:16]
+
+    def _load_merged_unet(self, lora_path: str, cache_dir: str, dtype: torch.dtype):
+        from diffusers import UNet2DConditionModel
+        from filelock import FileLock
+        from peft import PeftModel
+        merged_path = os.path.join(cache_dir, self._adapter_digest(lora_path, dtype))
+        os.makedirs(cache_dir, exist_ok=True)
+        # Un solo proceso fusiona; los demas workers esperan y leen lo que publique
+        with FileLock(f"{merged_path}.lock"):
+            if os.path.isdir(merged_path):
+                print(f"Usando UNet fusionada de {merged_path}")
+                return UNet2DConditionModel.from_pretrained(merged_path, torch_dtype=dtype)
+
+            print(f"Fusionando LoRA {lora_path} en la UNet...")
+            unet = PeftModel.from_pretrained(self.new_unet(torch.float32), lora_path).merge_and_unload().to(dtype)
+
+            # Se guarda en un temporal y se renombra: un arranque interrumpido no deja cache a medias.
+            # Una cache ya publicada nunca se borra (otro proceso puede estar leyendola)
+            tmp_path = f"{merged_path}.tmp{os.getpid()}"
+            unet.save_pretrained(tmp_path)
+            try:
+                os.replace(tmp_path, merged_path)
+            except OSError:
+                if not os.path.isdir(merged_path):
+                    raise
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                print(f"Otro proceso publico antes {merged_path}; se usa esa")
+                return UNet2DConditionModel.from_pretrained(merged_path, torch_dtype=dtype)
+        print(f"UNet fusionada guardada en {merged_path}")
+        return unet
+
+    def get_loaded(self, name: str, dtype: torch.dtype = None):
+        """Componente ya cargado o None, sin provocar la carga (los de pesos, en `dtype` o el configurado)"""
+        component = self._components.get(self._key(name, dtype))
+        return component if component is not None else self._components.get(name)
+
+    def is_loaded(self, name: str, dtype: torch.dtype = None) -> bool:
+        return self.get_loaded(name, dtype) is not None
+
+    def loaded_components(self) -> list[str]:
+        return list(self._components.keys())
@@ -0,0 +1,45 @@
+import torch
+from torch.utils.data import Dataset
+from classes.model_registry import ModelRegistry
+from classes.shard_store import ShardReader
+
+
+class PackedSketchToAnimeDataset(Dataset):
+    """Parejas sketch/anime empaquetadas con functions/pack_dataset.py.
+
+    Las imagenes ya estan redimensionadas y guardadas como uint8 HWC en shards
+    mapeados en memoria: no hay listado de carpetas ni decodificacion por muestra.
+    Devuelve las mismas claves que SketchToAnimeSDDataset.
+    """
+
+    def __init__(self, packed_dir, tokenizer=None):
+        # copy-on-write: torch.from_numpy usa las paginas del shard sin copiarlas
+        self.reader = ShardReader(packed_dir, mmap_mode="c")
+        self.image_size = self.reader.metadata.get("image_size")
+        self.prompt = self.reader.metadata.get("prompt", "anime style, high quality, detailed")
+
+        tokenizer = tokenizer or ModelRegistry().tokenizer()
+        self.input_ids = tokenizer(
+            self.prompt,
+            padding="max_length",
+            max_length=tokenizer.model_max_length,
+            truncation=True,
+            return_tensors="pt",
+        ).input_ids[0]
+
+    def __len__(self):
+        return len(self.reader)
+
+    @staticmethod
+    def _to_tensor(image) -> torch.Tensor:
+        # uint8 HWC -> float CHW en [-1, 1], igual que ToTensor + Normalize([0.5], [0.5])
+        return torch.from_numpy(image).permute(2, 0, 1).float().div_(127.5).sub_(1.0)
+
+    def __getitem__(self, idx):
+        sample = self.reader.get(idx)
+        return {
+            "sketch": self._to_tensor(sample["sketch"]),
+            "anime": self._to_tensor(sample["anime"]),
+            "input_ids": self.input_ids,
+            "prompt": self.prompt
+        }
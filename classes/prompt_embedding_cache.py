@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+import torch
+from app.config import Config
+
+
+class PromptEmbeddingCache:
+    """Cache LRU de embeddings CLIP (condicional y no condicional) por prompt.
+
+    Los prompts repetidos (el prompt por defecto y los presets) se codifican una
+    sola vez; las entradas se expulsan por numero o por tamaño total en bytes.
+    """
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None):
+        self.max_entries = max_entries or Config.PROMPT_CACHE_SIZE
+        self.max_bytes = max_bytes or Config.PROMPT_CACHE_MAX_MB * 1024 * 1024
+
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, pipe, prompt: str, negative_prompt: str = None) -> tuple[torch.Tensor, torch.Tensor]:
+        """Embeddings (1, tokens, dim) del prompt y del negativo para `pipe`"""
+        text_encoder = pipe.text_encoder
+        key = (prompt, negative_prompt or "", id(text_encoder), str(pipe.device), text_encoder.dtype)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        with torch.no_grad():
+            prompt_embeds, negative_prompt_embeds = pipe.encode_prompt(
+                prompt,
+                pipe.device,
+                num_images_per_prompt=1,
+                do_classifier_free_guidance=True,
+                negative_prompt=negative_prompt,
+            )
+        entry = (prompt_embeds, negative_prompt_embeds)
+        self._put(key, entry)
+        return entry
+
+    def encode(self, pipe, prompts: str | list[str], negative_prompt: str = None) -> dict:
+        """Argumentos `prompt_embeds`/`negative_prompt_embeds` listos para el pipeline"""
+        if isinstance(prompts, str):
+            prompts = [prompts]
+        pairs = [self.get(pipe, prompt, negative_prompt) for prompt in prompts]
+        return {
+            'prompt_embeds': torch.cat([pair[0] for pair in pairs]),
+            'negative_prompt_embeds': torch.cat([pair[1] for pair in pairs]),
+        }
+
+    def _put(self, key, entry):
+        size = sum(t.numel() * t.element_size() for t in entry)
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = entry
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= sum(t.numel() * t.element_size() for t in evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,43 @@
+import torch
+from torch.utils.data import Sampler
+
+
+class ResumableRandomSampler(Sampler):
+    """Orden aleatorio determinista por (seed, epoch) que puede empezar a mitad de epoch.
+
+    Sustituye a `shuffle=True`: con la misma semilla y epoch la permutacion es la
+    misma, asi que al reanudar basta con saltar las muestras ya vistas sin leerlas.
+    En entrenamiento distribuido cada uno de los `num_replicas` procesos recorre
+    su parte (como DistributedSampler, rellenando para que todas midan igual).
+    """
+
+    def __init__(self, data_source, seed: int = 0, num_replicas: int = 1, rank: int = 0):
+        self.data_source = data_source
+        self.seed = seed
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.num_samples = -(-len(data_source) // num_replicas)
+        self.epoch = 0
+        self.start_index = 0
+
+    def set_epoch(self, epoch: int, start_index: int = 0):
+        """Epoch a recorrer y numero de muestras del principio que se saltan"""
+        self.epoch = epoch
+        self.start_index = start_index
+
+    def __iter__(self):
+        generator = torch.Generator()
+        generator.manual_seed(self.seed + self.epoch)
+        order = torch.randperm(len(self.data_source), generator=generator).tolist()
+        if self.num_replicas > 1:
+            total = self.num_samples * self.num_replicas
+            order = (order * -(-total // len(order)))[:total]
+            order = order[self.rank:total:self.num_replicas]
+        return iter(order[self.start_index:])
+
+    def __len__(self):
+        return max(0, self.num_samples - self.start_index)
+
+    def state_dict(self) -> dict:
+        return {"seed": self.seed, "epoch": self.epoch, "start_index": self.start_index,
+                "num_replicas": self.num_replicas, "rank": self.rank}
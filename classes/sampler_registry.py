@@ -0,0 +1,41 @@
+import diffusers
+from app.config import Config
+
+# nombre -> (clase de diffusers, ajustes sobre la config del checkpoint, pasos recomendados)
+SAMPLERS = {
+    "pndm": ("PNDMScheduler", {}, 50),
+    "ddim": ("DDIMScheduler", {}, 30),
+    "euler": ("EulerDiscreteScheduler", {}, 25),
+    "euler_a": ("EulerAncestralDiscreteScheduler", {}, 25),
+    "dpmpp_2m": ("DPMSolverMultistepScheduler", {"algorithm_type": "dpmsolver++", "solver_order": 2}, 20),
+    "dpmpp_2m_karras": ("DPMSolverMultistepScheduler", {"algorithm_type": "dpmsolver++", "solver_order": 2, "use_karras_sigmas": True}, 20),
+    "unipc": ("UniPCMultistepScheduler", {}, 20),
+    # Solo da buenos resultados con pesos destilados (p. ej. LCM-LoRA) y guidance ~1-2
+    "lcm": ("LCMScheduler", {}, 4),
+}
+
+
+def normalize_sampler(name: str = None) -> str:
+    name = (name or Config.DEFAULT_SAMPLER).lower()
+    if name not in SAMPLERS:
+        raise ValueError(f"Sampler no soportado: {name}. Usa uno de {', '.join(SAMPLERS)}")
+    return name
+
+
+def default_steps(name: str = None) -> int:
+    """Pasos de inferencia recomendados para el sampler"""
+    return SAMPLERS[normalize_sampler(name)][2]
+
+
+def make_scheduler(name: str, base_config):
+    """Scheduler nuevo del tipo pedido a partir de la config del checkpoint"""
+    class_name, overrides, _ = SAMPLERS[normalize_sampler(name)]
+    scheduler_class = getattr(diffusers, class_name)
+    return scheduler_class.from_config(base_config, **overrides)
+
+
+def available_samplers() -> list[dict]:
+    return [
+        {"name": name, "scheduler": class_name, "default_steps": steps}
+        for name, (class_name, _, steps) in SAMPLERS.items()
+    ]
@@ -0,0 +1,121 @@
+import json
+import os
+import numpy as np
+
+INDEX_FILE = "index.json"
+
+
+class ShardWriter:
+    """Escribe arrays de tamaño fijo por muestra en shards .npy mapeables en memoria.
+
+    `fields` describe cada campo como {nombre: (shape, dtype)}; cada shard guarda
+    un .npy por campo y `index.json` describe shards, campos y metadatos.
+    """
+
+    def __init__(self, out_dir: str, fields: dict, shard_size: int = 4096, metadata: dict = None):
+        self.out_dir = out_dir
+        self.fields = {name: (tuple(shape), np.dtype(dtype)) for name, (shape, dtype) in fields.items()}
+        self.shard_size = shard_size
+        self.metadata = metadata or {}
+
+        self._shards = []
+        self._arrays = None
+        self._count = 0
+        os.makedirs(out_dir, exist_ok=True)
+
+    def _open_shard(self):
+        shard_name = f"shard_{len(self._shards):05d}"
+        self._arrays = {
+            name: np.lib.format.open_memmap(
+                os.path.join(self.out_dir, f"{shard_name}.{name}.npy"),
+                mode="w+", dtype=dtype, shape=(self.shard_size,) + shape
+            )
+            for name, (shape, dtype) in self.fields.items()
+        }
+        self._shards.append({"name": shard_name, "count": 0})
+        self._count = 0
+
+    def write(self, sample: dict):
+        """Añade una muestra con un array por campo"""
+        if self._arrays is None or self._count == self.shard_size:
+            self._close_shard()
+            self._open_shard()
+        for name, array in self._arrays.items():
+            array[self._count] = sample[name]
+        self._count += 1
+        self._shards[-1]["count"] = self._count
+
+    def write_batch(self, batch: dict):
+        """Añade un lote: cada campo con la dimension de lote primero"""
+        size = len(next(iter(batch.values())))
+        for i in range(size):
+            self.write({name: values[i] for name, values in batch.items()})
+
+    def _close_shard(self):
+        if self._arrays is None:
+            return
+        shard_name = self._shards[-1]["name"]
+        for name, array in self._arrays.items():
+            array.flush()
+            if self._count < self.shard_size:
+                # Ultimo shard a medias: se recorta a las filas escritas para no dejar ceros en disco
+                path = os.path.join(self.out_dir, f"{shard_name}.{name}.npy")
+                trimmed = np.lib.format.open_memmap(f"{path}.tmp", mode="w+", dtype=array.dtype, shape=(self._count,) + array.shape[1:])
+                trimmed[:] = array[:self._count]
+                trimmed.flush()
+                del trimmed
+                os.replace(f"{path}.tmp", path)
+        self._arrays = None
+
+    def close(self) -> dict:
+        self._close_shard()
+        index = {
+            "fields": {name: {"shape": list(shape), "dtype": dtype.str} for name, (shape, dtype) in self.fields.items()},
+            "shards": self._shards,
+            "total": sum(shard["count"] for shard in self._shards),
+            "metadata": self.metadata,
+        }
+        with open(os.path.join(self.out_dir, INDEX_FILE), "w") as f:
+            json.dump(index, f, indent=2)
+        return index
+
+
+class ShardReader:
+    """Lectura aleatoria sin copia de shards escritos por ShardWriter"""
+
+    def __init__(self, shard_dir: str, mmap_mode: str = "r"):
+        """`mmap_mode="c"` da arrays escribibles (copy-on-write) que torch acepta sin copiar"""
+        self.shard_dir = shard_dir
+        self.mmap_mode = mmap_mode
+        with open(os.path.join(shard_dir, INDEX_FILE)) as f:
+            self.index = json.load(f)
+        self.fields = list(self.index["fields"].keys())
+        self.metadata = self.index.get("metadata", {})
+
+        # Posicion global de inicio de cada shard
+        self._offsets = np.cumsum([0] + [shard["count"] for shard in self.index["shards"]])
+        # Los memmaps se abren bajo demanda para que cada worker del DataLoader tenga los suyos
+        self._arrays = {}
+
+    def __len__(self) -> int:
+        return int(self._offsets[-1])
+
+    def _field(self, shard_idx: int, name: str) -> np.ndarray:
+        key = (shard_idx, name)
+        if key not in self._arrays:
+            shard_name = self.index["shards"][shard_idx]["name"]
+            self._arrays[key] = np.load(os.path.join(self.shard_dir, f"{shard_name}.{name}.npy"), mmap_mode=self.mmap_mode)
+        return self._arrays[key]
+
+    def get(self, idx: int) -> dict:
+        if idx < 0 or idx >= len(self):
+            raise IndexError(idx)
+        shard_idx = int(np.searchsorted(self._offsets, idx, side="right") - 1)
+        local_idx = idx - int(self._offsets[shard_idx])
+        return {name: self._field(shard_idx, name)[local_idx] for name in self.fields}
+
+    def __getstate__(self):
+        # Los memmaps abiertos no se envian a los workers
+        state = self.__dict__.copy()
+        state["_arrays"] = {}
+        return state
@@ -1,30 +1,53 @@
-from asyncio.windows_utils import pipe
+import time
 from PIL import Image
 from torchvision import transforms
 import torch
 from .generator import Generator
+from functions.decode_image import decode_image
 from diffusers import StableDiffusionImg2ImgPipeline
 
-class SketchToAnime:
+class SketchToAnime(Generator):
     def __init__(self, pipe : StableDiffusionImg2ImgPipeline):
-        # super().__init__(pipe)
-        self.pipe = pipe
+        super().__init__(pipe)
+
+    def _load_sketch(self, sketch: str | bytes, size: tuple[int, int] = (512, 512)) -> Image.Image:
+        """Boceto a `size` (ancho, alto) desde una ruta o desde los bytes subidos"""
+        if isinstance(sketch, bytes):
+            return decode_image(sketch, size)
+        return Image.open(sketch).convert("RGB").resize(size)
+
     #retorna una lista de imágenes
-    def generate(self, sketch_path: str, prompt: str, num_inference_steps: int = 50, guidance_scale: float = 7.5, strength : float = 0.7, number_per_prompt: int = 1) -> list[Image.Image]:
-        """Generar usando img2img - el sketch como base"""
+    def generate(self, sketch_path: str | bytes | list, prompt: str | list[str], num_inference_steps: int = 50, guidance_scale: float = 7.5, strength : float = 0.7, number_per_prompt: int = 1, callback_on_step_end=None, embedding_cache=None, latent_cache=None, seed: int | list[int] | None = None, sampler: str = None, width: int = 512, height: int = 512) -> list[Image.Image]:
+        """Generar usando img2img - el sketch como base.
+
+        Acepta listas de sketches y prompts (uno por imagen) para generar un lote
+        en una sola pasada de la UNet. Con `seed` (una o una por imagen) el resultado
+        es reproducible. La salida tiene el tamaño `width` x `height` del boceto redimensionado.
+        """
         print(f"Generando {number_per_prompt} imagenes de anime desde boceto...")
-        # Cargar sketch
-        init_image = Image.open(sketch_path).convert("RGB")
-        init_image = init_image.resize((512, 512))
+        self._use_sampler(sampler)
+        # Cargar sketch; con cache se pasan directamente los latentes VAE del boceto
+        start = time.perf_counter()
+        if latent_cache is not None:
+            init_image = latent_cache.encode(self.pipe, sketch_path, (width, height))
+            self.timings["vae_encode"] = time.perf_counter() - start
+        elif isinstance(sketch_path, list):
+            init_image = [self._load_sketch(sketch, (width, height)) for sketch in sketch_path]
+            self.timings["sketch_decode"] = time.perf_counter() - start
+        else:
+            init_image = self._load_sketch(sketch_path, (width, height))
+            self.timings["sketch_decode"] = time.perf_counter() - start
         
         # Generar
         results = self.pipe(
-            prompt=prompt,
+            **self._prompt_kwargs(prompt, embedding_cache),
             image=init_image,
             strength=strength,
             num_inference_steps=num_inference_steps,
             guidance_scale=guidance_scale,
-            num_images_per_prompt=number_per_prompt
+            num_images_per_prompt=number_per_prompt,
+            generator=self._generators(seed),
+            callback_on_step_end=callback_on_step_end
         ).images
 
         return results
\ No newline at end of file
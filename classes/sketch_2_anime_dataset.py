@@ -3,22 +3,40 @@ from torch.utils.data import Dataset
 from PIL import Image
 from torchvision import transforms
 import torch
-from transformers import AutoTokenizer
+from classes.model_registry import ModelRegistry
+from classes.dataset_manifest import load_manifest
+
+def list_image_pairs(sketch_dir, anime_dir) -> tuple[list[str], list[str]]:
+    """Nombres de sketches y animes emparejados por nombre (sin extension); sin manifiesto es el unico respaldo"""
+    # Asegurarse de que los archivos estén alineados
+    sketches = sorted([f for f in os.listdir(sketch_dir) if f.endswith(('.png', '.jpg', '.jpeg'))])
+    animes = sorted([f for f in os.listdir(anime_dir) if f.endswith(('.png', '.jpg', '.jpeg'))])
+
+    # Verificar que tengamos el mismo número de archivos
+    assert len(sketches) == len(animes), "Número diferente de sketches y animes"
+    # Y que cada pareja se llame igual: con los mismos totales pero nombres distintos se desalinearia todo
+    for sketch, anime in zip(sketches, animes):
+        if os.path.splitext(sketch)[0] != os.path.splitext(anime)[0]:
+            raise ValueError(f"{sketch} y {anime} no forman pareja: genera un manifiesto con divider.py")
+    return sketches, animes
 
 class SketchToAnimeSDDataset(Dataset):
-    def __init__(self, sketch_dir, anime_dir, image_size=512, tokenizer=None):
+    """Parejas sketch/anime desde un manifiesto (divider.py) o, sin el, listando las carpetas"""
+
+    def __init__(self, sketch_dir=None, anime_dir=None, image_size=512, tokenizer=None, manifest=None, split="train"):
         self.sketch_dir = sketch_dir
         self.anime_dir = anime_dir
-        
-        # Asegurarse de que los archivos estén alineados
-        self.sketches = sorted([f for f in os.listdir(sketch_dir) if f.endswith(('.png', '.jpg', '.jpeg'))])
-        self.animes = sorted([f for f in os.listdir(anime_dir) if f.endswith(('.png', '.jpg', '.jpeg'))])
-        
-        # Verificar que tengamos el mismo número de archivos
-        assert len(self.sketches) == len(self.animes), "Número diferente de sketches y animes"
+
+        if manifest is not None:
+            # Rutas ya emparejadas por id: no se lista ninguna carpeta
+            self.sketches, self.animes = load_manifest(manifest, split)
+        else:
+            sketches, animes = list_image_pairs(sketch_dir, anime_dir)
+            self.sketches = [os.path.join(sketch_dir, f) for f in sketches]
+            self.animes = [os.path.join(anime_dir, f) for f in animes]
         
         self.image_size = image_size
-        self.tokenizer = tokenizer or AutoTokenizer.from_pretrained("runwayml/stable-diffusion-v1-5", subfolder="tokenizer")
+        self.tokenizer = tokenizer or ModelRegistry().tokenizer()
         
         # Transformaciones para las imágenes
         self.transform = transforms.Compose([
@@ -28,13 +46,21 @@ class SketchToAnimeSDDataset(Dataset):
         ])
         
         self.prompt = "anime style, high quality, detailed"
+        # El prompt es constante: se tokeniza una sola vez
+        self.input_ids = self.tokenizer(
+            self.prompt,
+            padding="max_length",
+            max_length=self.tokenizer.model_max_length,
+            truncation=True,
+            return_tensors="pt",
+        ).input_ids[0]
 
     def __len__(self):
         return len(self.sketches)
 
     def __getitem__(self, idx):
-        sketch_path = os.path.join(self.sketch_dir, self.sketches[idx])
-        anime_path = os.path.join(self.anime_dir, self.animes[idx])
+        sketch_path = self.sketches[idx]
+        anime_path = self.animes[idx]
 
         # Cargar imágenes
         sketch = Image.open(sketch_path).convert("RGB")
@@ -44,18 +70,9 @@ class SketchToAnimeSDDataset(Dataset):
         sketch_tensor = self.transform(sketch)
         anime_tensor = self.transform(anime)
         
-        # Tokenizar el prompt
-        text_inputs = self.tokenizer(
-            self.prompt,
-            padding="max_length",
-            max_length=self.tokenizer.model_max_length,
-            truncation=True,
-            return_tensors="pt",
-        )
-        
         return {
             "sketch": sketch_tensor,
             "anime": anime_tensor,
-            "input_ids": text_inputs.input_ids[0],
+            "input_ids": self.input_ids,
             "prompt": self.prompt
         }
\ No newline at end of file
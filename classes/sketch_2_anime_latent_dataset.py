@@ -0,0 +1,35 @@
+import torch
+from torch.utils.data import Dataset
+from classes.shard_store import ShardReader
+
+
+class SketchToAnimeLatentDataset(Dataset):
+    """Dataset de latentes VAE precalculados con functions/precompute_latents.py.
+
+    Cada muestra guarda media y desviacion de la distribucion latente del VAE,
+    asi que aqui se muestrea igual que `latent_dist.sample()` sin tocar el VAE.
+    Los embeddings del prompt (constante) se leen una sola vez.
+    """
+
+    def __init__(self, latent_dir):
+        self.reader = ShardReader(latent_dir)
+        self.prompt = self.reader.metadata.get("prompt")
+        self.encoder_hidden_states = torch.load(f"{latent_dir}/prompt_embeds.pt")
+
+    def __len__(self):
+        return len(self.reader)
+
+    def __getitem__(self, idx):
+        sample = self.reader.get(idx)
+
+        anime_mean = torch.from_numpy(sample["anime_mean"].astype("float32"))
+        anime_std = torch.from_numpy(sample["anime_std"].astype("float32"))
+        sketch_mean = torch.from_numpy(sample["sketch_mean"].astype("float32"))
+        sketch_std = torch.from_numpy(sample["sketch_std"].astype("float32"))
+
+        return {
+            "anime_latents": anime_mean + anime_std * torch.randn_like(anime_mean),
+            "sketch_latents": sketch_mean + sketch_std * torch.randn_like(sketch_mean),
+            "encoder_hidden_states": self.encoder_hidden_states,
+            "prompt": self.prompt
+        }
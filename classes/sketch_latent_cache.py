@@ -0,0 +1,147 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from PIL import Image
+import torch
+from app.config import Config
+from functions.decode_image import decode_image
+
+PREFETCH_MAX_ENTRIES = 256
+
+
+class SketchLatentCache:
+    """Cache LRU de bocetos preprocesados y de su latente VAE, por hash del contenido.
+
+    Regenerar desde el mismo boceto (otro strength, guidance o prompt) reutiliza
+    la imagen ya redimensionada y el latente sin volver a decodificar ni codificar.
+    La expulsion se hace por presupuesto de memoria en bytes.
+    """
+
+    def __init__(self, max_bytes: int = None, image_size: int = 512):
+        self.max_bytes = max_bytes or Config.SKETCH_CACHE_MAX_MB * 1024 * 1024
+        self.image_size = image_size
+
+        self._entries: OrderedDict = OrderedDict()
+        # Bocetos ya decodificados por `prefetch` que aun no han pasado por el VAE
+        self._decoded: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def content_key(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _read(self, sketch) -> bytes:
+        if isinstance(sketch, bytes):
+            return sketch
+        with open(sketch, "rb") as f:
+            return f.read()
+
+    def encode(self, pipe, sketches: str | bytes | list, size: tuple[int, int] = None) -> torch.Tensor:
+        """Latentes (N, 4, h, w) escalados listos para pasar como `image` al pipeline img2img.
+
+        `size` es el (ancho, alto) al que se lleva el boceto; cada tamaño es una entrada distinta.
+        """
+        if not isinstance(sketches, list):
+            sketches = [sketches]
+        size = size or (self.image_size, self.image_size)
+
+        vae = pipe.vae
+        vae_key = (id(vae), str(pipe.device), vae.dtype)
+        keys, latents, missing = [], {}, {}
+        for sketch in sketches:
+            data = self._read(sketch)
+            key = f"{self.content_key(data)}:{size[0]}x{size[1]}"
+            keys.append(key)
+            if key in latents or key in missing:
+                continue
+            cached = self._lookup(key, vae_key)
+            if cached is not None:
+                latents[key] = cached
+            else:
+                missing[key] = data
+
+        if missing:
+            images = [self._preprocess(key, data, size) for key, data in missing.items()]
+            pixels = pipe.image_processor.preprocess(images).to(device=pipe.device, dtype=vae.dtype)
+            with torch.no_grad():
+                encoded = vae.encode(pixels).latent_dist.mode() * vae.config.scaling_factor
+            for key, image, latent in zip(missing.keys(), images, encoded.split(1)):
+                latents[key] = latent
+                self._store(key, vae_key, image, latent)
+
+        return torch.cat([latents[key] for key in keys])
+
+    def prefetch(self, sketch: str | bytes, size: tuple[int, int] = None) -> bytes:
+        """Lee y decodifica el boceto fuera del hilo del modelo; devuelve sus bytes para encolarlo.
+
+        `encode` recoge la imagen ya decodificada, asi el hilo del modelo solo
+        hace el VAE. Pensado para lotes grandes, donde la decodificacion del
+        siguiente lote se solapa con la UNet del actual.
+        """
+        data = self._read(sketch)
+        size = size or (self.image_size, self.image_size)
+        key = f"{self.content_key(data)}:{size[0]}x{size[1]}"
+        with self._lock:
+            if key in self._entries or key in self._decoded:
+                return data
+        image = decode_image(data, size)
+        with self._lock:
+            self._decoded[key] = image
+            # Acotado por si se cancelan peticiones cuyos bocetos nunca se consumen
+            while len(self._decoded) > PREFETCH_MAX_ENTRIES:
+                self._decoded.popitem(last=False)
+        return data
+
+    def _preprocess(self, key: str, data: bytes, size: tuple[int, int]) -> Image.Image:
+        with self._lock:
+            image = self._decoded.pop(key, None)
+            if image is not None:
+                return image
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry['image']
+        return decode_image(data, size)
+
+    def _lookup(self, key: str, vae_key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['vae_key'] == vae_key:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry['latents']
+            self.misses += 1
+            return None
+
+    def _store(self, key: str, vae_key: tuple, image: Image.Image, latents: torch.Tensor):
+        size = latents.numel() * latents.element_size() + image.width * image.height * 3
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous['bytes']
+            self._entries[key] = {'image': image, 'latents': latents, 'vae_key': vae_key, 'bytes': size}
+            self._bytes += size
+            while self._entries and self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted['bytes']
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._decoded.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
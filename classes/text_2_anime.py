@@ -7,16 +7,19 @@ class TextToAnime(Generator):
     def __init__(self, pipe):
         super().__init__(pipe)
 
-    def generate(self, prompt: str, num_inference_steps: int = 50, guidance_scale: float = 7.5, strength : float = 0.7,number_per_prompt: int = 1)-> list[Image.Image]:        
+    def generate(self, prompt: str | list[str], num_inference_steps: int = 50, guidance_scale: float = 7.5, strength : float = 0.7,number_per_prompt: int = 1, callback_on_step_end=None, embedding_cache=None, seed: int | list[int] | None = None, sampler: str = None, width: int = 512, height: int = 512)-> list[Image.Image]:        
         print(f"Generando {number_per_prompt} imagenes de anime desde texto...")
+        self._use_sampler(sampler)
         with torch.no_grad():
             results = self.pipe(
-                prompt=prompt,
+                **self._prompt_kwargs(prompt, embedding_cache),
                 num_inference_steps=num_inference_steps,
                 guidance_scale=guidance_scale,
-                width=512,
-                height=512,
-                num_images_per_prompt=number_per_prompt
+                width=width,
+                height=height,
+                num_images_per_prompt=number_per_prompt,
+                generator=self._generators(seed),
+                callback_on_step_end=callback_on_step_end
             ).images
             
         return results
\ No newline at end of file
@@ -3,19 +3,50 @@ import torch.nn.functional as F
 from diffusers import AutoencoderKL, UNet2DConditionModel, DDPMScheduler
 from transformers import CLIPTextModel, AutoTokenizer
 from peft import LoraConfig, get_peft_model
+import itertools
 import os
+import time
+import contextlib
 from tqdm import tqdm
 from app.config import Config
+from classes.model_registry import ModelRegistry
+from classes.checkpoint_manager import CheckpointManager
+from functions.distributed import all_reduce_gradients, broadcast_parameters
 from torch.utils.data import DataLoader
 from torch import device
 
 class TrainerLora:
-    def __init__(self):
-        self.device : device = Config.DEVICE
-        self.unet : UNet2DConditionModel = Config.UNET
-        self.text_encoder : CLIPTextModel = Config.TEXT_ENCODER
-        self.vae : AutoencoderKL = Config.VAE
-        self.scheduler : DDPMScheduler = Config.SCHEDULER
+    def __init__(self, use_latents: bool = False, mixed_precision: str = None, gradient_accumulation_steps: int = None, gradient_checkpointing: bool = None,
+                 device: device = None, rank: int = 0, world_size: int = 1):
+        """Con `use_latents` se entrena desde latentes precalculados y no se cargan VAE ni text encoder.
+
+        `mixed_precision` ("no", "fp16" o "bf16"), `gradient_accumulation_steps` y
+        `gradient_checkpointing` toman por defecto los valores de Config. Con
+        `world_size` > 1 (functions/distributed.py) cada proceso entrena su parte
+        de los datos y los gradientes del LoRA se promedian entre procesos.
+        """
+        self.device : device = device or Config.DEVICE
+        self.rank = rank
+        self.world_size = world_size
+        self.is_main = rank == 0
+        self.mixed_precision = mixed_precision or Config.MIXED_PRECISION
+        self.gradient_accumulation_steps = gradient_accumulation_steps or Config.GRADIENT_ACCUMULATION_STEPS
+        self.gradient_checkpointing = Config.GRADIENT_CHECKPOINTING if gradient_checkpointing is None else gradient_checkpointing
+        if self.mixed_precision not in ("no", "fp16", "bf16"):
+            raise ValueError(f"mixed_precision debe ser 'no', 'fp16' o 'bf16', no '{self.mixed_precision}'")
+        if self.mixed_precision == "fp16" and self.device.type != "cuda":
+            # Sin CUDA no hay GradScaler: fp16 sin escalar pierde los gradientes pequeños
+            raise ValueError(f"mixed_precision 'fp16' necesita CUDA (dispositivo {self.device}); usa 'bf16' o 'no'")
+        # Pesos float32 sin tocar el dtype del registro; la UNet es propia porque get_peft_model la modifica
+        registry = ModelRegistry()
+        self.unet : UNet2DConditionModel = registry.new_unet(torch.float32)
+        self.text_encoder : CLIPTextModel = None if use_latents else registry.text_encoder(torch.float32)
+        self.vae : AutoencoderKL = None if use_latents else registry.vae(torch.float32)
+        self.scheduler : DDPMScheduler = registry.noise_scheduler()
+
+        if self.gradient_checkpointing:
+            # Recalcula activaciones en el backward: menos memoria a cambio de computo
+            self.unet.enable_gradient_checkpointing()
 
         self.unet, self.text_encoder = self.setup_lora(self.unet, self.text_encoder)
 
@@ -33,82 +64,204 @@ class TrainerLora:
         
         return unet, text_encoder
 
-    def train_sketch_to_anime(self, train_loader : DataLoader):
+    def encode_batch(self, batch) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """Latentes anime/sketch y embeddings del prompt de un batch"""
+        # Batch de SketchToAnimeLatentDataset: ya viene codificado
+        if "anime_latents" in batch:
+            return (
+                batch["anime_latents"].to(self.device),
+                batch["sketch_latents"].to(self.device),
+                batch["encoder_hidden_states"].to(self.device),
+            )
+
+        # Mover datos a GPU
+        sketches = batch["sketch"].to(self.device)
+        animes = batch["anime"].to(self.device)
+        input_ids = batch["input_ids"].to(self.device)
+
+        # Codificar imágenes con VAE (usamos los animes como target)
+        with torch.no_grad():
+            # Codificar imágenes anime a latents
+            anime_latents = self.vae.encode(animes).latent_dist.sample()
+            anime_latents = anime_latents * self.vae.config.scaling_factor
+
+            # Codificar sketches para condición
+            sketch_latents = self.vae.encode(sketches).latent_dist.sample()
+            sketch_latents = sketch_latents * self.vae.config.scaling_factor
+
+            # Codificar texto
+            encoder_hidden_states = self.text_encoder(input_ids)[0]
+
+        return anime_latents, sketch_latents, encoder_hidden_states
+
+    def autocast(self):
+        """Contexto de autocast segun el modo de precision mixta"""
+        if self.mixed_precision == "no":
+            return contextlib.nullcontext()
+        dtype = torch.float16 if self.mixed_precision == "fp16" else torch.bfloat16
+        return torch.autocast(device_type=self.device.type, dtype=dtype)
+
+    def prepare_training(self):
+        """Mueve los modelos al dispositivo, congela VAE/text encoder y crea optimizador y scaler"""
         # Mover a GPU
-        self.vae.to(self.device)
         self.unet.to(self.device)
-        self.text_encoder.to(self.device)
 
         # Congelar VAE y text encoder
-        self.vae.requires_grad_(False)
-        self.text_encoder.requires_grad_(False)
+        for frozen in (self.vae, self.text_encoder):
+            if frozen is not None:
+                frozen.to(self.device)
+                frozen.requires_grad_(False)
 
         # Optimizador solo para parámetros entrenables
-        optimizer = torch.optim.AdamW(self.unet.parameters(), lr=Config.LEARNING_RATE)
+        self.trainable_params = [p for p in self.unet.parameters() if p.requires_grad]
+        if self.world_size > 1:
+            # Mismo LoRA inicial en todos los procesos; despues, ruido distinto en cada uno
+            broadcast_parameters(self.trainable_params)
+            torch.manual_seed(Config.TRAIN_SEED + self.rank)
+        optimizer = torch.optim.AdamW(self.trainable_params, lr=Config.LEARNING_RATE)
+        # fp16 necesita escalar la loss para no perder gradientes pequeños; bf16 no
+        scaler = torch.cuda.amp.GradScaler(enabled=self.mixed_precision == "fp16" and self.device.type == "cuda")
+        return optimizer, scaler
+
+    def compute_loss(self, batch) -> tuple[torch.Tensor, int]:
+        """Loss de prediccion de ruido de un batch y su numero de muestras"""
+        with self.autocast():
+            anime_latents, sketch_latents, encoder_hidden_states = self.encode_batch(batch)
+
+            # Sample noise
+            noise = torch.randn_like(anime_latents)
+            timesteps = torch.randint(0, self.scheduler.num_train_timesteps, (anime_latents.shape[0],), device=self.device)
+
+            # Add noise to latents
+            noisy_latents = self.scheduler.add_noise(anime_latents, noise, timesteps)
+
+            # Predicción del noise - CORREGIDO
+            noise_pred = self.unet(
+                noisy_latents,
+                timesteps,
+                encoder_hidden_states,
+                added_cond_kwargs={"image_embeds": sketch_latents}
+            ).sample
+
+        # Loss - comparar con el noise original (en fp32)
+        loss = F.mse_loss(noise_pred.float(), noise.float())
+        return loss, anime_latents.shape[0]
+
+    def optimizer_step(self, optimizer, scaler):
+        """Promedia gradientes entre procesos, los recorta y avanza el optimizador"""
+        if self.world_size > 1:
+            all_reduce_gradients(self.trainable_params, self.world_size)
+        scaler.unscale_(optimizer)
+        torch.nn.utils.clip_grad_norm_(self.trainable_params, 1.0)
+        scaler.step(optimizer)
+        scaler.update()
+        optimizer.zero_grad()
+
+    def _start_epoch(self, train_loader: DataLoader, epoch: int, start_batch: int):
+        """Batches de la epoch desde `start_batch` y total de batches de la epoch.
+
+        Con ResumableRandomSampler los batches saltados no se leen; con otro
+        sampler se descartan leyendolos.
+        """
+        sampler = train_loader.sampler
+        if hasattr(sampler, "set_epoch"):
+            sampler.set_epoch(epoch)
+        num_batches = len(train_loader)
+        if hasattr(sampler, "start_index"):
+            sampler.set_epoch(epoch, start_batch * train_loader.batch_size)
+            return iter(train_loader), num_batches
+        return itertools.islice(iter(train_loader), start_batch, None), num_batches
+
+    def _restore_rng(self, rng: dict, global_step: int):
+        if self.world_size > 1:
+            # El checkpoint guarda el RNG del rango 0: cada proceso vuelve a sembrar su propio flujo
+            torch.manual_seed(Config.TRAIN_SEED + global_step * self.world_size + self.rank)
+        else:
+            CheckpointManager.restore_rng(rng)
+
+    def train_sketch_to_anime(self, train_loader : DataLoader, output_dir: str = None, checkpoint_dir: str = None,
+                              checkpoint_every: int = None, resume: str = None):
+        """Entrena el LoRA con checkpoints reanudables cada `checkpoint_every` pasos del optimizador.
+
+        Con `resume` ("latest" o la ruta de un checkpoint) se restauran adaptador,
+        optimizador, RNG y posicion en el dataset, y se sigue desde el mismo batch.
+        En distribuido todos los procesos reanudan del mismo checkpoint y solo el
+        rango 0 escribe checkpoints y el LoRA final.
+        """
+        optimizer, scaler = self.prepare_training()
+        accumulation = self.gradient_accumulation_steps
+        output_dir = output_dir or Config.LORA_OUTPUT_DIR
+        checkpoint_every = Config.CHECKPOINT_EVERY_STEPS if checkpoint_every is None else checkpoint_every
+        checkpoints = CheckpointManager(checkpoint_dir or Config.CHECKPOINT_DIR, Config.CHECKPOINT_KEEP)
+        if self.is_main:
+            print(f"Precision: {self.mixed_precision}, acumulacion: {accumulation}, procesos: {self.world_size}, "
+                  f"batch efectivo: {train_loader.batch_size * accumulation * self.world_size}, gradient checkpointing: {self.gradient_checkpointing}")
+
+        state = {"epoch": 0, "batch": 0, "global_step": 0, "epoch_loss": 0.0, "epoch_samples": 0, "rng": None}
+        if resume is not None:
+            path = checkpoints.latest() if resume == "latest" else resume
+            if path is None:
+                print(f"No hay checkpoints en {checkpoints.root}: se empieza desde cero")
+            else:
+                state = CheckpointManager.load(path, self.unet, optimizer, scaler)
+                print(f"Reanudando desde {path}: epoch {state['epoch']+1}, batch {state['batch']}, paso {state['global_step']}")
+                # Al principio de epoch el iterador de datos aun no existia al guardar
+                if state["batch"] == 0:
+                    self._restore_rng(state.pop("rng"), state["global_step"])
 
         self.unet.train()
 
-        for epoch in range(Config.NUM_EPOCHS):
-            epoch_loss = 0
-            progress_bar = tqdm(train_loader, desc=f"Epoch {epoch+1}/{Config.NUM_EPOCHS}")
-
-            for batch in progress_bar:
-                # Mover datos a GPU
-                sketches = batch["sketch"].to(self.device)
-                animes = batch["anime"].to(self.device)
-                input_ids = batch["input_ids"].to(self.device)
-                
-                # Codificar imágenes con VAE (usamos los animes como target)
-                with torch.no_grad():
-                    # Codificar imágenes anime a latents
-                    anime_latents = self.vae.encode(animes).latent_dist.sample()
-                    anime_latents = anime_latents * self.vae.config.scaling_factor
-
-                    # Codificar sketches para condición
-                    sketch_latents = self.vae.encode(sketches).latent_dist.sample()
-                    sketch_latents = sketch_latents * self.vae.config.scaling_factor
-
-                # Sample noise
-                noise = torch.randn_like(anime_latents)
-                timesteps = torch.randint(0, self.scheduler.num_train_timesteps, (anime_latents.shape[0],), device=self.device)
-                
-                # Add noise to latents
-                noisy_latents = self.scheduler.add_noise(anime_latents, noise, timesteps)
-                
-                # Codificar texto
-                with torch.no_grad():
-                    encoder_hidden_states = self.text_encoder(input_ids)[0]
-                
-                # Predicción del noise - CORREGIDO
-                noise_pred = self.unet(
-                    noisy_latents,
-                    timesteps,
-                    encoder_hidden_states,
-                    added_cond_kwargs={"image_embeds": sketch_latents}
-                ).sample
-                
-                # Loss - comparar con el noise original
-                loss = F.mse_loss(noise_pred, noise)
-                
-                # Backward
-                optimizer.zero_grad()
-                loss.backward()
-                torch.nn.utils.clip_grad_norm_(self.unet.parameters(), 1.0)
-                optimizer.step()
-                
+        for epoch in range(state["epoch"], Config.NUM_EPOCHS):
+            start_batch = state["batch"] if epoch == state["epoch"] else 0
+            epoch_loss = state["epoch_loss"] if start_batch else 0.0
+            epoch_samples = state["epoch_samples"] if start_batch else 0
+            batches, num_batches = self._start_epoch(train_loader, epoch, start_batch)
+            if start_batch and state.get("rng") is not None:
+                # A mitad de epoch el iterador (que consume RNG al crearse) ya existia al guardar
+                self._restore_rng(state.pop("rng"), state["global_step"])
+            epoch_start = time.perf_counter()
+            resumed_samples = epoch_samples
+            progress_bar = tqdm(batches, desc=f"Epoch {epoch+1}/{Config.NUM_EPOCHS}", initial=start_batch, total=num_batches,
+                                disable=not self.is_main)
+            optimizer.zero_grad()
+
+            for step, batch in enumerate(progress_bar, start=start_batch):
+                loss, batch_size = self.compute_loss(batch)
+
+                # Backward; con acumulacion el optimizador avanza cada `accumulation` batches.
+                # La ultima ventana de la epoch puede ser mas corta: se divide por su longitud real
+                window_start = step - step % accumulation
+                scaler.scale(loss / min(accumulation, num_batches - window_start)).backward()
                 epoch_loss += loss.item()
-                progress_bar.set_postfix({"loss": loss.item()})
-            
-            avg_loss = epoch_loss / len(train_loader)
+                epoch_samples += batch_size
+                if (step + 1) % accumulation == 0 or (step + 1) == num_batches:
+                    self.optimizer_step(optimizer, scaler)
+                    state["global_step"] += 1
+                    # Solo entre pasos del optimizador: no hay gradientes a medias que guardar
+                    if self.is_main and checkpoint_every and state["global_step"] % checkpoint_every == 0 and (step + 1) < num_batches:
+                        checkpoints.save(self.unet, optimizer, scaler, {
+                            "epoch": epoch, "batch": step + 1, "global_step": state["global_step"],
+                            "epoch_loss": epoch_loss, "epoch_samples": epoch_samples,
+                        })
+
+                samples_per_sec = (epoch_samples - resumed_samples) / (time.perf_counter() - epoch_start)
+                progress_bar.set_postfix({"loss": loss.item(), "samples/s": f"{samples_per_sec:.2f}"})
+
+            if not self.is_main:
+                continue
+            epoch_time = time.perf_counter() - epoch_start
+            print(f"Epoch {epoch+1}: {epoch_samples - resumed_samples} muestras en {epoch_time:.1f}s ({(epoch_samples - resumed_samples) / epoch_time:.2f} muestras/s)")
+            avg_loss = epoch_loss / num_batches
             print(f"Epoch {epoch+1}, Average Loss: {avg_loss:.4f}")
 
-            # Guardar checkpoint cada 1 épocas
-            if (epoch + 1) % 1 == 0:
-                save_path = f"../ai_models/lora_checkpoint_epoch_{epoch+1}"
-                os.makedirs(save_path, exist_ok=True)
-                self.unet.save_pretrained(save_path)
-                print(f"Checkpoint guardado en {save_path}")
-        
-        # Guardar modelo final
-        self.unet.save_pretrained("../ai_models/sketch_to_anime_lora_final")
-        print("Entrenamiento completado!")
+            # Checkpoint al final de cada epoch (en segundo plano, el bucle no espera la escritura)
+            checkpoints.save(self.unet, optimizer, scaler, {
+                "epoch": epoch + 1, "batch": 0, "global_step": state["global_step"],
+                "epoch_loss": 0.0, "epoch_samples": 0,
+            })
+
+        if self.is_main:
+            checkpoints.wait()
+            # Guardar modelo final
+            self.unet.save_pretrained(output_dir)
+            print(f"Entrenamiento completado! LoRA guardado en {output_dir}")
@@ -1,41 +1,27 @@
+import argparse
 import os
-import shutil
-import random
+from app.config import Config
+from classes.dataset_manifest import build_manifest
 
 # ------------------------------
-# Configuración de carpetas
+# Separacion train/val sin mover archivos: se escribe un manifiesto con
+# una fila por pareja (pair_id, sketch, anime, split) y el dataset lo lee.
 # ------------------------------
-data_dir = r"D:\Ciencias\Drawnime\data"  # carpeta original con todas las clases
-train_dir = os.path.join(data_dir, "train")  # nueva carpeta para entrenamiento
-val_dir = os.path.join(data_dir, "val")      # nueva carpeta para validación
-split_ratio = 0.2  # porcentaje para validación
+if __name__ == "__main__":
+    data_dir = r"D:\Ciencias\Drawnime\data"  # carpeta original con todas las clases
 
-# ------------------------------
-# Crear carpetas train/ y val/ por clase
-# ------------------------------
-for class_name in os.listdir(data_dir):
-    class_path = os.path.join(data_dir, class_name)
-    if os.path.isdir(class_path):
-        os.makedirs(os.path.join(train_dir, class_name), exist_ok=True)
-        os.makedirs(os.path.join(val_dir, class_name), exist_ok=True)
-
-        # Listar todas las imágenes de la clase
-        images = [f for f in os.listdir(class_path) if os.path.isfile(os.path.join(class_path, f))]
-        random.shuffle(images)
-
-        # Calcular cantidad para validación
-        val_count = int(len(images) * split_ratio)
-        val_images = images[:val_count]
-        train_images = images[val_count:]
-
-        # Mover imágenes
-        for img in val_images:
-            shutil.move(os.path.join(class_path, img), os.path.join(val_dir, class_name, img))
-        for img in train_images:
-            shutil.move(os.path.join(class_path, img), os.path.join(train_dir, class_name, img))
+    parser = argparse.ArgumentParser(description="Escribe el manifiesto train/val de parejas sketch/anime sin mover archivos.")
+    parser.add_argument("--sketch-dir", type=str, default=os.path.join(data_dir, "sketches"))
+    parser.add_argument("--anime-dir", type=str, default=os.path.join(data_dir, "faces"))
+    parser.add_argument("--out", type=str, default=Config.MANIFEST_PATH, help="Ruta del manifiesto CSV.")
+    parser.add_argument("--val-ratio", type=float, default=Config.VAL_RATIO, help="Porcentaje para validacion.")
+    parser.add_argument("--seed", type=int, default=Config.SPLIT_SEED, help="Semilla del split (mismo seed = mismo split).")
+    parser.add_argument("--threads", type=int, default=16, help="Carpetas listadas en paralelo.")
+    args = parser.parse_args()
 
-        # Opcional: borrar carpeta original si está vacía
-        if not os.listdir(class_path):
-            os.rmdir(class_path)
+    summary = build_manifest(args.sketch_dir, args.anime_dir, args.out, args.seed, args.val_ratio, args.threads)
 
-print("Separación completa: 80% train / 20% val")
+    for side, missing in (("cara", summary["missing_anime"]), ("boceto", summary["missing_sketch"])):
+        if missing:
+            print(f"{len(missing)} parejas sin {side}, excluidas (p. ej. {', '.join(missing[:5])})")
+    print(f"Manifiesto en {args.out}: {summary['pairs']} parejas, {summary['train']} train / {summary['val']} val")
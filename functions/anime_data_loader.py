@@ -2,21 +2,52 @@
 
 import torch
 from classes.sketch_2_anime_dataset import SketchToAnimeSDDataset
+from classes.sketch_2_anime_latent_dataset import SketchToAnimeLatentDataset
+from classes.packed_sketch_2_anime_dataset import PackedSketchToAnimeDataset
 from app.config import Config
+from classes.model_registry import ModelRegistry
+from classes.resumable_sampler import ResumableRandomSampler
 from torch.utils.data import DataLoader
 
-def get_data_loader(number_of_images=None):
-    dataset = SketchToAnimeSDDataset(
-        sketch_dir=Config.SKETCH_DIR,
-        anime_dir=Config.ANIME_DIR,
-        image_size=Config.IMAGE_SIZE,
-        tokenizer=Config.TOKENIZER
-    )
-    train_loader = DataLoader(dataset, batch_size=Config.BATCH_SIZE, shuffle=True)
+def _loader_kwargs():
+    """Carga en paralelo, con memoria fijada para copiar rapido a la GPU"""
+    num_workers = Config.DATALOADER_WORKERS
+    kwargs = {
+        "num_workers": num_workers,
+        "pin_memory": torch.cuda.is_available(),
+    }
+    if num_workers > 0:
+        kwargs["persistent_workers"] = True
+        kwargs["prefetch_factor"] = Config.DATALOADER_PREFETCH
+    return kwargs
+
+def get_data_loader(number_of_images=None, latent_dir=None, packed_dir=None, manifest=None, split="train", num_replicas=1, rank=0):
+    """DataLoader de entrenamiento.
+
+    Con `latent_dir` lee latentes precalculados y con `packed_dir` parejas
+    empaquetadas en shards; si no, decodifica las imagenes de las parejas del
+    `split` del manifiesto o, sin manifiesto, las de las carpetas. Con
+    `num_replicas` > 1 solo se recorre la parte del proceso `rank`.
+    """
+    if latent_dir is not None:
+        dataset = SketchToAnimeLatentDataset(latent_dir)
+    elif packed_dir is not None:
+        dataset = PackedSketchToAnimeDataset(packed_dir, tokenizer=ModelRegistry().tokenizer())
+    else:
+        dataset = SketchToAnimeSDDataset(
+            sketch_dir=Config.SKETCH_DIR,
+            anime_dir=Config.ANIME_DIR,
+            image_size=Config.IMAGE_SIZE,
+            tokenizer=ModelRegistry().tokenizer(),
+            manifest=manifest,
+            split=split
+        )
 
     if number_of_images is not None:
         # Usar solo un número específico de imágenes
-        train_dataset = torch.utils.data.Subset(dataset, range(min(number_of_images, len(dataset))))
-        train_loader = DataLoader(train_dataset, batch_size=Config.BATCH_SIZE, shuffle=True)
+        dataset = torch.utils.data.Subset(dataset, range(min(number_of_images, len(dataset))))
 
-    return train_loader
\ No newline at end of file
+    # Orden aleatorio reproducible por epoch: permite reanudar a mitad de epoch
+    sampler = ResumableRandomSampler(dataset, seed=Config.TRAIN_SEED, num_replicas=num_replicas, rank=rank)
+    train_loader = DataLoader(dataset, batch_size=Config.BATCH_SIZE, sampler=sampler, **_loader_kwargs())
+    return train_loader
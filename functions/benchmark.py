@@ -0,0 +1,252 @@
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import torch
+from PIL import Image
+from app.config import Config
+from classes.model_registry import ModelRegistry
+
+SCENARIOS = ("generator", "dataset", "trainer")
+
+
+def _sync():
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+
+
+def _metric(values: list[float], unit: str, higher_is_better: bool = False) -> dict:
+    return {
+        "value": round(statistics.median(values), 3),
+        "min": round(min(values), 3),
+        "max": round(max(values), 3),
+        "runs": len(values),
+        "unit": unit,
+        "higher_is_better": higher_is_better,
+    }
+
+
+def _random_png(size: int = 512) -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray(np.random.randint(0, 255, (size, size, 3), dtype=np.uint8)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def use_tiny_model(work_dir: str):
+    """Apunta Config a un checkpoint y un LoRA diminutos con pesos aleatorios (sin descargas)"""
+    from functions.tiny_models import build_tiny_lora, build_tiny_model
+    model_dir = build_tiny_model(os.path.join(work_dir, "model"))
+    Config.MODEL_ID = model_dir
+    Config.LORA_PATH = build_tiny_lora(model_dir, os.path.join(work_dir, "lora"))
+
+
+def bench_generator(work_dir: str, steps: int, repeats: int) -> dict:
+    """Latencia de extremo a extremo de GeneratorService por modo y coste del cambio de modo"""
+    from app import create_app
+    from app.services.generator_service import GeneratorService
+
+    app = create_app()
+    app.config["RESULT_FOLDER"] = os.path.join(work_dir, "results")
+    service = GeneratorService()
+    sketch = _random_png()
+
+    def run(mode: str) -> float:
+        start = time.perf_counter()
+        if mode == "text":
+            result = service.text_to_image("anime style", num_inference_steps=steps)
+        else:
+            result = service.image_to_image(sketch, "anime style", num_inference_steps=steps, strength=1.0)
+        if result["status"] != "success":
+            raise RuntimeError(f"Generacion {mode} fallida: {result['message']}")
+        for filename in result["filenames"]:
+            service.wait_for_result(filename)
+        _sync()
+        return (time.perf_counter() - start) * 1000
+
+    metrics = {}
+    with app.app_context():
+        # Primera peticion de cada modo: incluye construir el pipeline
+        for mode in ("text", "image"):
+            metrics[f"generator.{mode}.cold_ms"] = _metric([run(mode)], "ms")
+            metrics[f"mode_switch.{mode}.load_ms"] = _metric([service.get_switch_stats()["last_ms"]], "ms")
+
+        latencies = {"text": [], "image": []}
+        switch_ms = []
+        for _ in range(repeats):
+            for mode in ("text", "image"):
+                latencies[mode].append(run(mode))
+                switch_ms.append(service.get_switch_stats()["last_ms"])
+        for mode, values in latencies.items():
+            metrics[f"generator.{mode}.latency_ms"] = _metric(values, "ms")
+        metrics["mode_switch.warm_ms"] = _metric(switch_ms, "ms")
+    return metrics
+
+
+def write_pairs(work_dir: str, pairs: int):
+    """Parejas sinteticas boceto/cara en work_dir, a las que apunta Config"""
+    Config.SKETCH_DIR = os.path.join(work_dir, "sketches")
+    Config.ANIME_DIR = os.path.join(work_dir, "faces")
+    for folder in (Config.SKETCH_DIR, Config.ANIME_DIR):
+        os.makedirs(folder, exist_ok=True)
+        for idx in range(pairs):
+            with open(os.path.join(folder, f"{idx:05d}.png"), "wb") as f:
+                f.write(_random_png(Config.IMAGE_SIZE))
+
+
+def bench_dataset(epochs: int) -> dict:
+    """Muestras por segundo de SketchToAnimeSDDataset a traves de get_data_loader"""
+    from functions.anime_data_loader import get_data_loader
+
+    loader = get_data_loader()
+    samples_per_sec = []
+    for _ in range(epochs):
+        start, samples = time.perf_counter(), 0
+        for batch in loader:
+            samples += batch["anime"].shape[0]
+        samples_per_sec.append(samples / (time.perf_counter() - start))
+    return {"dataset.samples_per_sec": _metric(samples_per_sec, "samples/s", higher_is_better=True)}
+
+
+def bench_trainer(steps: int) -> dict:
+    """Tiempo por paso de TrainerLora (forward, backward y optimizador) con batches reales del loader"""
+    from classes.trainer_lora import TrainerLora
+    from functions.anime_data_loader import get_data_loader
+
+    trainer = TrainerLora(use_latents=False)
+    optimizer, scaler = trainer.prepare_training()
+    trainer.unet.train()
+    batch = next(iter(get_data_loader()))
+
+    def step() -> float:
+        _sync()
+        start = time.perf_counter()
+        loss, _ = trainer.compute_loss(batch)
+        scaler.scale(loss).backward()
+        trainer.optimizer_step(optimizer, scaler)
+        _sync()
+        return (time.perf_counter() - start) * 1000
+
+    step()
+    step_ms = [step() for _ in range(steps)]
+    return {"trainer.step_ms": _metric(step_ms, "ms")}
+
+
+def _run_scenario(scenario: str, work_dir: str, settings: dict, steps: int, repeats: int, train_steps: int) -> dict:
+    """Un escenario en el proceso actual, con Config apuntando a los modelos y datos de `settings`"""
+    for name, value in settings.items():
+        setattr(Config, name, value)
+    ModelRegistry().configure(model_id=Config.MODEL_ID)
+    if scenario == "generator":
+        return bench_generator(work_dir, steps, repeats)
+    if scenario == "dataset":
+        return bench_dataset(max(1, repeats))
+    return bench_trainer(train_steps)
+
+
+def _run_isolated(scenario: str, *args) -> dict:
+    # Proceso nuevo por escenario: los modelos, pipelines y caches de uno no
+    # quedan en memoria ni calientes para el siguiente
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_run_scenario, scenario, *args).result()
+
+
+def run_benchmarks(out: str, scenarios=SCENARIOS, steps: int = 4, repeats: int = 3, pairs: int = 16,
+                   train_steps: int = 5, model_id: str = None, lora_path: str = None) -> dict:
+    """Ejecuta cada escenario en su propio proceso y guarda el informe en JSON"""
+    with tempfile.TemporaryDirectory(prefix="oni-bench-") as work_dir:
+        if model_id is None:
+            use_tiny_model(work_dir)
+        else:
+            Config.MODEL_ID = model_id
+            Config.LORA_PATH = lora_path or Config.LORA_PATH
+        # La fusion del benchmark nunca escribe en la cache de produccion
+        Config.MERGED_UNET_DIR = os.path.join(work_dir, "merged_unet")
+        if "dataset" in scenarios or "trainer" in scenarios:
+            write_pairs(work_dir, pairs)
+        settings = {name: getattr(Config, name)
+                    for name in ("MODEL_ID", "LORA_PATH", "MERGED_UNET_DIR", "SKETCH_DIR", "ANIME_DIR")}
+
+        metrics = {}
+        for scenario, label in (("generator", "GeneratorService"), ("dataset", "el dataset"), ("trainer", "TrainerLora")):
+            if scenario in scenarios:
+                print(f"Midiendo {label}...")
+                metrics.update(_run_isolated(scenario, work_dir, settings, steps, repeats, train_steps))
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "model": "tiny" if model_id is None else model_id,
+            "device": str(Config.DEVICE),
+            "dtype": str(Config.INFERENCE_DTYPE),
+            "torch": torch.__version__,
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "params": {"steps": steps, "repeats": repeats, "pairs": pairs, "train_steps": train_steps},
+        },
+        "metrics": metrics,
+    }
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    for name, metric in metrics.items():
+        print(f"{name:>32}: {metric['value']:.2f} {metric['unit']}")
+    print(f"Resultados guardados en {out}")
+    return report
+
+
+def compare_reports(baseline_path: str, current_path: str, threshold: float = 0.10) -> list[str]:
+    """Compara dos informes y devuelve las metricas que empeoran mas de `threshold`"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["metrics"]
+    with open(current_path) as f:
+        current = json.load(f)["metrics"]
+
+    regressions = []
+    for name in sorted(set(baseline) & set(current)):
+        before, after = baseline[name]["value"], current[name]["value"]
+        change = (after - before) / before if before else 0.0
+        worse = -change if current[name]["higher_is_better"] else change
+        status = "REGRESION" if worse > threshold else ("mejora" if worse < -threshold else "ok")
+        if status == "REGRESION":
+            regressions.append(name)
+        print(f"{name:>32}: {before:>10.2f} -> {after:>10.2f} {current[name]['unit']:<10} {change:+7.1%}  {status}")
+    for name in sorted(set(baseline) ^ set(current)):
+        print(f"{name:>32}: solo en {'la base' if name in baseline else 'el actual'}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de inferencia, datos y entrenamiento con modelos diminutos.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Ejecuta los benchmarks y guarda un JSON.")
+    run_parser.add_argument("--out", type=str, default="benchmark.json", help="Archivo JSON de resultados.")
+    run_parser.add_argument("--only", type=str, nargs="+", choices=SCENARIOS, default=list(SCENARIOS), help="Escenarios a medir.")
+    run_parser.add_argument("--steps", type=int, default=4, help="Pasos de inferencia por generacion.")
+    run_parser.add_argument("--repeats", type=int, default=3, help="Repeticiones por medida.")
+    run_parser.add_argument("--pairs", type=int, default=16, help="Parejas sintéticas del dataset.")
+    run_parser.add_argument("--train-steps", type=int, default=5, help="Pasos de entrenamiento medidos.")
+    run_parser.add_argument("--model-id", type=str, default=None, help="Checkpoint real en lugar del modelo diminuto.")
+    run_parser.add_argument("--lora-path", type=str, default=None, help="Adaptador LoRA del checkpoint real.")
+
+    compare_parser = subparsers.add_parser("compare", help="Compara dos JSON y marca regresiones.")
+    compare_parser.add_argument("baseline", type=str, help="JSON de referencia.")
+    compare_parser.add_argument("current", type=str, help="JSON a comparar.")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="Empeoramiento relativo tolerado (0.10 = 10%%).")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run_benchmarks(args.out, args.only, args.steps, args.repeats, args.pairs, args.train_steps,
+                       args.model_id, args.lora_path)
+    else:
+        regressions = compare_reports(args.baseline, args.current, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regresiones: {', '.join(regressions)}")
+            sys.exit(1)
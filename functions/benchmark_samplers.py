@@ -0,0 +1,82 @@
+import argparse
+import json
+import os
+import time
+import torch
+from app.config import Config
+from classes.sampler_registry import SAMPLERS
+from classes.sketch_2_anime import SketchToAnime
+from classes.text_2_anime import TextToAnime
+from functions.load_lora_model import setup_img2img_with_lora, setup_text2img_with_lora
+
+
+def _sync():
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+
+
+def benchmark_samplers(samplers, steps_list, mode="text", prompt=None, sketch=None, repeats=2, seed=0, out_dir=None):
+    """Latencia por sampler y numero de pasos sobre el mismo pipeline cargado.
+
+    Con `out_dir` se guarda cada imagen (misma semilla) para comparar calidad a ojo.
+    """
+    prompt = prompt or "anime style, high quality, detailed, hair with vibrant colors, masterpiece"
+    if mode == "text":
+        generator = TextToAnime(setup_text2img_with_lora(Config.MODEL_ID, Config.LORA_PATH))
+        run = lambda sampler, steps: generator.generate(prompt, num_inference_steps=steps, seed=seed, sampler=sampler)
+    else:
+        with open(sketch, "rb") as f:
+            sketch_bytes = f.read()
+        generator = SketchToAnime(setup_img2img_with_lora(Config.MODEL_ID, Config.LORA_PATH))
+        run = lambda sampler, steps: generator.generate(sketch_bytes, prompt, num_inference_steps=steps, seed=seed, sampler=sampler)
+
+    # Calentamiento: carga de kernels y asignaciones de memoria fuera de la medida
+    run(samplers[0], min(steps_list))
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    results = []
+    for sampler in samplers:
+        for steps in steps_list:
+            timings = []
+            for _ in range(repeats):
+                _sync()
+                start = time.perf_counter()
+                images = run(sampler, steps)
+                _sync()
+                timings.append((time.perf_counter() - start) * 1000)
+            if out_dir:
+                images[0].save(os.path.join(out_dir, f"{mode}_{sampler}_{steps}.png"))
+            row = {
+                "sampler": sampler,
+                "steps": steps,
+                "mean_ms": round(sum(timings) / len(timings), 1),
+                "min_ms": round(min(timings), 1),
+                "ms_per_step": round(min(timings) / steps, 1),
+            }
+            results.append(row)
+            print(f"{sampler:>16} {steps:>4} pasos: {row['mean_ms']:>9.1f}ms (min {row['min_ms']:.1f}ms, {row['ms_per_step']:.1f}ms/paso)")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mide la latencia de cada sampler segun el numero de pasos.")
+    parser.add_argument("--mode", type=str, choices=["text", "sketch"], default="text", help="Pipeline a medir.")
+    parser.add_argument("--sketch", type=str, default=None, help="Boceto de entrada para el modo sketch.")
+    parser.add_argument("--prompt", type=str, default=None, help="Prompt de la generacion.")
+    parser.add_argument("--samplers", type=str, nargs="+", default=list(SAMPLERS), help="Samplers a medir.")
+    parser.add_argument("--steps", type=int, nargs="+", default=[10, 15, 20, 25, 30, 50], help="Numeros de pasos a medir.")
+    parser.add_argument("--repeats", type=int, default=2, help="Repeticiones por combinacion.")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla fija para comparar calidad.")
+    parser.add_argument("--out-dir", type=str, default=None, help="Carpeta donde guardar las imagenes de cada combinacion.")
+    parser.add_argument("--json", type=str, default=None, help="Archivo donde guardar los resultados en JSON.")
+    args = parser.parse_args()
+
+    if args.mode == "sketch" and args.sketch is None:
+        parser.error("--sketch es obligatorio en modo sketch")
+
+    results = benchmark_samplers(args.samplers, args.steps, args.mode, args.prompt, args.sketch,
+                                 args.repeats, args.seed, args.out_dir)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"mode": args.mode, "device": str(Config.DEVICE), "results": results}, f, indent=2)
@@ -0,0 +1,92 @@
+import os
+import torch
+from app.config import Config
+
+_threads_configured = False
+
+
+def configure_cpu_threads():
+    """Fija los hilos intra-op e inter-op de PyTorch (0 = valor por defecto de torch).
+
+    El numero de hilos inter-op solo se puede cambiar antes del primer trabajo
+    paralelo, por eso se llama al crear GeneratorService.
+    """
+    global _threads_configured
+    if _threads_configured:
+        return
+    _threads_configured = True
+    if Config.CPU_NUM_THREADS > 0:
+        torch.set_num_threads(Config.CPU_NUM_THREADS)
+    if Config.CPU_INTEROP_THREADS > 0:
+        try:
+            torch.set_num_interop_threads(Config.CPU_INTEROP_THREADS)
+        except RuntimeError as e:
+            print(f"No se pudieron fijar los hilos inter-op: {e}")
+    print(f"Inferencia en CPU con {torch.get_num_threads()} hilos intra-op y {torch.get_num_interop_threads()} inter-op")
+
+
+def bind_worker_threads(worker_index: int, num_workers: int) -> int:
+    """Reparte los nucleos entre los workers de gunicorn despues del fork.
+
+    Cada worker usa CPU_NUM_THREADS hilos (o nucleos / workers) y, con
+    WORKER_CPU_AFFINITY, queda fijado a su propio bloque de nucleos para que los
+    workers no compitan por los mismos.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+    num_threads = Config.CPU_NUM_THREADS or max(1, len(cores) // num_workers)
+    if Config.WORKER_CPU_AFFINITY and hasattr(os, "sched_setaffinity"):
+        start = (worker_index * num_threads) % len(cores)
+        block = {cores[(start + i) % len(cores)] for i in range(num_threads)}
+        os.sched_setaffinity(0, block)
+    torch.set_num_threads(num_threads)
+    print(f"Worker {worker_index} (pid {os.getpid()}) con {num_threads} hilos intra-op")
+    return num_threads
+
+
+def _quantize_linear(module: torch.nn.Module, name: str) -> torch.nn.Module:
+    """Cuantizacion dinamica int8 de las capas Linear, en el sitio y una sola vez.
+
+    La UNet y el text encoder son compartidos por los pipelines de texto e imagen,
+    asi que se modifican en el sitio para no duplicar pesos.
+    """
+    if getattr(module, "_int8_quantized", False):
+        return module
+    if next(module.parameters()).dtype != torch.float32:
+        print(f"Cuantizacion int8 de {name} omitida: requiere pesos float32")
+        return module
+    torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    module._int8_quantized = True
+    print(f"{name}: capas Linear cuantizadas a int8")
+    return module
+
+
+def _compiled(module: torch.nn.Module) -> torch.nn.Module:
+    # Un solo modulo compilado por componente compartido
+    if getattr(module, "_compiled_module", None) is None:
+        module._compiled_module = torch.compile(module)
+    return module._compiled_module
+
+
+def optimize_pipeline_for_cpu(pipe):
+    """Perfil de inferencia en CPU: hilos, channels_last, int8 dinamico y torch.compile opcionales"""
+    configure_cpu_threads()
+
+    if Config.CPU_CHANNELS_LAST:
+        pipe.unet.to(memory_format=torch.channels_last)
+        pipe.vae.to(memory_format=torch.channels_last)
+
+    if Config.CPU_QUANTIZE_INT8:
+        # Con el LoRA sin fusionar peft lee `.weight` de sus Linear: no se puede cuantizar
+        if hasattr(pipe.unet, "peft_config"):
+            print("Cuantizacion int8 de la UNet omitida: el LoRA no esta fusionado (FUSE_LORA=0)")
+        else:
+            _quantize_linear(pipe.unet, "unet")
+        _quantize_linear(pipe.text_encoder, "text_encoder")
+
+    if Config.CPU_COMPILE:
+        pipe.unet = _compiled(pipe.unet)
+
+    return pipe
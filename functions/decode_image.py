@@ -0,0 +1,24 @@
+import io
+from PIL import Image
+
+
+def decode_image(data: bytes, size: int | tuple[int, int] = 512) -> Image.Image:
+    """Decodifica una imagen desde memoria directamente a `size` RGB (lado o (ancho, alto)).
+
+    En JPEG se usa `draft` para que el decodificador escale en el dominio DCT
+    (1/2, 1/4, 1/8) y nunca se decodifique la imagen completa; en el resto de
+    formatos se usa `reduce` antes del resize final.
+    """
+    width, height = (size, size) if isinstance(size, int) else size
+    image = Image.open(io.BytesIO(data))
+    if image.format == "JPEG":
+        image.draft("RGB", (width, height))
+        image = image.convert("RGB")
+    else:
+        image = image.convert("RGB")
+        factor = min(image.width // width, image.height // height)
+        if factor >= 2:
+            image = image.reduce(factor)
+    if image.size == (width, height):
+        return image
+    return image.resize((width, height))
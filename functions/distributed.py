@@ -0,0 +1,64 @@
+import os
+import torch
+import torch.distributed as dist
+from torch._utils import _flatten_dense_tensors, _unflatten_dense_tensors
+from app.config import Config
+
+
+def init_distributed() -> tuple[int, int, torch.device]:
+    """Inicializa torch.distributed con las variables que define torchrun (RANK, WORLD_SIZE, LOCAL_RANK).
+
+    NCCL con una GPU por proceso si hay CUDA; gloo en CPU. Sin WORLD_SIZE (o con
+    1) no se inicializa nada y se entrena en un solo proceso.
+    Devuelve (rank, world_size, device).
+    """
+    world_size = int(os.environ.get("WORLD_SIZE", 1))
+    if world_size == 1:
+        return 0, 1, Config.DEVICE
+
+    rank = int(os.environ["RANK"])
+    local_rank = int(os.environ.get("LOCAL_RANK", 0))
+    if torch.cuda.is_available():
+        device = torch.device("cuda", local_rank % torch.cuda.device_count())
+        torch.cuda.set_device(device)
+        backend = "nccl"
+    else:
+        device = torch.device("cpu")
+        backend = "gloo"
+    dist.init_process_group(backend=backend)
+    print(f"Proceso {rank}/{world_size} en {device} ({backend})")
+    return rank, world_size, device
+
+
+def is_distributed() -> bool:
+    return dist.is_available() and dist.is_initialized()
+
+
+def cleanup():
+    if is_distributed():
+        dist.destroy_process_group()
+
+
+def broadcast_parameters(params: list[torch.Tensor], src: int = 0):
+    """Copia los parametros del rango `src` al resto (el LoRA se inicializa al azar en cada proceso)"""
+    flat = _flatten_dense_tensors([p.data for p in params])
+    dist.broadcast(flat, src)
+    for param, synced in zip(params, _unflatten_dense_tensors(flat, [p.data for p in params])):
+        param.data.copy_(synced)
+
+
+def all_reduce_gradients(params: list[torch.Tensor], world_size: int):
+    """Media de los gradientes entre procesos en una sola llamada.
+
+    Solo se pasan los parametros entrenables (el LoRA): la UNet base esta
+    congelada y no tiene gradientes que sincronizar.
+    """
+    params = [p for p in params if p.grad is not None]
+    if not params:
+        return
+    grads = [p.grad for p in params]
+    flat = _flatten_dense_tensors(grads)
+    dist.all_reduce(flat, op=dist.ReduceOp.SUM)
+    flat /= world_size
+    for grad, synced in zip(grads, _unflatten_dense_tensors(flat, grads)):
+        grad.copy_(synced)
@@ -1,31 +1,41 @@
-from diffusers import StableDiffusionPipeline, ControlNetModel, StableDiffusionImg2ImgPipeline
+from diffusers import StableDiffusionPipeline, StableDiffusionImg2ImgPipeline
 from app.config import Config
-import torch
-from peft import PeftModel
+from classes.model_registry import ModelRegistry
+from functions.cpu_inference import optimize_pipeline_for_cpu
 
-def setup_text2img_with_lora(base_model_id, lora_path):
-    print("Cargando modelo text2img con LoRA...")
+
+def _shared_components(base_model_id, lora_path, fuse_lora=None):
+    """Componentes compartidos del registro, con el LoRA fusionado en la UNet o envolviendola"""
+    registry = ModelRegistry()
+    registry.configure(dtype=Config.INFERENCE_DTYPE, model_id=base_model_id)
+    fuse_lora = Config.FUSE_LORA if fuse_lora is None else fuse_lora
+    return {
+        "vae": registry.vae(),
+        "text_encoder": registry.text_encoder(),
+        "tokenizer": registry.tokenizer(),
+        "unet": registry.merged_unet(lora_path) if fuse_lora else registry.lora_unet(lora_path),
+        "scheduler": registry.scheduler(),
+        "safety_checker": None,
+        "feature_extractor": None,
+        "requires_safety_checker": False,
+    }
+
+
+def setup_text2img_with_lora(base_model_id, lora_path, fuse_lora=None):
     """Configurar pipeline text2img con LoRA"""
-    pipe = StableDiffusionPipeline.from_pretrained(
-        base_model_id,
-        torch_dtype=torch.float16,
-        safety_checker=None,
-        requires_safety_checker=False
-    )
-    
-    pipe.unet = PeftModel.from_pretrained(pipe.unet, lora_path)
+    print("Cargando modelo text2img con LoRA...")
+    pipe = StableDiffusionPipeline(**_shared_components(base_model_id, lora_path, fuse_lora))
     pipe = pipe.to(Config.DEVICE)
+    if Config.DEVICE.type == "cpu":
+        pipe = optimize_pipeline_for_cpu(pipe)
     return pipe
 
-def setup_img2img_with_lora(base_model_id, lora_path):
+
+def setup_img2img_with_lora(base_model_id, lora_path, fuse_lora=None):
     """Configurar pipeline img2img con LoRA"""
     print("Cargando modelo img2img con LoRA...")
-    
-    pipe = StableDiffusionImg2ImgPipeline.from_pretrained(
-        base_model_id,
-        torch_dtype=torch.float16,
-        safety_checker=None,
-    )
-    pipe.unet = PeftModel.from_pretrained(pipe.unet, lora_path)
+    pipe = StableDiffusionImg2ImgPipeline(**_shared_components(base_model_id, lora_path, fuse_lora))
     pipe = pipe.to(Config.DEVICE)
-    return pipe
\ No newline at end of file
+    if Config.DEVICE.type == "cpu":
+        pipe = optimize_pipeline_for_cpu(pipe)
+    return pipe
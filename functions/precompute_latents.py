@@ -0,0 +1,83 @@
+import argparse
+import os
+import torch
+from torch.utils.data import DataLoader
+from tqdm import tqdm
+from app.config import Config
+from classes.model_registry import ModelRegistry
+from classes.shard_store import ShardWriter
+from classes.sketch_2_anime_dataset import SketchToAnimeSDDataset
+
+
+def precompute_latents(out_dir, batch_size=8, shard_size=4096, number_of_images=None, num_workers=0, manifest=None, split="train"):
+    """Codifica el dataset una vez con el VAE y el text encoder congelados; sin `manifest` lista las carpetas"""
+    registry = ModelRegistry()
+    vae = registry.vae(torch.float32).to(Config.DEVICE)
+    text_encoder = registry.text_encoder(torch.float32).to(Config.DEVICE)
+    vae.requires_grad_(False)
+    text_encoder.requires_grad_(False)
+
+    dataset = SketchToAnimeSDDataset(
+        sketch_dir=Config.SKETCH_DIR,
+        anime_dir=Config.ANIME_DIR,
+        image_size=Config.IMAGE_SIZE,
+        tokenizer=registry.tokenizer(),
+        manifest=manifest,
+        split=split
+    )
+    if number_of_images is not None:
+        dataset = torch.utils.data.Subset(dataset, range(min(number_of_images, len(dataset))))
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers)
+
+    latent_size = Config.IMAGE_SIZE // 8
+    latent_shape = (vae.config.latent_channels, latent_size, latent_size)
+    fields = {name: (latent_shape, "float16") for name in ("anime_mean", "anime_std", "sketch_mean", "sketch_std")}
+    prompt = dataset.prompt if hasattr(dataset, "prompt") else dataset.dataset.prompt
+    writer = ShardWriter(out_dir, fields, shard_size=shard_size, metadata={
+        "model_id": Config.MODEL_ID,
+        "image_size": Config.IMAGE_SIZE,
+        "scaling_factor": vae.config.scaling_factor,
+        "prompt": prompt,
+        "manifest": manifest,
+        "split": split if manifest is not None else None,
+    })
+
+    scaling_factor = vae.config.scaling_factor
+    encoder_hidden_states = None
+    with torch.no_grad():
+        for batch in tqdm(loader, desc="Codificando latentes"):
+            # El prompt es constante: se codifica una sola vez
+            if encoder_hidden_states is None:
+                input_ids = batch["input_ids"][:1].to(Config.DEVICE)
+                encoder_hidden_states = text_encoder(input_ids)[0][0].cpu()
+
+            encoded = {}
+            for name in ("anime", "sketch"):
+                latent_dist = vae.encode(batch[name].to(Config.DEVICE)).latent_dist
+                encoded[f"{name}_mean"] = (latent_dist.mean * scaling_factor).half().cpu().numpy()
+                encoded[f"{name}_std"] = (latent_dist.std * scaling_factor).half().cpu().numpy()
+            writer.write_batch(encoded)
+
+    index = writer.close()
+    torch.save(encoder_hidden_states, os.path.join(out_dir, "prompt_embeds.pt"))
+    print(f"{index['total']} pares codificados en {out_dir}")
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precalcula los latentes VAE y el embedding del prompt para entrenar LoRA.")
+    parser.add_argument("--out", type=str, default=Config.LATENT_DIR, help="Carpeta de salida de los shards de latentes.")
+    parser.add_argument("--batch-size", type=int, default=8, help="Imagenes por pasada del VAE.")
+    parser.add_argument("--shard-size", type=int, default=4096, help="Muestras por shard.")
+    parser.add_argument("--number-of-images", type=int, default=None, help="Usar solo las primeras N parejas.")
+    parser.add_argument("--manifest", type=str, default=Config.MANIFEST_PATH, help="Manifiesto de parejas (divider.py).")
+    parser.add_argument("--split", type=str, default="train", help="Split del manifiesto a codificar.")
+    parser.add_argument("--no-manifest", action="store_true", help="Emparejar por nombre listando SKETCH_DIR y ANIME_DIR.")
+    parser.add_argument("--num-workers", type=int, default=0, help="Workers del DataLoader para leer imagenes.")
+    args = parser.parse_args()
+    manifest = None if args.no_manifest else args.manifest
+    if manifest is not None and not os.path.isfile(manifest):
+        parser.error(f"No existe el manifiesto {manifest}: generalo con divider.py o usa --no-manifest")
+
+    precompute_latents(args.out, args.batch_size, args.shard_size, args.number_of_images, args.num_workers,
+                       manifest=manifest, split=args.split)
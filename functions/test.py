@@ -1,4 +1,6 @@
 import argparse
+import os
+import time
 from datetime import datetime
 import torch
 from classes.text_2_anime import TextToAnime
@@ -6,6 +8,37 @@ from classes.sketch_2_anime import SketchToAnime
 from functions.load_lora_model import setup_text2img_with_lora, setup_img2img_with_lora
 from app.config import Config
 
+SKETCH_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+
+
+def run_batch(mode: str, items: list, prompt: str, output: str, steps: int = None, seed: int = None,
+              output_format: str = None, width: int = None, height: int = None):
+    """Genera todos los elementos con GeneratorService.generate_many y muestra cada resultado al terminar"""
+    from app.services.generator_service import GeneratorService
+
+    service = GeneratorService()
+    start = time.perf_counter()
+    results = service.generate_many(
+        'image' if mode == 'sketch' else 'text', items, prompt=prompt, num_inference_steps=steps,
+        strength=0.75, guidance_scale=9, seed=seed, output_format=output_format,
+        width=width, height=height, folder=output)
+
+    filenames, errors = [], 0
+    for done, result in enumerate(results, start=1):
+        if result['status'] == 'success':
+            filenames += result['filenames']
+            print(f"[{done}/{len(items)}] {items[result['index']] if mode == 'sketch' else result['index']} -> {', '.join(result['filenames'])}")
+        else:
+            errors += 1
+            print(f"[{done}/{len(items)}] error en {result['index']}: {result['message']}")
+    # Los guardados son asincronos: el tiempo total incluye el ultimo
+    for filename in filenames:
+        service.wait_for_result(filename, output)
+
+    elapsed = time.perf_counter() - start
+    print(f"{len(filenames)} imagenes en {elapsed:.1f}s ({len(filenames) / elapsed:.2f} img/s), {errors} errores. Resultados en {output}")
+
+
 if __name__ == "__main__":
     print("🚀 Iniciando test.py ...")
     
@@ -14,8 +47,26 @@ if __name__ == "__main__":
     parser.add_argument("--input", type=str, required=False, help="Ruta de la imagen de entrada o texto.")
     parser.add_argument("--prompt", type=str, required=False, help="Texto descriptivo para la generación de imágenes.")
     parser.add_argument("--mode", type=str, choices=["text", "sketch"], required=True, help="Modo de operación: 'text' o 'sketch'.")
+    parser.add_argument("--prompts-file", type=str, required=False, help="Archivo con un prompt por linea (generacion masiva de texto).")
+    parser.add_argument("--output", type=str, default="results", help="Carpeta de resultados de la generacion masiva.")
+    parser.add_argument("--steps", type=int, default=None, help="Pasos de inferencia (por defecto los del sampler).")
+    parser.add_argument("--seed", type=int, default=None, help="Semilla base de la generacion masiva.")
+    parser.add_argument("--format", type=str, default=None, help="Formato de salida: png, webp o jpeg.")
+    parser.add_argument("--width", type=int, default=None, help="Ancho de salida (multiplo de 8).")
+    parser.add_argument("--height", type=int, default=None, help="Alto de salida (multiplo de 8).")
     args = parser.parse_args()
 
+    # Carpeta de bocetos o archivo de prompts: generacion masiva con las etapas solapadas
+    if (args.mode == "sketch" and args.input and os.path.isdir(args.input)) or (args.mode == "text" and args.prompts_file):
+        if args.mode == "sketch":
+            items = sorted(os.path.join(args.input, name) for name in os.listdir(args.input)
+                           if name.lower().endswith(SKETCH_EXTENSIONS))
+        else:
+            with open(args.prompts_file, encoding="utf-8") as f:
+                items = [line.strip() for line in f if line.strip()]
+        run_batch(args.mode, items, args.prompt, args.output, args.steps, args.seed, args.format, args.width, args.height)
+        raise SystemExit(0)
+
     random_name = "output_" + datetime.now().strftime("%Y%m%d_%H%M%S") + ".png"
     if args.mode == "text" and args.input is None:
         
@@ -0,0 +1,99 @@
+import json
+import os
+import torch
+from diffusers import AutoencoderKL, PNDMScheduler, UNet2DConditionModel
+from peft import LoraConfig, get_peft_model
+from transformers import CLIPTextConfig, CLIPTextModel, CLIPTokenizer
+from transformers.models.clip.tokenization_clip import bytes_to_unicode
+
+TINY_HIDDEN_SIZE = 32
+
+
+def _build_tokenizer(out_dir: str) -> CLIPTokenizer:
+    """Tokenizer CLIP sin merges BPE: cada caracter es un token, no necesita descargas"""
+    characters = list(bytes_to_unicode().values())
+    tokens = characters + [c + "</w>" for c in characters] + ["<|startoftext|>", "<|endoftext|>"]
+    os.makedirs(out_dir, exist_ok=True)
+    vocab_file = os.path.join(out_dir, "vocab.json")
+    merges_file = os.path.join(out_dir, "merges.txt")
+    with open(vocab_file, "w", encoding="utf-8") as f:
+        json.dump({token: idx for idx, token in enumerate(tokens)}, f)
+    with open(merges_file, "w", encoding="utf-8") as f:
+        f.write("#version: 0.2\n")
+    tokenizer = CLIPTokenizer(vocab_file, merges_file, model_max_length=77)
+    tokenizer.save_pretrained(out_dir)
+    return tokenizer
+
+
+def build_tiny_model(out_dir: str, seed: int = 0) -> str:
+    """Checkpoint con la estructura de SD 1.5 (mismas clases de diffusers) y pesos aleatorios diminutos.
+
+    Se guarda con el layout de `from_pretrained(..., subfolder=...)` para que
+    ModelRegistry lo cargue como si fuera MODEL_ID. El VAE mantiene el factor 8
+    entre pixeles y latentes.
+    """
+    torch.manual_seed(seed)
+    tokenizer = _build_tokenizer(os.path.join(out_dir, "tokenizer"))
+
+    text_encoder = CLIPTextModel(CLIPTextConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=TINY_HIDDEN_SIZE,
+        intermediate_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        max_position_embeddings=77,
+        bos_token_id=tokenizer.bos_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+    ))
+    text_encoder.save_pretrained(os.path.join(out_dir, "text_encoder"))
+
+    vae = AutoencoderKL(
+        in_channels=3,
+        out_channels=3,
+        down_block_types=("DownEncoderBlock2D",) * 4,
+        up_block_types=("UpDecoderBlock2D",) * 4,
+        block_out_channels=(8, 16, 16, 16),
+        layers_per_block=1,
+        latent_channels=4,
+        norm_num_groups=8,
+        sample_size=512,
+    )
+    vae.save_pretrained(os.path.join(out_dir, "vae"))
+
+    unet = UNet2DConditionModel(
+        sample_size=64,
+        in_channels=4,
+        out_channels=4,
+        down_block_types=("CrossAttnDownBlock2D", "DownBlock2D"),
+        up_block_types=("UpBlock2D", "CrossAttnUpBlock2D"),
+        block_out_channels=(32, 64),
+        layers_per_block=1,
+        cross_attention_dim=TINY_HIDDEN_SIZE,
+        attention_head_dim=8,
+    )
+    unet.save_pretrained(os.path.join(out_dir, "unet"))
+
+    # Misma configuracion de scheduler que SD 1.5
+    PNDMScheduler(
+        beta_start=0.00085,
+        beta_end=0.012,
+        beta_schedule="scaled_linear",
+        num_train_timesteps=1000,
+        skip_prk_steps=True,
+        steps_offset=1,
+        set_alpha_to_one=False,
+    ).save_pretrained(os.path.join(out_dir, "scheduler"))
+    return out_dir
+
+
+def build_tiny_lora(model_dir: str, out_dir: str) -> str:
+    """Adaptador LoRA aleatorio para la UNet diminuta, con los mismos modulos que TrainerLora"""
+    unet = UNet2DConditionModel.from_pretrained(model_dir, subfolder="unet")
+    lora_config = LoraConfig(
+        r=4,
+        lora_alpha=8,
+        target_modules=["to_k", "to_q", "to_v", "to_out.0", "proj_in", "proj_out"],
+        init_lora_weights=False,
+    )
+    get_peft_model(unet, lora_config).save_pretrained(out_dir)
+    return out_dir
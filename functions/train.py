@@ -0,0 +1,39 @@
+import argparse
+from app.config import Config
+from classes.trainer_lora import TrainerLora
+from functions.anime_data_loader import get_data_loader
+from functions.distributed import cleanup, init_distributed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Entrenar el adaptador LoRA sketch -> anime.")
+    parser.add_argument("--number-of-images", type=int, default=None, help="Usar solo las primeras N parejas.")
+    parser.add_argument("--latent-dir", type=str, default=None, help="Latentes precalculados (functions/precompute_latents.py).")
+    parser.add_argument("--packed-dir", type=str, default=None, help="Parejas empaquetadas (functions/pack_dataset.py).")
+    parser.add_argument("--manifest", type=str, default=None, help="Manifiesto de parejas (divider.py).")
+    parser.add_argument("--split", type=str, default="train", help="Split del manifiesto a usar.")
+    parser.add_argument("--output-dir", type=str, default=Config.LORA_OUTPUT_DIR, help="Carpeta del LoRA final.")
+    parser.add_argument("--checkpoint-dir", type=str, default=Config.CHECKPOINT_DIR, help="Carpeta de checkpoints reanudables.")
+    parser.add_argument("--checkpoint-every", type=int, default=Config.CHECKPOINT_EVERY_STEPS, help="Pasos del optimizador entre checkpoints (0 = solo al final de cada epoch).")
+    parser.add_argument("--resume", type=str, nargs="?", const="latest", default=None, help="Reanudar desde el ultimo checkpoint o desde la ruta indicada.")
+    parser.add_argument("--mixed-precision", type=str, choices=["no", "fp16", "bf16"], default=Config.MIXED_PRECISION)
+    parser.add_argument("--gradient-accumulation-steps", type=int, default=Config.GRADIENT_ACCUMULATION_STEPS)
+    parser.add_argument("--gradient-checkpointing", action="store_true", default=Config.GRADIENT_CHECKPOINTING)
+    args = parser.parse_args()
+
+    # Lanzado con functions/train_distributed.py (torchrun): un proceso por GPU o por grupo de nucleos
+    rank, world_size, device = init_distributed()
+    try:
+        train_loader = get_data_loader(args.number_of_images, latent_dir=args.latent_dir, packed_dir=args.packed_dir,
+                                       manifest=args.manifest, split=args.split, num_replicas=world_size, rank=rank)
+        trainer = TrainerLora(
+            use_latents=args.latent_dir is not None,
+            mixed_precision=args.mixed_precision,
+            gradient_accumulation_steps=args.gradient_accumulation_steps,
+            gradient_checkpointing=args.gradient_checkpointing,
+            device=device,
+            rank=rank,
+            world_size=world_size,
+        )
+        trainer.train_sketch_to_anime(train_loader, args.output_dir, args.checkpoint_dir, args.checkpoint_every, args.resume)
+    finally:
+        cleanup()
@@ -0,0 +1,40 @@
+import argparse
+import os
+import torch
+from torch.distributed.run import main as torchrun
+
+
+def default_nproc() -> int:
+    """Una GPU por proceso; en CPU, un proceso por cada CPU_THREADS_PER_PROCESS nucleos"""
+    if torch.cuda.is_available():
+        return torch.cuda.device_count()
+    threads = int(os.getenv("CPU_THREADS_PER_PROCESS", 4))
+    return max(1, (os.cpu_count() or 1) // threads)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Lanza functions.train en varios procesos (y nodos) con torchrun. "
+                    "Los argumentos despues de -- se pasan a functions.train.")
+    parser.add_argument("--nproc-per-node", type=int, default=default_nproc(), help="Procesos en este nodo.")
+    parser.add_argument("--nnodes", type=int, default=1, help="Numero de nodos.")
+    parser.add_argument("--node-rank", type=int, default=0, help="Indice de este nodo.")
+    parser.add_argument("--master-addr", type=str, default="127.0.0.1", help="Direccion del nodo 0.")
+    parser.add_argument("--master-port", type=int, default=29500, help="Puerto del nodo 0.")
+    args, train_args = parser.parse_known_args()
+    if train_args[:1] == ["--"]:
+        train_args = train_args[1:]
+
+    # torchrun deja 1 hilo por proceso si no se indica: en CPU se reparten los nucleos
+    if not torch.cuda.is_available() and "OMP_NUM_THREADS" not in os.environ:
+        os.environ["OMP_NUM_THREADS"] = str(max(1, (os.cpu_count() or 1) // args.nproc_per_node))
+
+    torchrun([
+        "--nproc_per_node", str(args.nproc_per_node),
+        "--nnodes", str(args.nnodes),
+        "--node_rank", str(args.node_rank),
+        "--master_addr", args.master_addr,
+        "--master_port", str(args.master_port),
+        "-m", "functions.train",
+        *train_args,
+    ])
@@ -0,0 +1,46 @@
+import gc
+import os
+
+# gunicorn -c gunicorn.conf.py wsgi:app
+bind = os.getenv("BIND", "0.0.0.0:5000")
+# Varios workers comparten los pesos precargados (copy-on-write). Lo que debe
+# verse desde cualquier worker (trabajos, escrituras fallidas, metricas) se
+# publica en SharedState (Config.SHARED_STATE_DIR, en /dev/shm)
+workers = int(os.getenv("WEB_WORKERS", 2))
+# Hilos por worker: peticiones sincronas, streams SSE y consultas de trabajos
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", 8))
+timeout = int(os.getenv("WEB_TIMEOUT", 300))
+# Cargar la app (y los pipelines, ver wsgi.py) en el maestro antes del fork
+preload_app = True
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def when_ready(server):
+    from app.services.metrics_service import MetricsService
+    from app.services.shared_state import SharedState
+    # El maestro es el dueño de la carpeta compartida y la borra al salir
+    SharedState()
+    # Metricas de la precarga (carga de modelos): las publica el maestro una sola vez
+    MetricsService().publish(include_gauges=False)
+    # Los objetos ya cargados pasan a la generacion permanente: el GC de los workers
+    # no los recorre y no ensucia (copia) las paginas compartidas con el maestro
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from functions.cpu_inference import bind_worker_threads
+    from app.config import Config
+    from app.services.metrics_service import MetricsService
+    MetricsService().start_worker()
+    if Config.DEVICE.type == "cpu":
+        bind_worker_threads((worker.age - 1) % workers, workers)
+
+
+def child_exit(server, worker):
+    # Worker muerto o reciclado: sus trabajos en curso no van a terminar y sus gauges ya no valen
+    from app.services.job_service import JobService
+    from app.services.metrics_service import MetricsService
+    JobService.fail_orphaned(worker.pid)
+    MetricsService.retire_worker(worker.pid)
@@ -1,6 +1,9 @@
 from app import create_app
+from app.config import Config
 
 app = create_app()
 
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # Servidor de desarrollo. Sin el reloader el modulo no se importa dos veces;
+    # en produccion: gunicorn -c gunicorn.conf.py wsgi:app
+    app.run(host='0.0.0.0', port=5000, debug=Config.DEBUG, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,36 @@
+import os
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+from app.config import Config
+from classes.model_registry import ModelRegistry
+from functions.tiny_models import build_tiny_model
+
+PAIRS = 8
+EPOCHS = 2
+
+
+@pytest.fixture
+def tiny_setup(tmp_path, monkeypatch):
+    """Modelo diminuto y 8 parejas de 64px: 4 pasos por epoch con batch 2"""
+    model_dir = build_tiny_model(str(tmp_path / "model"))
+    rng = np.random.default_rng(0)
+    for folder in ("sketches", "faces"):
+        os.makedirs(tmp_path / folder)
+        for idx in range(PAIRS):
+            pixels = rng.integers(0, 255, (64, 64, 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(tmp_path / folder / f"{idx:05d}.png")
+
+    for name, value in {"MODEL_ID": model_dir, "SKETCH_DIR": str(tmp_path / "sketches"),
+                        "ANIME_DIR": str(tmp_path / "faces"), "IMAGE_SIZE": 64, "BATCH_SIZE": 2,
+                        "NUM_EPOCHS": EPOCHS, "DATALOADER_WORKERS": 0, "CHECKPOINT_KEEP": 0}.items():
+        monkeypatch.setattr(Config, name, value)
+    # Registro limpio apuntando al modelo diminuto; se restaura al terminar
+    registry = ModelRegistry()
+    monkeypatch.setattr(registry, "_components", {})
+    monkeypatch.setattr(registry, "_model_id", model_dir)
+    # Los modelos congelados se cargan ya: su primera carga consume RNG y desalinearia las ejecuciones
+    registry.vae(torch.float32)
+    registry.text_encoder(torch.float32)
+    return tmp_path
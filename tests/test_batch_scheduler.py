@@ -0,0 +1,148 @@
+import threading
+import time
+import pytest
+from app.services.batch_scheduler import BatchScheduler, GenerationCancelled
+
+
+class FakeRunner:
+    """run_batch falso: guarda los lotes y devuelve una 'imagen' por semilla"""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, mode, requests):
+        self.batches.append([request.prompt for request in requests])
+        return [[f"{request.prompt}:{seed}" for seed in request.seeds] for request in requests]
+
+
+def test_requests_in_window_share_a_batch():
+    runner = FakeRunner()
+    scheduler = BatchScheduler(runner, max_batch_size=8, max_wait_ms=300)
+    requests = [scheduler.submit('text', f"p{i}", seed=i, guidance_scale=7.5) for i in range(3)]
+
+    assert [request.wait(timeout=5) for request in requests] == [["p0:0"], ["p1:1"], ["p2:2"]]
+    assert runner.batches == [["p0", "p1", "p2"]]
+    assert all(request.batch_size == 3 for request in requests)
+
+
+def test_batch_is_cut_at_max_batch_size():
+    runner = FakeRunner()
+    scheduler = BatchScheduler(runner, max_batch_size=2, max_wait_ms=300)
+    requests = [scheduler.submit('text', f"p{i}") for i in range(3)]
+
+    for request in requests:
+        request.wait(timeout=5)
+    assert runner.batches == [["p0", "p1"], ["p2"]]
+
+
+def test_requests_are_grouped_by_key():
+    runner = FakeRunner()
+    scheduler = BatchScheduler(runner, max_batch_size=8, max_wait_ms=300)
+    requests = [
+        scheduler.submit('text', "a1", guidance_scale=7.5),
+        scheduler.submit('text', "b1", guidance_scale=5.0),
+        scheduler.submit('image', "c1", guidance_scale=7.5),
+        scheduler.submit('text', "a2", guidance_scale=7.5),
+    ]
+
+    for request in requests:
+        request.wait(timeout=5)
+    assert sorted(runner.batches) == [["a1", "a2"], ["b1"], ["c1"]]
+
+
+def test_number_per_prompt_does_not_split_the_key():
+    runner = FakeRunner()
+    scheduler = BatchScheduler(runner, max_batch_size=8, max_wait_ms=300)
+    first = scheduler.submit('text', "a", seed=10, number_per_prompt=2)
+    second = scheduler.submit('text', "b", seed=20, number_per_prompt=1)
+
+    assert first.wait(timeout=5) == ["a:10", "a:11"]
+    assert second.wait(timeout=5) == ["b:20"]
+    assert runner.batches == [["a", "b"]]
+
+
+def test_fits_bounds_the_batch():
+    runner = FakeRunner()
+    seen = []
+
+    def fits(mode, params, num_images):
+        seen.append(num_images)
+        return num_images <= 2
+
+    scheduler = BatchScheduler(runner, max_batch_size=8, max_wait_ms=300, fits=fits)
+    requests = [scheduler.submit('text', f"p{i}") for i in range(5)]
+
+    for request in requests:
+        request.wait(timeout=5)
+    assert [len(batch) for batch in runner.batches] == [2, 2, 1]
+    assert max(seen) == 3
+
+
+def test_cancel_before_batch_never_runs():
+    runner = FakeRunner()
+    scheduler = BatchScheduler(runner, max_batch_size=8, max_wait_ms=300)
+    cancel_event = threading.Event()
+    cancel_event.set()
+    cancelled = scheduler.submit('text', "cancelled", cancel_event=cancel_event)
+    kept = scheduler.submit('text', "kept")
+
+    with pytest.raises(GenerationCancelled):
+        cancelled.wait(timeout=5)
+    assert kept.wait(timeout=5) == [f"kept:{kept.seed}"]
+    assert runner.batches == [["kept"]]
+
+
+def test_on_done_is_called_with_the_finished_request():
+    runner = FakeRunner()
+    scheduler = BatchScheduler(runner, max_batch_size=8, max_wait_ms=0)
+    done = threading.Event()
+    finished = []
+
+    def on_done(request):
+        finished.append(request.images)
+        done.set()
+
+    request = scheduler.submit('text', "p", seed=3, on_done=on_done)
+
+    assert done.wait(5)
+    assert finished == [["p:3"]]
+    assert request.finished_at is not None
+
+
+def test_run_batch_error_fails_every_request():
+    def run_batch(mode, requests):
+        raise RuntimeError("sin memoria")
+
+    scheduler = BatchScheduler(run_batch, max_batch_size=8, max_wait_ms=300)
+    requests = [scheduler.submit('text', f"p{i}") for i in range(2)]
+
+    for request in requests:
+        with pytest.raises(RuntimeError, match="sin memoria"):
+            request.wait(timeout=5)
+
+
+def test_cancelled_request_is_released_while_its_batch_runs():
+    cancel, resume = threading.Event(), threading.Event()
+    done = []
+
+    def runner(mode, requests):
+        # Pasos de denoising hasta que el test deje terminar el lote
+        while not resume.wait(0.01):
+            for request in requests:
+                request.release_if_cancelled()
+        return [[request.prompt] for request in requests]
+
+    scheduler = BatchScheduler(runner, max_batch_size=8, max_wait_ms=300)
+    kept = scheduler.submit('text', "kept")
+    dropped = scheduler.submit('text', "dropped", cancel_event=cancel, on_done=done.append)
+    while kept.started_at is None:
+        time.sleep(0.01)
+    cancel.set()
+
+    with pytest.raises(GenerationCancelled):
+        dropped.wait(timeout=2)
+    assert not kept.finished
+
+    resume.set()
+    assert kept.wait(timeout=5) == ["kept"]
+    assert done == [dropped]
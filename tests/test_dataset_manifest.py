@@ -0,0 +1,101 @@
+import csv
+import pytest
+from classes.dataset_manifest import FIELDS, assign_split, build_manifest, load_manifest
+
+
+def _touch(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"")
+    return str(path)
+
+
+def test_assign_split_is_deterministic_and_seeded():
+    ids = [f"img_{i}" for i in range(2000)]
+    splits = [assign_split(pair_id, seed=42, val_ratio=0.2) for pair_id in ids]
+
+    assert splits == [assign_split(pair_id, seed=42, val_ratio=0.2) for pair_id in ids]
+    assert 0.15 < splits.count("val") / len(ids) < 0.25
+    assert splits != [assign_split(pair_id, seed=1, val_ratio=0.2) for pair_id in ids]
+
+
+def test_assign_split_ratio_bounds():
+    assert {assign_split(f"img_{i}", val_ratio=0.0) for i in range(100)} == {"train"}
+    assert {assign_split(f"img_{i}", val_ratio=1.0) for i in range(100)} == {"val"}
+
+
+def test_build_manifest_pairs_by_relative_id(tmp_path):
+    sketch_dir, anime_dir = tmp_path / "sketches", tmp_path / "faces"
+    sketches = {name: _touch(sketch_dir / f"{name}.png") for name in ("a", "sub/b", "only_sketch")}
+    animes = {name: _touch(anime_dir / f"{name}.jpg") for name in ("a", "sub/b", "only_anime")}
+    _touch(sketch_dir / "notes.txt")
+    out_path = tmp_path / "out" / "manifest.csv"
+
+    summary = build_manifest(str(sketch_dir), str(anime_dir), str(out_path), seed=42, val_ratio=0.5, num_threads=2)
+
+    assert summary["pairs"] == 2
+    assert summary["train"] + summary["val"] == 2
+    assert summary["missing_anime"] == ["only_sketch"]
+    assert summary["missing_sketch"] == ["only_anime"]
+    with open(out_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert tuple(rows[0]) == FIELDS
+    assert rows[1:] == [[pair_id, sketches[pair_id], animes[pair_id], assign_split(pair_id, 42, 0.5)]
+                        for pair_id in ("a", "sub/b")]
+    assert not (tmp_path / "out" / "manifest.csv.tmp").exists()
+
+
+def test_load_manifest_filters_by_split(tmp_path):
+    path = tmp_path / "manifest.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        writer.writerow(("a", "s/a.png", "f/a.png", "train"))
+        writer.writerow(("b", "s/b.png", "f/b.png", "val"))
+
+    assert load_manifest(str(path)) == (["s/a.png", "s/b.png"], ["f/a.png", "f/b.png"])
+    assert load_manifest(str(path), "val") == (["s/b.png"], ["f/b.png"])
+
+
+def test_load_manifest_rejects_other_csv(tmp_path):
+    path = tmp_path / "other.csv"
+    path.write_text("sketch,anime\n", encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        load_manifest(str(path))
+
+
+def test_list_image_pairs_rejects_mismatched_names(tmp_path):
+    from app.config import Config  # noqa: F401  (antes del dataset: import circular)
+    from classes.sketch_2_anime_dataset import list_image_pairs
+    _touch(tmp_path / "sketches" / "a.png")
+    _touch(tmp_path / "sketches" / "b.png")
+    _touch(tmp_path / "faces" / "a.jpg")
+    _touch(tmp_path / "faces" / "c.jpg")
+
+    with pytest.raises(ValueError):
+        list_image_pairs(str(tmp_path / "sketches"), str(tmp_path / "faces"))
+
+
+def test_pack_dataset_reads_the_manifest_split(tmp_path):
+    import numpy as np
+    from PIL import Image
+    from classes.shard_store import ShardReader
+    from functions.pack_dataset import pack_dataset
+    for folder, value in (("sketches", 10), ("faces", 200)):
+        (tmp_path / folder).mkdir()
+        for name in ("a", "b", "extra"):
+            Image.new("RGB", (8, 8), (value + len(name), 0, 0)).save(tmp_path / folder / f"{name}.png")
+    manifest = tmp_path / "manifest.csv"
+    with open(manifest, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        writer.writerow(("b", tmp_path / "sketches" / "b.png", tmp_path / "faces" / "b.png", "train"))
+        writer.writerow(("a", tmp_path / "sketches" / "a.png", tmp_path / "faces" / "a.png", "val"))
+
+    index = pack_dataset(None, None, str(tmp_path / "packed"), image_size=8, shard_size=4, num_threads=1,
+                         manifest=str(manifest), split="train")
+
+    assert index["total"] == 1
+    assert index["metadata"]["split"] == "train"
+    pair = ShardReader(str(tmp_path / "packed")).get(0)
+    assert pair["sketch"][0, 0, 0] == 11 and pair["anime"][0, 0, 0] == 201
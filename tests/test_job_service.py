@@ -0,0 +1,69 @@
+import threading
+import pytest
+from flask import Flask
+from app.services.job_service import JobService
+from app.services.shared_state import SharedState
+
+
+@pytest.fixture
+def shared(tmp_path, monkeypatch):
+    state = SharedState()
+    monkeypatch.setattr(state, "root", str(tmp_path))
+    return state
+
+
+def _remote_job(shared, job_id, state, worker=1):
+    shared.write('jobs', job_id, {'job_id': job_id, 'kind': 'text-to-image', 'state': state,
+                                  'progress': {'step': 3, 'total_steps': 10}, 'worker': worker})
+
+
+def test_job_of_another_worker_is_visible(shared):
+    _remote_job(shared, "abc", "running")
+
+    job = JobService().get("abc")
+
+    assert job.state == "running"
+    assert job.to_dict() == {'job_id': "abc", 'kind': 'text-to-image', 'state': "running",
+                             'progress': {'step': 3, 'total_steps': 10}}
+    assert JobService().get("missing") is None
+
+
+def test_cancel_of_another_workers_job_leaves_a_request(shared):
+    _remote_job(shared, "abc", "running")
+    _remote_job(shared, "done", "succeeded")
+
+    assert JobService().cancel("abc").state == "cancelling"
+    assert JobService().cancel("done").state == "succeeded"
+
+    assert shared.keys('cancel') == ["abc"]
+
+
+def test_jobs_of_a_dead_worker_fail(shared):
+    _remote_job(shared, "orphan", "running", worker=41)
+    _remote_job(shared, "finished", "succeeded", worker=41)
+    _remote_job(shared, "alive", "running", worker=42)
+
+    JobService.fail_orphaned(41)
+
+    assert [JobService().get(job_id).state for job_id in ("orphan", "finished", "alive")] == ["failed", "succeeded", "running"]
+
+
+def test_running_job_is_cancelling_until_its_thread_is_released(shared):
+    started, release = threading.Event(), threading.Event()
+
+    def generate(on_progress, cancel_event):
+        started.set()
+        release.wait(5)
+        return {'status': 'cancelled' if cancel_event.is_set() else 'success'}
+
+    with Flask(__name__).app_context():
+        job = JobService().submit('text-to-image', generate)
+    assert started.wait(5)
+
+    assert JobService().cancel(job.id).state == "cancelling"
+    assert shared.read('jobs', job.id)['state'] == "cancelling"
+
+    release.set()
+    job.future.result(timeout=5)
+    assert job.state == "cancelled"
+    assert shared.read('jobs', job.id)['state'] == "cancelled"
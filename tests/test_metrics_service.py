@@ -0,0 +1,70 @@
+import json
+from app.services.metrics_service import Histogram
+
+
+def test_histogram_renders_cumulative_buckets_per_series():
+    histogram = Histogram("oni_test_seconds", "Duracion de prueba", buckets=(0.1, 1.0))
+    histogram.observe(0.1, mode="text")
+    histogram.observe(0.5, mode="text")
+    histogram.observe(2.0, mode="text")
+    histogram.observe(0.05, mode="image")
+
+    assert "\n".join(histogram.render()) == "\n".join([
+        "# HELP oni_test_seconds Duracion de prueba",
+        "# TYPE oni_test_seconds histogram",
+        'oni_test_seconds_bucket{le="0.1",mode="image"} 1',
+        'oni_test_seconds_bucket{le="1.0",mode="image"} 1',
+        'oni_test_seconds_bucket{le="+Inf",mode="image"} 1',
+        'oni_test_seconds_sum{mode="image"} 0.05',
+        'oni_test_seconds_count{mode="image"} 1',
+        'oni_test_seconds_bucket{le="0.1",mode="text"} 1',
+        'oni_test_seconds_bucket{le="1.0",mode="text"} 2',
+        'oni_test_seconds_bucket{le="+Inf",mode="text"} 3',
+        'oni_test_seconds_sum{mode="text"} 2.6',
+        'oni_test_seconds_count{mode="text"} 3',
+    ])
+
+
+def test_histogram_without_labels_and_escaping():
+    histogram = Histogram("oni_plain", "Sin etiquetas", buckets=(1.0,))
+    histogram.observe(3.0)
+    escaped = Histogram("oni_escaped", "Escapado", buckets=(1.0,))
+    escaped.observe(0.5, stage='say "hi"\n')
+
+    assert histogram.render()[2:] == [
+        'oni_plain_bucket{le="1.0"} 0',
+        'oni_plain_bucket{le="+Inf"} 1',
+        "oni_plain_sum 3.0",
+        "oni_plain_count 1",
+    ]
+    assert escaped.render()[2] == 'oni_escaped_bucket{le="1.0",stage="say \\"hi\\"\\n"} 1'
+
+
+def test_histogram_with_no_observations_only_has_headers():
+    histogram = Histogram("oni_empty", "Vacio", buckets=(1.0,))
+
+    assert histogram.render() == ["# HELP oni_empty Vacio", "# TYPE oni_empty histogram"]
+
+
+def test_histogram_snapshots_from_several_workers_add_up():
+    workers = [Histogram("oni_test_seconds", "Duracion", buckets=(0.1, 1.0)) for _ in range(2)]
+    workers[0].observe(0.05, mode="text")
+    workers[1].observe(0.5, mode="text")
+    workers[1].observe(0.5, mode="image")
+    merged = Histogram("oni_test_seconds", "Duracion", buckets=(0.1, 1.0))
+    for worker in workers:
+        # Ida y vuelta por JSON, como a traves de SharedState
+        merged.merge(json.loads(json.dumps(worker.snapshot())))
+
+    assert merged.render()[2:] == [
+        'oni_test_seconds_bucket{le="0.1",mode="image"} 0',
+        'oni_test_seconds_bucket{le="1.0",mode="image"} 1',
+        'oni_test_seconds_bucket{le="+Inf",mode="image"} 1',
+        'oni_test_seconds_sum{mode="image"} 0.5',
+        'oni_test_seconds_count{mode="image"} 1',
+        'oni_test_seconds_bucket{le="0.1",mode="text"} 1',
+        'oni_test_seconds_bucket{le="1.0",mode="text"} 2',
+        'oni_test_seconds_bucket{le="+Inf",mode="text"} 2',
+        'oni_test_seconds_sum{mode="text"} 0.55',
+        'oni_test_seconds_count{mode="text"} 2',
+    ]
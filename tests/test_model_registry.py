@@ -0,0 +1,52 @@
+import os
+import torch
+from app.config import Config
+from classes import model_registry
+from classes.model_registry import ModelRegistry
+from functions.tiny_models import build_tiny_lora
+
+
+def _cache_entries(cache_dir):
+    return sorted(name for name in os.listdir(cache_dir) if not name.endswith(".lock"))
+
+
+def test_merged_unet_is_published_once_and_reused(tiny_setup):
+    registry = ModelRegistry()
+    lora_path = build_tiny_lora(Config.MODEL_ID, str(tiny_setup / "lora"))
+    cache_dir = str(tiny_setup / "merged")
+
+    merged = registry._load_merged_unet(lora_path, cache_dir, torch.float32)
+    [entry] = _cache_entries(cache_dir)
+    cached = registry._load_merged_unet(lora_path, cache_dir, torch.float32)
+
+    assert _cache_entries(cache_dir) == [entry]
+    for (name, expected), (_, actual) in zip(merged.state_dict().items(), cached.state_dict().items()):
+        assert torch.equal(expected, actual), name
+
+
+def test_merged_unet_keeps_a_cache_published_by_another_process(tiny_setup, monkeypatch, capsys):
+    registry = ModelRegistry()
+    lora_path = build_tiny_lora(Config.MODEL_ID, str(tiny_setup / "lora"))
+    cache_dir = str(tiny_setup / "merged")
+    registry._load_merged_unet(lora_path, cache_dir, torch.float32)
+    [entry] = _cache_entries(cache_dir)
+    published = os.path.join(cache_dir, entry)
+    inode = os.stat(published).st_ino
+
+    # Otro proceso la publica entre la comprobacion y el renombrado
+    checks = []
+    isdir = os.path.isdir
+
+    def racing_isdir(path):
+        if path == published:
+            checks.append(path)
+            return len(checks) > 1 and isdir(path)
+        return isdir(path)
+    monkeypatch.setattr(model_registry.os.path, "isdir", racing_isdir)
+
+    unet = registry._load_merged_unet(lora_path, cache_dir, torch.float32)
+
+    assert "Otro proceso publico antes" in capsys.readouterr().out
+    assert unet is not None
+    assert _cache_entries(cache_dir) == [entry]
+    assert os.stat(published).st_ino == inode
@@ -0,0 +1,34 @@
+import os
+import torch
+from app.config import Config
+from app.services.result_cache import ResultCache
+
+
+def _key():
+    return ResultCache.make_key('text', "a cat", {'sampler': 'euler'}, 7)
+
+
+def test_key_changes_with_the_inference_setup(tmp_path, monkeypatch):
+    lora = tmp_path / "lora"
+    lora.mkdir()
+    adapter = lora / "adapter_model.safetensors"
+    adapter.write_bytes(b"v1")
+    monkeypatch.setattr(Config, "LORA_PATH", str(lora))
+    monkeypatch.setattr(Config, "FUSE_LORA", True)
+    monkeypatch.setattr(Config, "INFERENCE_DTYPE", torch.float32)
+    base = _key()
+    assert _key() == base
+
+    monkeypatch.setattr(Config, "FUSE_LORA", False)
+    unfused = _key()
+    monkeypatch.setattr(Config, "INFERENCE_DTYPE", torch.bfloat16)
+    bf16 = _key()
+
+    # Reentrenar el LoRA en la misma ruta
+    monkeypatch.setattr(Config, "FUSE_LORA", True)
+    monkeypatch.setattr(Config, "INFERENCE_DTYPE", torch.float32)
+    adapter.write_bytes(b"v2-retrained")
+    os.utime(adapter, ns=(1, 1))
+    retrained = _key()
+
+    assert len({base, unfused, bf16, retrained}) == 4
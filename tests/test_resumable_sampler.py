@@ -0,0 +1,60 @@
+from classes.resumable_sampler import ResumableRandomSampler
+
+
+def test_same_seed_and_epoch_give_the_same_order():
+    data = range(10)
+    first = ResumableRandomSampler(data, seed=7)
+    second = ResumableRandomSampler(data, seed=7)
+    first.set_epoch(2)
+    second.set_epoch(2)
+
+    assert list(first) == list(second)
+    assert sorted(first) == list(range(10))
+
+
+def test_epochs_reshuffle():
+    sampler = ResumableRandomSampler(range(50), seed=0)
+    sampler.set_epoch(0)
+    epoch_0 = list(sampler)
+    sampler.set_epoch(1)
+
+    assert list(sampler) != epoch_0
+
+
+def test_start_index_skips_seen_samples():
+    sampler = ResumableRandomSampler(range(10), seed=3)
+    sampler.set_epoch(1)
+    full = list(sampler)
+    sampler.set_epoch(1, start_index=4)
+
+    assert list(sampler) == full[4:]
+    assert len(sampler) == 6
+    assert sampler.state_dict() == {"seed": 3, "epoch": 1, "start_index": 4, "num_replicas": 1, "rank": 0}
+
+
+def test_replicas_split_the_data_with_padding():
+    shards = [ResumableRandomSampler(range(5), seed=1, num_replicas=2, rank=rank) for rank in range(2)]
+    for shard in shards:
+        shard.set_epoch(0)
+    orders = [list(shard) for shard in shards]
+
+    # 5 muestras en 2 procesos: 3 cada uno, la primera repetida para rellenar
+    assert [len(order) for order in orders] == [3, 3]
+    assert [len(shard) for shard in shards] == [3, 3]
+    assert sorted(set(orders[0]) | set(orders[1])) == list(range(5))
+
+    unsharded = ResumableRandomSampler(range(5), seed=1)
+    unsharded.set_epoch(0)
+    padded = list(unsharded) + list(unsharded)[:1]
+    assert orders[0] == padded[0::2]
+    assert orders[1] == padded[1::2]
+
+
+def test_replica_skip_is_per_shard():
+    sampler = ResumableRandomSampler(range(9), seed=5, num_replicas=3, rank=2)
+    sampler.set_epoch(4)
+    shard = list(sampler)
+    sampler.set_epoch(4, start_index=2)
+
+    assert list(sampler) == shard[2:]
+    assert len(sampler) == 1
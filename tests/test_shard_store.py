@@ -0,0 +1,17 @@
+import numpy as np
+from classes.shard_store import ShardReader, ShardWriter
+
+
+def test_last_shard_only_holds_the_rows_written(tmp_path):
+    writer = ShardWriter(str(tmp_path), {"x": ((2,), "float32")}, shard_size=4)
+    writer.write_batch({"x": np.arange(12, dtype=np.float32).reshape(6, 2)})
+    index = writer.close()
+
+    assert [shard["count"] for shard in index["shards"]] == [4, 2]
+    assert np.load(tmp_path / "shard_00000.x.npy").shape == (4, 2)
+    assert np.load(tmp_path / "shard_00001.x.npy").shape == (2, 2)
+    assert not list(tmp_path.glob("*.tmp"))
+
+    reader = ShardReader(str(tmp_path))
+    assert len(reader) == 6
+    np.testing.assert_array_equal(reader.get(5)["x"], [10, 11])
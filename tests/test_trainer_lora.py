@@ -0,0 +1,31 @@
+import pytest
+import torch
+from app.config import Config
+from classes.trainer_lora import TrainerLora
+from functions.anime_data_loader import get_data_loader
+
+
+def test_fp16_requires_cuda():
+    with pytest.raises(ValueError, match="fp16"):
+        TrainerLora(mixed_precision="fp16", device=torch.device("cpu"))
+
+
+def test_short_last_window_is_averaged_over_its_length(tiny_setup, monkeypatch):
+    """4 batches con acumulacion 3: ventanas de 3 y de 1, las dos con gradiente medio"""
+    monkeypatch.setattr(Config, "NUM_EPOCHS", 1)
+    trainer = TrainerLora(mixed_precision="no", gradient_accumulation_steps=3, gradient_checkpointing=False,
+                          device=torch.device("cpu"))
+    # Loss lineal en los parametros del LoRA: el gradiente de cada batch es 1 en todos ellos
+    trainer.compute_loss = lambda batch: (sum(p.sum() for p in trainer.trainable_params), 2)
+    gradients = []
+    optimizer_step = trainer.optimizer_step
+
+    def recording_optimizer_step(optimizer, scaler):
+        gradients.append(trainer.trainable_params[0].grad.unique().tolist())
+        optimizer_step(optimizer, scaler)
+    trainer.optimizer_step = recording_optimizer_step
+
+    trainer.train_sketch_to_anime(get_data_loader(), str(tiny_setup / "lora"), str(tiny_setup / "checkpoints"),
+                                  checkpoint_every=0)
+
+    assert gradients == [[1.0], [1.0]]
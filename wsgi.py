@@ -0,0 +1,14 @@
+import torch
+from app import create_app
+from app.config import Config
+from app.services.generator_service import GeneratorService
+
+app = create_app()
+
+# Con gunicorn --preload este modulo se importa una vez en el maestro: los pesos
+# cargados aqui los comparten los workers (copy-on-write) en lugar de tener N copias.
+# Tras inicializar CUDA no se puede hacer fork, asi que con GPU cada worker carga lo suyo.
+if Config.PRELOAD_MODELS and Config.DEVICE.type == "cpu":
+    # Un solo hilo en el maestro: el pool de OpenMP no sobrevive al fork
+    torch.set_num_threads(1)
+    GeneratorService().preload()